@@ -1,8 +1,11 @@
 #include "Ppmd7.h"
 #include "Ppmd8.h"
 
+#include <limits.h>
+#include <stdint.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 
 #ifdef _WIN32
 #define getc_unlocked fgetc
@@ -13,19 +16,50 @@ typedef struct {
     void (*Write)(void *p, Byte b);
     void (*dst_write)(char *buf, int size, void *userdata);
     void *userdata;
+    char *buf;
+    int size;
+    int pos;
+    unsigned int restarts;
+    unsigned int cutoffs;
 } RawWriter;
 
 typedef struct {
     Byte (*Read)(void *p);
     int (*src_readinto)(char *buf, int size, void *userdata);
     void *userdata;
+    char *buf;
+    int size;
+    int pos;
+    int len;
+    int overrun;
+    int margin;
+    unsigned int restarts;
+    unsigned int cutoffs;
 } RawReader;
 
+void *raw_alloc(size_t size);
+void raw_free(void *address);
+
+// huge pages
+#define HUGE_KIND_MALLOC 0
+#define HUGE_KIND_MMAP 1
+#define HUGE_KIND_THP 2
+#define HUGE_KIND_HUGETLB 3
+void *huge_alloc(size_t size);
+void huge_free(void *address);
+int huge_kind(void *address);
+int numa_node(void);
+
 // ppmd7
-void ppmd_state_init(CPpmd7 *ppmd, unsigned int maxOrder, unsigned int memSize, ISzAlloc *allocator);
+Bool ppmd_state_init(CPpmd7 *ppmd, unsigned int maxOrder, unsigned int memSize, ISzAlloc *allocator);
 void ppmd_state_close(CPpmd7 *ppmd, ISzAlloc *allocator);
-int ppmd_decompress_init(CPpmd7z_RangeDec *rc, RawReader *reader, int (*src_readingo)(char *, int, void*), void *userdata);
-void ppmd_compress_init(CPpmd7z_RangeEnc *rc, RawWriter *write, void (*dst_write)(char *, int, void*), void *userdata);
+int ppmd_decompress_init(CPpmd7z_RangeDec *rc, RawReader *reader, int (*src_readingo)(char *, int, void*), void *userdata,
+                         char *buf, int size);
+void ppmd_decompress_attach(CPpmd7z_RangeDec *rc, RawReader *reader, int (*src_readinto)(char *, int, void*),
+                            void *userdata, char *buf, int size);
+void ppmd_compress_init(CPpmd7z_RangeEnc *rc, RawWriter *write, void (*dst_write)(char *, int, void*), void *userdata,
+                        char *buf, int size);
+void ppmd_writer_flush(RawWriter *writer);
 
 void Ppmd7_Construct(CPpmd7 *p);
 void Ppmd7_Init(CPpmd7 *p, unsigned maxOrder);
@@ -36,7 +70,7 @@ void Ppmd7z_RangeEnc_FlushData(CPpmd7z_RangeEnc *p);
 void Ppmd7_EncodeSymbol(CPpmd7 *p, CPpmd7z_RangeEnc *rc, int symbol);
 
 // ppmd8
-void ppmd8_malloc(CPpmd8 *p, unsigned int memSize, ISzAlloc *allocator);
+Bool ppmd8_malloc(CPpmd8 *p, unsigned int memSize, ISzAlloc *allocator);
 void ppmd8_free(CPpmd8 *p, ISzAlloc *allocator);
 
 Bool Ppmd8_RangeDec_Init(CPpmd8 *p);
@@ -45,3 +79,40 @@ int Ppmd8_DecodeSymbol(CPpmd8 *p);
 
 void Ppmd8_RangeEnc_FlushData(CPpmd8 *p);
 void Ppmd8_EncodeSymbol(CPpmd8 *p, int symbol);
+
+void ppmd8_compress(CPpmd8 *p, char *buf, int size);
+int ppmd8_decompress(CPpmd8 *p, char *buf, int size, int *status);
+
+// one-shot
+int ppmd_compress_buffer(CPpmd7 *p, char *src, int srclen, char *dst, int dstlen);
+int ppmd8_compress_buffer(CPpmd8 *p, char *src, int srclen, char *dst, int dstlen);
+
+// model snapshot
+typedef struct {
+    UInt32 MinContext;
+    UInt32 MaxContext;
+    UInt32 FoundState;
+    UInt32 LoUnit;
+    UInt32 HiUnit;
+    UInt32 Text;
+    UInt32 UnitsStart;
+} PpmdRefs;
+
+size_t ppmd7_used_size(CPpmd7 *p);
+void ppmd7_snapshot(CPpmd7 *p, CPpmd7 *state, PpmdRefs *refs, char *arena);
+Bool ppmd7_restore(CPpmd7 *p, CPpmd7 *state, PpmdRefs *refs, char *arena);
+size_t ppmd8_used_size(CPpmd8 *p);
+void ppmd8_snapshot(CPpmd8 *p, CPpmd8 *state, PpmdRefs *refs, char *arena);
+Bool ppmd8_restore(CPpmd8 *p, CPpmd8 *state, PpmdRefs *refs, char *arena);
+
+// batch
+size_t ppmd7_compress_batch(CPpmd7 *p, unsigned order, CPpmd7 *state, PpmdRefs *refs, char *arena,
+                            char *src, size_t *src_offsets, int n, char *dst, size_t dstlen, size_t *dst_offsets);
+int ppmd7_decompress_batch(CPpmd7 *p, unsigned order, CPpmd7 *state, PpmdRefs *refs, char *arena,
+                           char *src, size_t *src_offsets, int n, int start,
+                           char *dst, size_t dstlen, size_t *dst_offsets, int *status);
+size_t ppmd8_compress_batch(CPpmd8 *p, unsigned order, unsigned restore, CPpmd8 *state, PpmdRefs *refs, char *arena,
+                            char *src, size_t *src_offsets, int n, char *dst, size_t dstlen, size_t *dst_offsets);
+int ppmd8_decompress_batch(CPpmd8 *p, unsigned order, unsigned restore, CPpmd8 *state, PpmdRefs *refs, char *arena,
+                           char *src, size_t *src_offsets, int n, int start,
+                           char *dst, size_t dstlen, size_t *dst_offsets, int *status);
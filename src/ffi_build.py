@@ -177,6 +177,11 @@ typedef struct {
     void (*Write)(void *p, Byte b);
     void (*dst_write)(char *buf, int size, void *userdata);
     void *userdata;
+    char *buf;
+    int size;
+    int pos;
+    unsigned int restarts;
+    unsigned int cutoffs;
 } RawWriter;
 
 typedef struct {
@@ -184,20 +189,41 @@ typedef struct {
     Byte (*Read)(void *p);
     int (*src_readinto)(char *buf, int size, void *userdata);
     void *userdata;
+    char *buf;
+    int size;
+    int pos;
+    int len;
+    int overrun;
+    int margin;
+    unsigned int restarts;
+    unsigned int cutoffs;
 } RawReader;
 
 extern "Python" int src_readinto(char *, int, void *);
 extern "Python" void dst_write(char *, int, void *);
 
-extern "Python" void *raw_alloc(size_t);
-extern "Python" void raw_free(void *);
-
-void ppmd_state_init(CPpmd7 *ppmd, unsigned int maxOrder, unsigned int memSize, ISzAlloc *allocator);
+void *raw_alloc(size_t size);
+void raw_free(void *address);
+#define HUGE_KIND_MALLOC 0
+#define HUGE_KIND_MMAP 1
+#define HUGE_KIND_THP 2
+#define HUGE_KIND_HUGETLB 3
+void *huge_alloc(size_t size);
+void huge_free(void *address);
+int huge_kind(void *address);
+int numa_node(void);
+
+Bool ppmd_state_init(CPpmd7 *ppmd, unsigned int maxOrder, unsigned int memSize, ISzAlloc *allocator);
 void ppmd_state_close(CPpmd7 *ppmd, ISzAlloc *allocator);
-int ppmd_decompress_init(CPpmd7z_RangeDec *rc, RawReader *reader, int (*src_readingo)(char *, int, void*), void *userdata);
-void ppmd_compress_init(CPpmd7z_RangeEnc *rc, RawWriter *write, void (*dst_write)(char *, int, void*), void *userdata);
+int ppmd_decompress_init(CPpmd7z_RangeDec *rc, RawReader *reader, int (*src_readingo)(char *, int, void*), void *userdata,
+                         char *buf, int size);
+void ppmd_decompress_attach(CPpmd7z_RangeDec *rc, RawReader *reader, int (*src_readinto)(char *, int, void*),
+                            void *userdata, char *buf, int size);
+void ppmd_compress_init(CPpmd7z_RangeEnc *rc, RawWriter *write, void (*dst_write)(char *, int, void*), void *userdata,
+                        char *buf, int size);
+void ppmd_writer_flush(RawWriter *writer);
 void ppmd_compress(CPpmd7 *p, CPpmd7z_RangeEnc *rc, char *buf, int size);
-void ppmd_decompress(CPpmd7 *p, CPpmd7z_RangeDec *rc, char *buf, int size);
+int ppmd_decompress(CPpmd7 *p, CPpmd7z_RangeDec *rc, char *buf, int size, int *status);
 
 void Ppmd7_Construct(CPpmd7 *p);
 void Ppmd7_Init(CPpmd7 *p, unsigned maxOrder);
@@ -207,10 +233,12 @@ void Ppmd7z_RangeEnc_Init(CPpmd7z_RangeEnc *p);
 void Ppmd7z_RangeEnc_FlushData(CPpmd7z_RangeEnc *p);
 void Ppmd7_EncodeSymbol(CPpmd7 *p, CPpmd7z_RangeEnc *rc, int symbol);
 
-void ppmd8_malloc(CPpmd8 *p, unsigned int memSize, ISzAlloc *allocator);
+Bool ppmd8_malloc(CPpmd8 *p, unsigned int memSize, ISzAlloc *allocator);
 void ppmd8_mfree(CPpmd8 *ppmd, ISzAlloc *allocator);
-void ppmd8_decompress_init(CPpmd8 *p, RawReader *reader, int (*src_readinto)(char*, int, void*), void *userdata);
-void ppmd8_compress_init(CPpmd8 *p, RawWriter *writer, void (*dst_write)(char*, int, void*), void *userdata);
+void ppmd8_decompress_init(CPpmd8 *p, RawReader *reader, int (*src_readinto)(char*, int, void*), void *userdata,
+                           char *buf, int size);
+void ppmd8_compress_init(CPpmd8 *p, RawWriter *writer, void (*dst_write)(char*, int, void*), void *userdata,
+                         char *buf, int size);
 
 void Ppmd8_Construct(CPpmd8 *p);
 void Ppmd8_Init(CPpmd8 *p, unsigned maxOrder, unsigned restoreMethod);
@@ -218,33 +246,235 @@ void Ppmd8_EncodeSymbol(CPpmd8 *p, int symbol);
 void Ppmd8_RangeEnc_FlushData(CPpmd8 *p);
 Bool Ppmd8_RangeDec_Init(CPpmd8 *p);
 int Ppmd8_DecodeSymbol(CPpmd8 *p);
+void ppmd8_compress(CPpmd8 *p, char *buf, int size);
+int ppmd8_decompress(CPpmd8 *p, char *buf, int size, int *status);
+
+int ppmd_compress_buffer(CPpmd7 *p, char *src, int srclen, char *dst, int dstlen);
+int ppmd8_compress_buffer(CPpmd8 *p, char *src, int srclen, char *dst, int dstlen);
+
+typedef struct {
+    UInt32 MinContext;
+    UInt32 MaxContext;
+    UInt32 FoundState;
+    UInt32 LoUnit;
+    UInt32 HiUnit;
+    UInt32 Text;
+    UInt32 UnitsStart;
+} PpmdRefs;
+
+size_t ppmd7_used_size(CPpmd7 *p);
+void ppmd7_snapshot(CPpmd7 *p, CPpmd7 *state, PpmdRefs *refs, char *arena);
+Bool ppmd7_restore(CPpmd7 *p, CPpmd7 *state, PpmdRefs *refs, char *arena);
+size_t ppmd8_used_size(CPpmd8 *p);
+void ppmd8_snapshot(CPpmd8 *p, CPpmd8 *state, PpmdRefs *refs, char *arena);
+Bool ppmd8_restore(CPpmd8 *p, CPpmd8 *state, PpmdRefs *refs, char *arena);
+
+size_t ppmd7_compress_batch(CPpmd7 *p, unsigned order, CPpmd7 *state, PpmdRefs *refs, char *arena,
+                            char *src, size_t *src_offsets, int n, char *dst, size_t dstlen, size_t *dst_offsets);
+int ppmd7_decompress_batch(CPpmd7 *p, unsigned order, CPpmd7 *state, PpmdRefs *refs, char *arena,
+                           char *src, size_t *src_offsets, int n, int start,
+                           char *dst, size_t dstlen, size_t *dst_offsets, int *status);
+size_t ppmd8_compress_batch(CPpmd8 *p, unsigned order, unsigned restore, CPpmd8 *state, PpmdRefs *refs, char *arena,
+                            char *src, size_t *src_offsets, int n, char *dst, size_t dstlen, size_t *dst_offsets);
+int ppmd8_decompress_batch(CPpmd8 *p, unsigned order, unsigned restore, CPpmd8 *state, PpmdRefs *refs, char *arena,
+                           char *src, size_t *src_offsets, int n, int start,
+                           char *dst, size_t dstlen, size_t *dst_offsets, int *status);
 ''')
 
 # ---------------------------------------------------------------------------
 ffibuilder.set_source('_ppmd', r'''
 #include "PpmdPy.h"
 
+#ifdef __linux__
+#include <fcntl.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/syscall.h>
+#include <unistd.h>
+#endif
+
+/* When dst_write is NULL, writer outputs into fixed buffer and counts bytes which exceed the buffer. */
 static void Write(void *p, Byte b)
 {
     RawWriter *bw = p;
-    bw->dst_write(&b, 1, bw->userdata);
+    if (bw->pos == bw->size && bw->dst_write != NULL) {
+        ppmd_writer_flush(bw);
+    }
+    if (bw->pos < bw->size) {
+        bw->buf[bw->pos] = (char) b;
+    }
+    bw->pos++;
 }
 
+void ppmd_writer_flush(RawWriter *writer)
+{
+    if (writer->pos > 0 && writer->dst_write != NULL) {
+        writer->dst_write(writer->buf, writer->pos, writer->userdata);
+        writer->pos = 0;
+    }
+}
+
+/* When src_readinto is NULL, reader reads from fixed buffer which holds whole input.
+ * Decoding loops stop before a symbol when less than margin bytes are left in the buffer,
+ * so the caller can feed more input before a symbol is decoded with missing bytes. */
 static Byte Read(void *p)
 {
     RawReader *br = p;
-    char b;
-    int size = br->src_readinto(&b, 1, br->userdata);
-    if (size <= 0)
-        return 0;
-    return (Byte) b;
+    if (br->pos == br->len) {
+        int size = 0;
+        if (br->src_readinto != NULL) {
+            size = br->src_readinto(br->buf, br->size, br->userdata);
+        }
+        if (size <= 0) {
+            br->overrun++;
+            return 0;
+        }
+        br->pos = 0;
+        br->len = size;
+    }
+    return (Byte) br->buf[br->pos++];
+}
+
+static void reader_init(RawReader *reader, int (*src_readinto)(char*, int, void*), void *userdata, char *buf, int size)
+{
+    reader->Read = Read;
+    reader->src_readinto = src_readinto;
+    reader->userdata = userdata;
+    reader->buf = buf;
+    reader->size = size;
+    reader->pos = 0;
+    reader->len = src_readinto == NULL ? size : 0;
+    reader->overrun = 0;
+    reader->margin = 0;
+    reader->restarts = 0;
+    reader->cutoffs = 0;
+}
+
+/* Model arena is allocated without zero filling, so pages are committed lazily when the model touches them. */
+void *raw_alloc(size_t size)
+{
+    if (size == 0)
+        return NULL;
+    return malloc(size);
 }
 
-void ppmd_state_init(CPpmd7 *p, unsigned int maxOrder, unsigned int memSize, ISzAlloc *allocator)
+void raw_free(void *address)
+{
+    free(address);
+}
+
+/* Model arena on huge pages, which reduce TLB misses of a large model. MAP_HUGETLB is tried first,
+ * which needs huge pages reserved by administrator. Then an anonymous mapping aligned to a huge page
+ * is advised with MADV_HUGEPAGE for transparent huge pages unless they are disabled system-wide.
+ * When mapping is not available, the arena is allocated with malloc(). A header before the arena records
+ * how it was allocated, because Free() doesn't get a size. Pages are committed lazily in every case. */
+#define HUGE_PAGE_SIZE ((size_t) 2 << 20)
+#define HUGE_HEADER 64
+
+typedef struct {
+    void *base;
+    size_t length;
+    int kind;
+} HugeHeader;
+
+static void *huge_header(char *base, size_t length, char *address, int kind)
+{
+    HugeHeader *header = (HugeHeader *) (address - HUGE_HEADER);
+    header->base = base;
+    header->length = length;
+    header->kind = kind;
+    return address;
+}
+
+#if defined(__linux__) && defined(MADV_HUGEPAGE)
+/* returns True when transparent huge pages are enabled system-wide or for madvise() */
+static Bool thp_enabled(void)
+{
+    char buf[64];
+    ssize_t n;
+    int fd = open("/sys/kernel/mm/transparent_hugepage/enabled", O_RDONLY);
+    if (fd < 0)
+        return False;
+    n = read(fd, buf, sizeof(buf) - 1);
+    close(fd);
+    if (n <= 0)
+        return False;
+    buf[n] = '\0';
+    return strstr(buf, "[never]") == NULL;
+}
+#endif
+
+void *huge_alloc(size_t size)
+{
+    char *base;
+    size_t length;
+    if (size == 0 || size > SIZE_MAX - HUGE_HEADER - HUGE_PAGE_SIZE)
+        return NULL;
+#if defined(__linux__) && defined(MAP_ANONYMOUS)
+#ifdef MAP_HUGETLB
+    length = (size + HUGE_HEADER + HUGE_PAGE_SIZE - 1) & ~(HUGE_PAGE_SIZE - 1);
+    base = mmap(NULL, length, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS | MAP_HUGETLB, -1, 0);
+    if (base != MAP_FAILED)
+        return huge_header(base, length, base + HUGE_HEADER, HUGE_KIND_HUGETLB);
+#endif
+    length = size + HUGE_HEADER + HUGE_PAGE_SIZE;
+    base = mmap(NULL, length, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (base != MAP_FAILED) {
+        char *address = (char *) (((uintptr_t) base + HUGE_HEADER + HUGE_PAGE_SIZE - 1) & ~(uintptr_t) (HUGE_PAGE_SIZE - 1));
+        int kind = HUGE_KIND_MMAP;
+#ifdef MADV_HUGEPAGE
+        if (thp_enabled() && madvise(address, size, MADV_HUGEPAGE) == 0)
+            kind = HUGE_KIND_THP;
+#endif
+        return huge_header(base, length, address, kind);
+    }
+#endif
+    length = size + HUGE_HEADER;
+    base = malloc(length);
+    if (base == NULL)
+        return NULL;
+    return huge_header(base, length, base + HUGE_HEADER, HUGE_KIND_MALLOC);
+}
+
+void huge_free(void *address)
+{
+    HugeHeader *header;
+    if (address == NULL)
+        return;
+    header = (HugeHeader *) ((char *) address - HUGE_HEADER);
+#if defined(__linux__) && defined(MAP_ANONYMOUS)
+    if (header->kind != HUGE_KIND_MALLOC) {
+        munmap(header->base, header->length);
+        return;
+    }
+#endif
+    free(header->base);
+}
+
+/* returns how an arena of huge_alloc() is backed */
+int huge_kind(void *address)
+{
+    return ((HugeHeader *) ((char *) address - HUGE_HEADER))->kind;
+}
+
+/* returns NUMA node of CPU which runs current thread, or -1 when it is unknown */
+int numa_node(void)
+{
+#if defined(__linux__) && defined(SYS_getcpu)
+    unsigned int cpu, node;
+    if (syscall(SYS_getcpu, &cpu, &node, NULL) == 0)
+        return (int) node;
+#endif
+    return -1;
+}
+
+Bool ppmd_state_init(CPpmd7 *p, unsigned int maxOrder, unsigned int memSize, ISzAlloc *allocator)
 {
     Ppmd7_Construct(p);
-    Ppmd7_Alloc(p, memSize, allocator);
+    if (!Ppmd7_Alloc(p, memSize, allocator))
+        return False;
     Ppmd7_Init(p, maxOrder);
+    return True;
 }
 
 void ppmd_state_close(CPpmd7 *ppmd, ISzAlloc *allocator)
@@ -253,29 +483,39 @@ void ppmd_state_close(CPpmd7 *ppmd, ISzAlloc *allocator)
 }
 
 void ppmd_compress_init(CPpmd7z_RangeEnc *rc, RawWriter *writer,
-                        void (*dst_write)(char*, int, void*), void *userdata)
+                        void (*dst_write)(char*, int, void*), void *userdata, char *buf, int size)
 {
     writer->Write = Write;
     writer->dst_write = dst_write;
     writer->userdata = userdata;
+    writer->buf = buf;
+    writer->size = size;
+    writer->pos = 0;
+    writer->restarts = 0;
+    writer->cutoffs = 0;
     rc->Stream = (IByteOut *) writer;
     Ppmd7z_RangeEnc_Init(rc);
 }
 
-int ppmd_decompress_init(CPpmd7z_RangeDec *rc, RawReader *reader,
-                         int (*src_readinto)(char*, int, void*), void *userdata)
+/* Attach reader to range decoder without reading initial bytes, which is used to resume a checkpoint. */
+void ppmd_decompress_attach(CPpmd7z_RangeDec *rc, RawReader *reader,
+                            int (*src_readinto)(char*, int, void*), void *userdata, char *buf, int size)
 {
-    reader->Read = Read;
-    reader->src_readinto = src_readinto;
-    reader->userdata = userdata;
+    reader_init(reader, src_readinto, userdata, buf, size);
     rc->Stream = (IByteIn *) reader;
+}
+
+int ppmd_decompress_init(CPpmd7z_RangeDec *rc, RawReader *reader,
+                         int (*src_readinto)(char*, int, void*), void *userdata, char *buf, int size)
+{
+    ppmd_decompress_attach(rc, reader, src_readinto, userdata, buf, size);
     Bool res = Ppmd7z_RangeDec_Init(rc);
     return res;
 }
 
-void ppmd8_malloc(CPpmd8 *p, unsigned int memSize, ISzAlloc *allocator)
+Bool ppmd8_malloc(CPpmd8 *p, unsigned int memSize, ISzAlloc *allocator)
 {
-    Ppmd8_Alloc(p, memSize, allocator);
+    return Ppmd8_Alloc(p, memSize, allocator);
 }
 
 void ppmd8_mfree(CPpmd8 *ppmd, ISzAlloc *allocator)
@@ -284,36 +524,333 @@ void ppmd8_mfree(CPpmd8 *ppmd, ISzAlloc *allocator)
 }
 
 void ppmd8_compress_init(CPpmd8 *p, RawWriter *writer,
-                         void (*dst_write)(char*, int, void*), void *userdata)
+                         void (*dst_write)(char*, int, void*), void *userdata, char *buf, int size)
 {
     writer->Write = Write;
     writer->dst_write = dst_write;
     writer->userdata = userdata;
+    writer->buf = buf;
+    writer->size = size;
+    writer->pos = 0;
+    writer->restarts = 0;
+    writer->cutoffs = 0;
     p->Stream.Out = (IByteOut *) writer;
 }
 
 void ppmd8_decompress_init(CPpmd8 *p, RawReader *reader,
-                         int (*src_readinto)(char*, int, void*), void *userdata)
+                         int (*src_readinto)(char*, int, void*), void *userdata, char *buf, int size)
 {
-    reader->Read = Read;
-    reader->src_readinto = src_readinto;
-    reader->userdata = userdata;
+    reader_init(reader, src_readinto, userdata, buf, size);
     p->Stream.In = (IByteIn *) reader;
 }
 
+/* A model restart, and a cut-off of PPMd var.I, resets Text to the start of arena. RestartModel also
+ * leaves only the root context at the top of units area. Counters are kept in I/O structure. */
+#define COUNT_RESTART(p, text, io) \
+    if ((p)->Text < (text)) { \
+        if ((p)->HiUnit == (p)->Base + (p)->AlignOffset + (p)->Size - 12) \
+            (io)->restarts++; \
+        else \
+            (io)->cutoffs++; \
+    }
+
 void ppmd_compress(CPpmd7 *p, CPpmd7z_RangeEnc *rc, char *buf, int size) {
-    unsigned char *c = buf;
-    while (c < buf + size) {
+    RawWriter *writer = (RawWriter *) rc->Stream;
+    unsigned char *c = (unsigned char *) buf;
+    unsigned char *end = c + size;
+    Byte *text;
+    while (c < end) {
+        text = p->Text;
         Ppmd7_EncodeSymbol(p, rc, *c++);
+        COUNT_RESTART(p, text, writer);
+    }
+}
+
+/* returns number of decoded bytes, and set status to -1 on end mark and -2 on data error */
+int ppmd_decompress(CPpmd7 *p, CPpmd7z_RangeDec *rc, char *buf, int size, int *status) {
+    RawReader *reader = (RawReader *) rc->Stream;
+    unsigned char *c = (unsigned char *) buf;
+    unsigned char *end = c + size;
+    Byte *text;
+    int sym = 0;
+    while (c < end) {
+        if (reader->len - reader->pos < reader->margin)
+            break;  /* wait for more input */
+        text = p->Text;
+        sym = Ppmd7_DecodeSymbol(p, rc);
+        if (sym < 0)
+            break;
+        COUNT_RESTART(p, text, reader);
+        if (reader->overrun) {
+            sym = -2;
+            break;
+        }
+        *c++ = sym;
+    }
+    *status = sym < 0 ? sym : 0;
+    return c - (unsigned char *) buf;
+}
+
+void ppmd8_compress(CPpmd8 *p, char *buf, int size) {
+    RawWriter *writer = (RawWriter *) p->Stream.Out;
+    unsigned char *c = (unsigned char *) buf;
+    unsigned char *end = c + size;
+    Byte *text;
+    while (c < end) {
+        text = p->Text;
+        Ppmd8_EncodeSymbol(p, *c++);
+        COUNT_RESTART(p, text, writer);
+    }
+}
+
+/* returns number of decoded bytes, and set status to -1 on end mark and -2 on data error */
+int ppmd8_decompress(CPpmd8 *p, char *buf, int size, int *status) {
+    RawReader *reader = (RawReader *) p->Stream.In;
+    unsigned char *c = (unsigned char *) buf;
+    unsigned char *end = c + size;
+    Byte *text;
+    int sym = 0;
+    while (c < end) {
+        if (reader->len - reader->pos < reader->margin)
+            break;  /* wait for more input */
+        text = p->Text;
+        sym = Ppmd8_DecodeSymbol(p);
+        if (sym < 0)
+            break;
+        COUNT_RESTART(p, text, reader);
+        if (reader->overrun) {
+            sym = -2;
+            break;
+        }
+        *c++ = sym;
+    }
+    *status = sym < 0 ? sym : 0;
+    return c - (unsigned char *) buf;
+}
+
+/* Encode whole data with end mark at once into dst. Returns a size of encoded data, which
+ * exceeds dstlen when dst is too small; the caller should retry with larger buffer. */
+int ppmd_compress_buffer(CPpmd7 *p, char *src, int srclen, char *dst, int dstlen) {
+    CPpmd7z_RangeEnc rc;
+    RawWriter writer;
+    ppmd_compress_init(&rc, &writer, NULL, NULL, dst, dstlen);
+    ppmd_compress(p, &rc, src, srclen);
+    Ppmd7_EncodeSymbol(p, &rc, -1);
+    Ppmd7z_RangeEnc_FlushData(&rc);
+    return writer.pos;
+}
+
+int ppmd8_compress_buffer(CPpmd8 *p, char *src, int srclen, char *dst, int dstlen) {
+    RawWriter writer;
+    ppmd8_compress_init(p, &writer, NULL, NULL, dst, dstlen);
+    Ppmd8_RangeEnc_Init(p);
+    ppmd8_compress(p, src, srclen);
+    Ppmd8_EncodeSymbol(p, -1);
+    Ppmd8_RangeEnc_FlushData(p);
+    return writer.pos;
+}
+
+/* Model snapshot saves used regions of arena, which are text area below Text and units areas
+ * [UnitsStart, LoUnit) and [HiUnit, end of arena), and the model struct with pointers as offsets
+ * from Base. References inside arena are offsets from Base on 64-bit, so a snapshot can be restored
+ * into another arena of the same size. On 32-bit, references are raw pointers and restore fails. */
+#define PTR_TO_REF(p, ptr) ((ptr) == NULL ? 0 : (UInt32)((Byte *)(ptr) - (p)->Base))
+#define REF_TO_PTR(base, ref) ((ref) == 0 ? NULL : (void *)((base) + (ref)))
+
+#define USED_SIZE(p) \
+    ((size_t)((p)->Text - (p)->Base - (p)->AlignOffset) + (size_t)((p)->LoUnit - (p)->UnitsStart) \
+     + (size_t)((p)->Base + (p)->AlignOffset + (p)->Size - (p)->HiUnit))
+
+#define SNAPSHOT(p, state, refs, arena) { \
+    Byte *text = (p)->Base + (p)->AlignOffset; \
+    Byte *end = text + (p)->Size; \
+    *(state) = *(p); \
+    (refs)->MinContext = PTR_TO_REF(p, (p)->MinContext); \
+    (refs)->MaxContext = PTR_TO_REF(p, (p)->MaxContext); \
+    (refs)->FoundState = PTR_TO_REF(p, (p)->FoundState); \
+    (refs)->LoUnit = PTR_TO_REF(p, (p)->LoUnit); \
+    (refs)->HiUnit = PTR_TO_REF(p, (p)->HiUnit); \
+    (refs)->Text = PTR_TO_REF(p, (p)->Text); \
+    (refs)->UnitsStart = PTR_TO_REF(p, (p)->UnitsStart); \
+    memcpy(arena, text, (p)->Text - text); \
+    arena += (p)->Text - text; \
+    memcpy(arena, (p)->UnitsStart, (p)->LoUnit - (p)->UnitsStart); \
+    arena += (p)->LoUnit - (p)->UnitsStart; \
+    memcpy(arena, (p)->HiUnit, end - (p)->HiUnit); \
+}
+
+#define RESTORE(p, base, refs, arena) { \
+    Byte *text = (base) + (p)->AlignOffset; \
+    Byte *end = text + (p)->Size; \
+    (p)->Base = (base); \
+    (p)->MinContext = REF_TO_PTR(base, (refs)->MinContext); \
+    (p)->MaxContext = REF_TO_PTR(base, (refs)->MaxContext); \
+    (p)->FoundState = REF_TO_PTR(base, (refs)->FoundState); \
+    (p)->LoUnit = REF_TO_PTR(base, (refs)->LoUnit); \
+    (p)->HiUnit = REF_TO_PTR(base, (refs)->HiUnit); \
+    (p)->Text = REF_TO_PTR(base, (refs)->Text); \
+    (p)->UnitsStart = REF_TO_PTR(base, (refs)->UnitsStart); \
+    memcpy(text, arena, (p)->Text - text); \
+    arena += (p)->Text - text; \
+    memcpy((p)->UnitsStart, arena, (p)->LoUnit - (p)->UnitsStart); \
+    arena += (p)->LoUnit - (p)->UnitsStart; \
+    memcpy((p)->HiUnit, arena, end - (p)->HiUnit); \
+}
+
+size_t ppmd7_used_size(CPpmd7 *p)
+{
+    return USED_SIZE(p);
+}
+
+void ppmd7_snapshot(CPpmd7 *p, CPpmd7 *state, PpmdRefs *refs, char *arena)
+{
+    SNAPSHOT(p, state, refs, arena);
+}
+
+/* Restore a snapshot into allocated model of the same size. */
+Bool ppmd7_restore(CPpmd7 *p, CPpmd7 *state, PpmdRefs *refs, char *arena)
+{
+#ifdef PPMD_32BIT
+    return False;
+#else
+    Byte *base = p->Base;
+    if (state->Size != p->Size || state->AlignOffset != p->AlignOffset)
+        return False;
+    *p = *state;
+    RESTORE(p, base, refs, arena);
+    return True;
+#endif
+}
+
+size_t ppmd8_used_size(CPpmd8 *p)
+{
+    return USED_SIZE(p);
+}
+
+void ppmd8_snapshot(CPpmd8 *p, CPpmd8 *state, PpmdRefs *refs, char *arena)
+{
+    SNAPSHOT(p, state, refs, arena);
+}
+
+/* Restore a snapshot into allocated model of the same size. Range coder of p is kept. */
+Bool ppmd8_restore(CPpmd8 *p, CPpmd8 *state, PpmdRefs *refs, char *arena)
+{
+#ifdef PPMD_32BIT
+    return False;
+#else
+    Byte *base = p->Base;
+    UInt32 range = p->Range, code = p->Code, low = p->Low;
+    IByteIn *in = p->Stream.In;
+    if (state->Size != p->Size || state->AlignOffset != p->AlignOffset)
+        return False;
+    *p = *state;
+    p->Range = range;
+    p->Code = code;
+    p->Low = low;
+    p->Stream.In = in;
+    RESTORE(p, base, refs, arena);
+    return True;
+#endif
+}
+
+/* Batch functions process items src[src_offsets[i]:src_offsets[i + 1]] for i < n independently with one model,
+ * which is initialized, and primed when state is not NULL, for each item. Output of items is stored in dst
+ * contiguously, and dst_offsets[i + 1] gets an end of output of item i. dst_offsets[0] should be set by caller. */
+#define BATCH_CAPACITY(dstlen, pos) ((pos) < (dstlen) ? ((dstlen) - (pos) < INT_MAX ? (int)((dstlen) - (pos)) : INT_MAX) : 0)
+#define BATCH_BUFFER(dst, dstlen, pos) ((pos) < (dstlen) ? (dst) + (pos) : NULL)
+
+/* Return a total size of output, which exceeds dstlen when dst is too small. */
+size_t ppmd7_compress_batch(CPpmd7 *p, unsigned order, CPpmd7 *state, PpmdRefs *refs, char *arena,
+                            char *src, size_t *src_offsets, int n, char *dst, size_t dstlen, size_t *dst_offsets)
+{
+    size_t pos = dst_offsets[0];
+    int i;
+    for (i = 0; i < n; i++) {
+        Ppmd7_Init(p, order);
+        if (state != NULL)
+            ppmd7_restore(p, state, refs, arena);
+        pos += ppmd_compress_buffer(p, src + src_offsets[i], (int)(src_offsets[i + 1] - src_offsets[i]),
+                                    BATCH_BUFFER(dst, dstlen, pos), BATCH_CAPACITY(dstlen, pos));
+        dst_offsets[i + 1] = pos;
     }
+    return pos;
 }
 
-int ppmd_decompress(CPpmd7 *p, CPpmd7z_RangeDec *rc, char *buf, int size) {
-    unsigned char *c = buf;
-    while (c < buf + size) {
-        *c++ = Ppmd7_DecodeSymbol(p, rc);
+/* Return an index of the first item which is not decoded, which is n when all items are decoded.
+ * Status is -2 when the item is corrupted, or 0 when its output doesn't fit in dst. */
+int ppmd7_decompress_batch(CPpmd7 *p, unsigned order, CPpmd7 *state, PpmdRefs *refs, char *arena,
+                           char *src, size_t *src_offsets, int n, int start,
+                           char *dst, size_t dstlen, size_t *dst_offsets, int *status)
+{
+    CPpmd7z_RangeDec rc;
+    RawReader reader;
+    int i, size, capacity;
+    *status = 0;
+    for (i = start; i < n; i++) {
+        if (!ppmd_decompress_init(&rc, &reader, NULL, NULL, src + src_offsets[i],
+                                  (int)(src_offsets[i + 1] - src_offsets[i]))) {
+            *status = -2;
+            return i;
+        }
+        Ppmd7_Init(p, order);
+        if (state != NULL)
+            ppmd7_restore(p, state, refs, arena);
+        capacity = BATCH_CAPACITY(dstlen, dst_offsets[i]);
+        size = ppmd_decompress(p, &rc, BATCH_BUFFER(dst, dstlen, dst_offsets[i]), capacity, status);
+        if (*status != -1) {
+            if (size < capacity)
+                *status = -2;
+            return i;
+        }
+        dst_offsets[i + 1] = dst_offsets[i] + size;
+    }
+    *status = 0;
+    return n;
+}
+
+size_t ppmd8_compress_batch(CPpmd8 *p, unsigned order, unsigned restore, CPpmd8 *state, PpmdRefs *refs, char *arena,
+                            char *src, size_t *src_offsets, int n, char *dst, size_t dstlen, size_t *dst_offsets)
+{
+    size_t pos = dst_offsets[0];
+    int i;
+    for (i = 0; i < n; i++) {
+        Ppmd8_Init(p, order, restore);
+        if (state != NULL)
+            ppmd8_restore(p, state, refs, arena);
+        pos += ppmd8_compress_buffer(p, src + src_offsets[i], (int)(src_offsets[i + 1] - src_offsets[i]),
+                                     BATCH_BUFFER(dst, dstlen, pos), BATCH_CAPACITY(dstlen, pos));
+        dst_offsets[i + 1] = pos;
+    }
+    return pos;
+}
+
+int ppmd8_decompress_batch(CPpmd8 *p, unsigned order, unsigned restore, CPpmd8 *state, PpmdRefs *refs, char *arena,
+                           char *src, size_t *src_offsets, int n, int start,
+                           char *dst, size_t dstlen, size_t *dst_offsets, int *status)
+{
+    RawReader reader;
+    int i, size, capacity;
+    *status = 0;
+    for (i = start; i < n; i++) {
+        ppmd8_decompress_init(p, &reader, NULL, NULL, src + src_offsets[i], (int)(src_offsets[i + 1] - src_offsets[i]));
+        if (!Ppmd8_RangeDec_Init(p)) {
+            *status = -2;
+            return i;
+        }
+        Ppmd8_Init(p, order, restore);
+        if (state != NULL)
+            ppmd8_restore(p, state, refs, arena);
+        capacity = BATCH_CAPACITY(dstlen, dst_offsets[i]);
+        size = ppmd8_decompress(p, BATCH_BUFFER(dst, dstlen, dst_offsets[i]), capacity, status);
+        if (*status != -1) {
+            if (size < capacity)
+                *status = -2;
+            return i;
+        }
+        dst_offsets[i + 1] = dst_offsets[i] + size;
     }
-    return size;
+    *status = 0;
+    return n;
 }
 ''', sources=sources, include_dirs=[src_root])
 
@@ -17,13 +17,27 @@
 #
 
 import argparse
+import asyncio
+import bisect
+import builtins
+import collections
+import contextlib
+import functools
+import io
+import itertools
+import math
+import mmap
 import os
 import pathlib
+import stat
 import struct
 import sys
+import threading
 import time
+import weakref
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Any, BinaryIO, Optional
+from typing import Any, BinaryIO, List, Optional, Tuple
 
 try:
     from importlib.metadata import PackageNotFoundError
@@ -43,7 +57,31 @@ except PackageNotFoundError:  # pragma: no-cover
 from _ppmd import ffi, lib  # type: ignore  # noqa
 
 _PPMD_HEADER_MAGIC = b'\x8f\xaf\xac\x84'
+_PPMD_FRAMED_MAGIC = b'\x8f\xaf\xac\x85'
+_FRAMED_HEADER = struct.Struct('<4sBBBBII')  # magic, format version, version, order, restore, mem, block size
+_FRAME_HEADER = struct.Struct('<BII')  # flags, compressed size, uncompressed size
+_FRAME_STORED = 0x01  # flag of a frame which holds uncompressed data
+_PPMD_SEEKTABLE_MAGIC = b'\x8f\xaf\xac\x86'
+_SEEKTABLE_ENTRY = struct.Struct('<II')  # compressed size, uncompressed size of a frame
+_SEEKTABLE_FOOTER = struct.Struct('<I4s')  # number of frames, magic
+_PPMD_MODEL_MAGIC = b'\x8f\xaf\xac\x87'
+# magic, format version, byte order, version, order, restore, mem, scalar fields of model,
+# references, size of tables and size of arena
+_MODEL_HEADER = struct.Struct('<4sBBBBBIIIIIIiiII7IIQ')
+_MODEL_REFS = ('MinContext', 'MaxContext', 'FoundState', 'LoUnit', 'HiUnit', 'Text', 'UnitsStart')
+_PPMD_CHECKPOINT_MAGIC = b'\x8f\xaf\xac\x88'
+# magic, format version, kind of coder, finished, range coder Low, Range, Cache, CacheSize, Code,
+# size of read-ahead data; read-ahead data and a model follow
+_CHECKPOINT_HEADER = struct.Struct('<4sBBBQIBQII')
+_CHECKPOINT_ENCODER = 0
+_CHECKPOINT_DECODER = 1
 READ_BLOCKSIZE = 16384
+WRITE_BLOCKSIZE = 65536
+FRAME_BLOCKSIZE = 4 << 20
+TUNE_SAMPLESIZE = 1 << 20
+_STREAM_BUFSIZE = 1 << 20
+_MAP_WINDOW = 1 << 30  # coders take int length
+_ENTROPY_SAMPLESIZE = 64 << 10
 
 _PPMD7_MIN_ORDER = 2
 _PPMD7_MAX_ORDER = 64
@@ -51,6 +89,15 @@ _PPMD7_MAX_ORDER = 64
 _PPMD7_MIN_MEM_SIZE = 1 << 11
 _PPMD7_MAX_MEM_SIZE = 0xFFFFFFFF - 12 * 3
 
+_PPMD8_MIN_ORDER = 2
+_PPMD8_MAX_ORDER = 16
+
+_PPMD8_MIN_MEM_SIZE = 1 << 11
+_PPMD8_MAX_MEM_SIZE = 0xFFFFFFFF - 12 * 3
+
+# orders which tune_parameters() tries; PpmdHeader can record order up to 16
+_TUNE_ORDERS = (2, 3, 4, 6, 8, 12, 16)
+
 
 def dostime_to_dt(dosdate, dostime):
     """Convert a DOS time to a Python time tuple."""
@@ -81,71 +128,470 @@ def datetime_to_timestamp(dt):
 def dst_write(b: bytes, size: int, userdata: object) -> None:
     encoder = ffi.from_handle(userdata)
     buf = ffi.buffer(b, size)
+    start = time.perf_counter()
     encoder.destination.write(buf)
+    encoder._stats.time_io += time.perf_counter() - start
+    encoder._stats.bytes_out += size
 
 
 @ffi.def_extern()
 def src_readinto(b: bytes, size: int, userdata: object) -> int:
     decoder = ffi.from_handle(userdata)
-    buf = ffi.buffer(b, size)
-    result = decoder.source.readinto(buf)
+    start = time.perf_counter()
+    if isinstance(decoder.source, _MappedSource):
+        result = decoder.source.lend(decoder.reader)
+    else:
+        result = decoder.source.readinto(ffi.buffer(b, size))
+    decoder._stats.time_io += time.perf_counter() - start
+    if result:
+        decoder._stats.bytes_in += result
     return result
 
 
-_allocated = []
+class _CoderStats:
+    """Counters of an encoder or a decoder, which are cheap enough to be always updated."""
 
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.symbols = 0
+        self.restarts = 0
+        self.cutoffs = 0
+        self.time_total = 0.0
+        self.time_io = 0.0
 
-@ffi.def_extern()
-def raw_alloc(size: int) -> object:
-    if size == 0:
-        return ffi.NULL
-    block = ffi.new("char[]", size)
-    _allocated.append(block)
-    return block
+    def carry(self, rawio) -> None:
+        """Keep counters of RawWriter or RawReader before it is initialized again."""
+        self.restarts += rawio.restarts
+        self.cutoffs += rawio.cutoffs
 
+    def as_dict(self, rawio, ppmd, closed: bool) -> dict:
+        if closed:
+            used = size = 0
+        else:
+            size = ppmd.Size
+            used = size - (ppmd.HiUnit - ppmd.LoUnit) - (ppmd.UnitsStart - ppmd.Text)
+        return {
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'symbols': self.symbols,
+            'restarts': self.restarts + (0 if closed else rawio.restarts),
+            'cutoffs': self.cutoffs + (0 if closed else rawio.cutoffs),
+            'memory_used': used,
+            'memory_size': size,
+            'time_c': max(self.time_total - self.time_io, 0.0),
+            'time_io': self.time_io,
+        }
+
+
+def _check_bufsize(bufsize: int) -> None:
+    if not 0 < bufsize <= 0x7FFFFFFF:
+        raise ValueError("Buffer size should be positive and less than 2GB.")
+
+
+def _unused_data(reader) -> bytes:
+    return ffi.unpack(reader.buf + reader.pos, reader.len - reader.pos)
+
+
+def _push_back(source: BinaryIO, reader) -> None:
+    """Return read-ahead data to seekable source at the end of stream."""
+    remaining = reader.len - reader.pos
+    if remaining > 0 and getattr(source, 'seekable', None) and source.seekable():
+        source.seek(-remaining, io.SEEK_CUR)
+        reader.pos = reader.len
+
+
+def _resume_reader(reader, pending: bytes) -> None:
+    """Refill a buffer of reader with data read ahead before a checkpoint."""
+    ffi.memmove(reader.buf, pending, len(pending))
+    reader.pos = 0
+    reader.len = len(pending)
+
+
+def _decode_all(decoder) -> bytes:
+    """Decode until an end mark."""
+    outbuf = bytearray()
+    buf = ffi.new('char[]', READ_BLOCKSIZE)
+    while not decoder.eof:
+        size = decoder._decode(buf, READ_BLOCKSIZE)
+        outbuf += ffi.buffer(buf, size)
+        if decoder._status[0] == -2:
+            raise ValueError("Corrupted PPMd data.")
+    return bytes(outbuf)
+
+
+def _new_allocator(huge_pages: bool = False):
+    """Return an allocator of model memory, which allocates it on huge pages when huge_pages is True.
+
+    On Linux, huge pages reserved by administrator (MAP_HUGETLB) are tried first, and then transparent
+    huge pages with MADV_HUGEPAGE. Elsewhere, or when they are not available, model memory is allocated
+    with malloc() as usual, so it is safe to enable on any platform.
+    """
+    allocator = ffi.new('ISzAlloc *')
+    if huge_pages:
+        allocator.Alloc = lib.huge_alloc
+        allocator.Free = lib.huge_free
+    else:
+        allocator.Alloc = lib.raw_alloc
+        allocator.Free = lib.raw_free
+    return allocator
 
-@ffi.def_extern()
-def raw_free(o: object) -> None:
-    if o in _allocated:
-        _allocated.remove(o)
+
+class PpmdModel:
+    """Snapshot of a PPMd model trained by `train_model()`.
+
+    It primes encoders and decoders, which are constructed with the same parameters,
+    by copying trained state instead of starting from an empty model.
+    """
+
+    def __init__(self, version: int, order: int, mem: int, restore: int, state, refs, arena):
+        self.version = version  # type: int
+        self.order = order  # type: int
+        self.mem = mem  # type: int
+        self.restore = restore  # type: int
+        self._state = state
+        self._refs = refs
+        self._arena = arena
+
+    @property
+    def size(self) -> int:
+        """Size of a used part of model memory in bytes."""
+        return len(self._arena)
+
+    def save(self, file) -> None:
+        """Write the model to a path or a binary file object, which `load_model()` reads."""
+        if not hasattr(file, 'write'):
+            with builtins.open(file, 'wb') as f:
+                self.save(f)
+            return
+        ctype = 'CPpmd7' if self.version == 7 else 'CPpmd8'
+        state = self._state
+        flag = state.HiBitsFlag if self.version == 7 else state.RestoreMethod
+        tables = ffi.buffer(state)[ffi.offsetof(ctype, 'Indx2Units'):]
+        refs = [getattr(self._refs, name) for name in _MODEL_REFS]
+        file.write(_MODEL_HEADER.pack(_PPMD_MODEL_MAGIC, 1, sys.byteorder == 'little', self.version, self.order,
+                                      self.restore, self.mem, state.OrderFall, state.InitEsc, state.PrevSuccess,
+                                      state.MaxOrder, flag, state.RunLength, state.InitRL, state.GlueCount,
+                                      state.AlignOffset, *refs, len(tables), len(self._arena)))
+        file.write(tables)
+        file.write(ffi.buffer(self._arena))
+
+
+def load_model(file) -> PpmdModel:
+    """Load a model written by `PpmdModel.save()` from a path or a binary file object.
+
+    A file is memory-mapped read-only when possible, so processes which load a same file share
+    one copy of the model in page cache. Load only trusted files.
+    """
+    if not hasattr(file, 'read'):
+        with builtins.open(file, 'rb') as f:
+            return load_model(f)
+    start = file.tell()
+    try:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)  # type: Any
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        data = file.read()
+        start = 0
+    view = memoryview(data)[start:]
+    if len(view) < _MODEL_HEADER.size:
+        raise ValueError("Corrupted PPMd model.")
+    header = _MODEL_HEADER.unpack_from(view)
+    (magic, fmt, little, version, order, restore, mem, order_fall, init_esc, prev_success, max_order, flag,
+     run_length, init_rl, glue_count, align_offset) = header[:16]
+    refs_values = header[16:23]
+    tables_size, arena_size = header[23:]
+    if magic != _PPMD_MODEL_MAGIC or fmt != 1:
+        raise ValueError("Not a PPMd model.")
+    if bool(little) != (sys.byteorder == 'little'):
+        raise ValueError("PPMd model of other byte order is not supported.")
+    _check_parameters(version, order, mem, restore)
+    ctype = 'CPpmd7' if version == 7 else 'CPpmd8'
+    state = ffi.new(ctype + ' *')
+    offset = ffi.offsetof(ctype, 'Indx2Units')
+    if tables_size != ffi.sizeof(ctype) - offset:
+        raise ValueError("PPMd model is not supported on this platform.")
+    # regions should be ordered in arena, and their total should be as same as a size of saved arena.
+    min_context, max_context, found_state, lo_unit, hi_unit, text, units_start = refs_values
+    end = align_offset + mem
+    if not (0 < align_offset <= text <= units_start <= lo_unit <= hi_unit <= end
+            and all(align_offset <= ref < end for ref in (min_context, max_context, found_state))
+            and arena_size == (text - align_offset) + (lo_unit - units_start) + (end - hi_unit)
+            and len(view) == _MODEL_HEADER.size + tables_size + arena_size):
+        raise ValueError("Corrupted PPMd model.")
+    tables = view[_MODEL_HEADER.size:_MODEL_HEADER.size + tables_size]
+    ffi.memmove(ffi.cast('char *', state) + offset, tables, tables_size)
+    state.OrderFall = order_fall
+    state.InitEsc = init_esc
+    state.PrevSuccess = prev_success
+    state.MaxOrder = max_order
+    if version == 7:
+        state.HiBitsFlag = flag
+    else:
+        state.RestoreMethod = flag
+    state.RunLength = run_length
+    state.InitRL = init_rl
+    state.Size = mem
+    state.GlueCount = glue_count
+    state.AlignOffset = align_offset
+    refs = ffi.new('PpmdRefs *')
+    for name, value in zip(_MODEL_REFS, refs_values):
+        setattr(refs, name, value)
+    arena = ffi.from_buffer(view[_MODEL_HEADER.size + tables_size:])
+    return PpmdModel(version, order, mem, restore, state, refs, arena)
+
+
+def _check_model(model: Optional[PpmdModel], version: int, order: int, mem: int, restore: int = 0) -> None:
+    if model is not None and (model.version, model.order, model.mem, model.restore) != (version, order, mem, restore):
+        raise ValueError("PPMd model parameters do not match.")
+
+
+def _restore_model(ppmd, model: Optional[PpmdModel], version: int, order: int, mem: int, restore: int = 0) -> None:
+    if model is None:
+        return
+    _check_model(model, version, order, mem, restore)
+    restore_model = lib.ppmd7_restore if version == 7 else lib.ppmd8_restore
+    if not restore_model(ppmd, model._state, model._refs, model._arena):
+        raise ValueError("PPMd model is not supported on this platform.")
+
+
+def _snapshot(ppmd, version: int, order: int, mem: int, restore: int = 0) -> PpmdModel:
+    """Copy a live model into a new snapshot."""
+    ctype = 'CPpmd7' if version == 7 else 'CPpmd8'
+    state = ffi.new(ctype + ' *')
+    refs = ffi.new('PpmdRefs *')
+    if version == 7:
+        arena = ffi.new('char[]', lib.ppmd7_used_size(ppmd))
+        lib.ppmd7_snapshot(ppmd, state, refs, arena)
+    else:
+        arena = ffi.new('char[]', lib.ppmd8_used_size(ppmd))
+        lib.ppmd8_snapshot(ppmd, state, refs, arena)
+    return PpmdModel(version, order, mem, restore, state, refs, arena)
+
+
+def train_model(sample, order: int = 6, mem: int = 16 << 20, version: int = 8, restore: int = 0) -> PpmdModel:
+    """Train a model on bytes-like sample data, and return its snapshot.
+
+    Pass the model to encoders and decoders as `model=` argument. Small payloads which are similar
+    to the sample are compressed better and faster. `mem` is a size of model memory in bytes.
+    """
+    _check_parameters(version, order, mem, restore)
+    inbuf = ffi.from_buffer(sample)
+    allocator = _new_allocator()
+    writer = ffi.new('RawWriter *')
+    if version == 7:
+        ppmd = ffi.new('CPpmd7 *')
+        if not lib.ppmd_state_init(ppmd, order, mem, allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        try:
+            rc = ffi.new('CPpmd7z_RangeEnc *')
+            # encoded data is only counted and discarded
+            lib.ppmd_compress_init(rc, writer, ffi.NULL, ffi.NULL, ffi.NULL, 0)
+            lib.ppmd_compress(ppmd, rc, inbuf, len(inbuf))
+            return _snapshot(ppmd, version, order, mem)
+        finally:
+            lib.ppmd_state_close(ppmd, allocator)
+    ppmd = ffi.new('CPpmd8 *')
+    lib.Ppmd8_Construct(ppmd)
+    if not lib.ppmd8_malloc(ppmd, mem, allocator):
+        raise MemoryError("Failed to allocate memory for PPMd model.")
+    try:
+        lib.ppmd8_compress_init(ppmd, writer, ffi.NULL, ffi.NULL, ffi.NULL, 0)
+        ppmd.Low = 0
+        ppmd.Range = 0xFFFFFFFF
+        lib.Ppmd8_Init(ppmd, order, restore)
+        lib.ppmd8_compress(ppmd, inbuf, len(inbuf))
+        return _snapshot(ppmd, version, order, mem, restore)
+    finally:
+        lib.ppmd8_mfree(ppmd, allocator)
+
+
+def _save_checkpoint(file, model: PpmdModel, kind: int, finished: bool, rc: Tuple[int, int, int, int, int],
+                     pending: bytes = b'') -> Optional[bytes]:
+    """Write a checkpoint of a coder to a path or a binary file object, or return it as bytes when file is None."""
+    if file is None:
+        with io.BytesIO() as f:
+            _save_checkpoint(f, model, kind, finished, rc, pending)
+            return f.getvalue()
+    if not hasattr(file, 'write'):
+        with builtins.open(file, 'wb') as f:
+            return _save_checkpoint(f, model, kind, finished, rc, pending)
+    file.write(_CHECKPOINT_HEADER.pack(_PPMD_CHECKPOINT_MAGIC, 1, kind, finished, *rc, len(pending)))
+    file.write(pending)
+    model.save(file)
+    return None
+
+
+def _load_checkpoint(checkpoint, kind: int, version: int, order: int, mem: int, restore: int = 0):
+    """Read a checkpoint from bytes-like data, a path or a binary file object.
+
+    Return a model, a finished flag, fields of range coder and read-ahead data.
+    """
+    if hasattr(checkpoint, 'read'):
+        data = checkpoint.read()
+    elif isinstance(checkpoint, (str, os.PathLike)):
+        with builtins.open(checkpoint, 'rb') as f:
+            data = f.read()
+    else:
+        data = checkpoint
+    view = memoryview(data)
+    if len(view) < _CHECKPOINT_HEADER.size:
+        raise ValueError("Corrupted PPMd checkpoint.")
+    header = _CHECKPOINT_HEADER.unpack_from(view)
+    magic, fmt, checkpoint_kind, finished = header[:4]
+    rc = header[4:9]
+    start = _CHECKPOINT_HEADER.size + header[9]
+    if magic != _PPMD_CHECKPOINT_MAGIC or fmt != 1:
+        raise ValueError("Not a PPMd checkpoint.")
+    if len(view) < start:
+        raise ValueError("Corrupted PPMd checkpoint.")
+    model = load_model(io.BytesIO(view[start:]))
+    if (checkpoint_kind, model.version, model.order, model.mem, model.restore) != (kind, version, order, mem, restore):
+        raise ValueError("PPMd checkpoint parameters do not match.")
+    return model, bool(finished), rc, bytes(view[_CHECKPOINT_HEADER.size:start])
+
+
+def tune_parameters(sample, size: Optional[int] = None, version: int = 8, mem: int = 256 << 20,
+                    tolerance: float = 0.02, order: Optional[int] = None) -> Tuple[int, int, int]:
+    """Choose order, mem and restore for data from a bytes-like sample of its beginning.
+
+    Orders from 2 to 16 are tried on the sample, and the lowest order whose compressed size is
+    within `tolerance` of the best one is chosen, because lower orders are faster. Model memory is
+    estimated from memory used for the sample scaled to `size` bytes of whole data, and rounded up to
+    a power of two within `mem` budget in bytes. When the model is expected to exceed the budget,
+    PPMd var.I cuts off a model (restore=1) instead of restarting it. When `order` is given,
+    only mem and restore are chosen for it.
+    Returns a tuple of (order, mem, restore); mem is in bytes and is 1MB at least.
+    """
+    orders = _TUNE_ORDERS if order is None else (order,)
+    _check_parameters(version, orders[0], mem, 0)
+    if mem < 1 << 20:
+        raise ValueError("PPMd wrong parameters.")
+    if size is None:
+        size = len(sample)
+    if len(sample) == 0:
+        return 6 if order is None else order, 1 << 20, 0
+    results = []
+    for candidate in orders:
+        with io.BytesIO() as dst:
+            if version == 7:
+                encoder = Ppmd7Encoder(dst, candidate, mem, endmark=True)  # type: Any
+            else:
+                encoder = Ppmd8Encoder(dst, candidate, mem, 0)
+            with encoder:
+                encoder.encode(sample)
+                encoder.flush()
+                stats = encoder.stats()
+        results.append((candidate, stats['bytes_out'], stats['memory_used'], stats['restarts']))
+    best = min(compressed for _, compressed, _, _ in results)
+    order, _, used, restarts = next(r for r in results if r[1] <= best * (1 + tolerance))
+    if restarts > 0:
+        estimate = mem + 1
+    else:
+        estimate = used * max(size, len(sample)) // len(sample)
+    chosen = 1 << 20
+    while chosen < estimate and chosen < mem:
+        chosen <<= 1
+    restore = 1 if version == 8 and estimate > mem else 0
+    return order, min(chosen, mem), restore
 
 
 class Ppmd7Encoder:
 
-    def __init__(self, destination: BinaryIO, max_order: int, mem_size: int):
+    def __init__(self, destination: BinaryIO, max_order: int, mem_size: int, endmark: bool = False,
+                 bufsize: int = WRITE_BLOCKSIZE, model: Optional[PpmdModel] = None, checkpoint: Any = None,
+                 huge_pages: bool = False):
+        """Encode into destination. When checkpoint is given, a stream continues from the state saved by
+        `checkpoint()` of an encoder with the same parameters, and destination should follow data written
+        until then. When huge_pages is True, model memory is allocated on huge pages where available."""
         if mem_size > sys.maxsize:
             raise ValueError("Mem_size exceed to platform limit.")
+        _check_bufsize(bufsize)
         if _PPMD7_MIN_ORDER <= max_order <= _PPMD7_MAX_ORDER and _PPMD7_MIN_MEM_SIZE <= mem_size <= _PPMD7_MAX_MEM_SIZE:
             self.closed = False
             self.flushed = False
+            self.endmark = endmark
             self.destination = destination
             self.ppmd = ffi.new('CPpmd7 *')
             self.rc = ffi.new('CPpmd7z_RangeEnc *')
             self.writer = ffi.new('RawWriter *')
-            self._allocator = ffi.new('ISzAlloc *')
-            self._allocator.Alloc = lib.raw_alloc
-            self._allocator.Free = lib.raw_free
+            self._outbuf = ffi.new('char[]', bufsize)
+            self._allocator = _new_allocator(huge_pages)
             self._userdata = ffi.new_handle(self)
-            lib.ppmd_state_init(self.ppmd, max_order, mem_size, self._allocator)
-            lib.ppmd_compress_init(self.rc, self.writer, lib.dst_write, self._userdata)
+            self._stats = _CoderStats()
+            if not lib.ppmd_state_init(self.ppmd, max_order, mem_size, self._allocator):
+                raise MemoryError("Failed to allocate memory for PPMd model.")
+            self._finalizer = weakref.finalize(self, lib.ppmd_state_close, self.ppmd, self._allocator)
+            self._max_order = max_order
+            self._mem_size = mem_size
+            self._model = model
+            _restore_model(self.ppmd, model, 7, max_order, mem_size)
+            lib.ppmd_compress_init(self.rc, self.writer, lib.dst_write, self._userdata, self._outbuf, bufsize)
+            if checkpoint is not None:
+                state, self.flushed, rc, _ = _load_checkpoint(checkpoint, _CHECKPOINT_ENCODER, 7, max_order, mem_size)
+                _restore_model(self.ppmd, state, 7, max_order, mem_size)
+                self.rc.Low, self.rc.Range, self.rc.Cache, self.rc.CacheSize, _ = rc
         else:
             raise ValueError("PPMd wrong parameters.")
 
+    def reset(self, destination: Optional[BinaryIO] = None) -> None:
+        """Start a new stream with an initial model, keeping model memory allocated.
+
+        Data which is not flushed is discarded. When destination is given, the new stream is written to it.
+        """
+        if self.closed:
+            raise ValueError("Encoder has been closed.")
+        if destination is not None:
+            self.destination = destination
+        self.flushed = False
+        self._stats.carry(self.writer)
+        lib.Ppmd7_Init(self.ppmd, self._max_order)
+        _restore_model(self.ppmd, self._model, 7, self._max_order, self._mem_size)
+        lib.ppmd_compress_init(self.rc, self.writer, lib.dst_write, self._userdata, self._outbuf, len(self._outbuf))
+
     def encode(self, data: bytes) -> None:
         inbuf = ffi.from_buffer(data)
+        start = time.perf_counter()
         lib.ppmd_compress(self.ppmd, self.rc, inbuf, len(data))
+        self._stats.time_total += time.perf_counter() - start
+        self._stats.bytes_in += len(inbuf)
+        self._stats.symbols += len(inbuf)
 
     def flush(self):
         if self.flushed:
             return
         self.flushed = True
+        start = time.perf_counter()
+        if self.endmark:
+            lib.Ppmd7_EncodeSymbol(self.ppmd, self.rc, -1)
+            self._stats.symbols += 1
         lib.Ppmd7z_RangeEnc_FlushData(self.rc)
+        lib.ppmd_writer_flush(self.writer)
+        self._stats.time_total += time.perf_counter() - start
+
+    def checkpoint(self, file: Any = None) -> Optional[bytes]:
+        """Save live state of encoder to a path or a binary file object, or return it as bytes when file is omitted.
+
+        Buffered output is written to destination first, so the stream continues bit-exactly from a checkpoint
+        by an encoder constructed with `checkpoint=` argument, when its destination follows data written so far.
+        """
+        if self.closed:
+            raise ValueError("Encoder has been closed.")
+        lib.ppmd_writer_flush(self.writer)
+        model = _snapshot(self.ppmd, 7, self._max_order, self._mem_size)
+        rc = (self.rc.Low, self.rc.Range, self.rc.Cache, self.rc.CacheSize, 0)
+        return _save_checkpoint(file, model, _CHECKPOINT_ENCODER, self.flushed, rc)
+
+    def stats(self) -> dict:
+        """Return counters of encoder, which are accumulated over streams."""
+        return self._stats.as_dict(self.writer, self.ppmd, self.closed)
 
     def close(self):
         if self.closed:
             return
         self.closed = True
-        lib.ppmd_state_close(self.ppmd, self._allocator)
+        lib.ppmd_writer_flush(self.writer)
+        self._stats.carry(self.writer)
+        self._finalizer()
         ffi.release(self.ppmd)
         ffi.release(self.writer)
         ffi.release(self.rc)
@@ -161,37 +607,131 @@ class Ppmd7Encoder:
 
 class Ppmd7Decoder:
 
-    def __init__(self, source: BinaryIO, max_order: int, mem_size: int):
+    def __init__(self, source: BinaryIO, max_order: int, mem_size: int, endmark: bool = False,
+                 bufsize: int = READ_BLOCKSIZE, model: Optional[PpmdModel] = None, checkpoint: Any = None,
+                 huge_pages: bool = False):
+        """Decode from source. When checkpoint is given, decoding continues from the state saved by
+        `checkpoint()` of a decoder with the same parameters, and source should be at the position
+        where the saved decoder read up to. When huge_pages is True, model memory is allocated on huge pages
+        where available."""
         if not source.readable:
             raise ValueError("Source stream is not readable")
         if mem_size > sys.maxsize:
             raise ValueError("Mem_size exceed to platform limit.")
+        _check_bufsize(bufsize)
         if _PPMD7_MIN_ORDER <= max_order <= _PPMD7_MAX_ORDER and _PPMD7_MIN_MEM_SIZE <= mem_size <= _PPMD7_MAX_MEM_SIZE:
             self.ppmd = ffi.new('CPpmd7 *')
-            self._allocator = ffi.new('ISzAlloc *')
-            self._allocator.Alloc = lib.raw_alloc
-            self._allocator.Free = lib.raw_free
-            lib.ppmd_state_init(self.ppmd, max_order, mem_size, self._allocator)
+            self._allocator = _new_allocator(huge_pages)
+            if not lib.ppmd_state_init(self.ppmd, max_order, mem_size, self._allocator):
+                raise MemoryError("Failed to allocate memory for PPMd model.")
+            self._finalizer = weakref.finalize(self, lib.ppmd_state_close, self.ppmd, self._allocator)
+            self._max_order = max_order
+            self._mem_size = mem_size
+            self._model = model
+            _restore_model(self.ppmd, model, 7, max_order, mem_size)
+            if checkpoint is not None:
+                state, finished, rc, pending = _load_checkpoint(checkpoint, _CHECKPOINT_DECODER, 7, max_order,
+                                                                mem_size)
+                bufsize = max(bufsize, len(pending))
             self.rc = ffi.new('CPpmd7z_RangeDec *')
             self.reader = ffi.new('RawReader *')
+            self._inbuf = ffi.new('char[]', bufsize)
+            self._status = ffi.new('int *')
             self.source = source  # read indirectly through self._userdata
             self._userdata = ffi.new_handle(self)
+            self._stats = _CoderStats()
             self.closed = False
-            lib.ppmd_decompress_init(self.rc, self.reader, lib.src_readinto, self._userdata)
+            self.endmark = endmark
+            self._eof = False
+            if checkpoint is None:
+                lib.ppmd_decompress_init(self.rc, self.reader, lib.src_readinto, self._userdata, self._inbuf, bufsize)
+            else:
+                lib.ppmd_decompress_attach(self.rc, self.reader, lib.src_readinto, self._userdata, self._inbuf,
+                                           bufsize)
+                _restore_model(self.ppmd, state, 7, max_order, mem_size)
+                _, self.rc.Range, _, _, self.rc.Code = rc
+                _resume_reader(self.reader, pending)
+                self._eof = finished
         else:
             raise ValueError("PPMd wrong parameters.")
 
-    def decode(self, length) -> bytes:
+    def reset(self, source: Optional[BinaryIO] = None) -> None:
+        """Start decoding a new stream with an initial model, keeping model memory allocated.
+
+        Data read ahead from a current source is discarded. When source is given, the new stream is read from it.
+        """
+        if self.closed:
+            raise ValueError("Decoder has been closed.")
+        if source is not None:
+            self.source = source
+        self._eof = False
+        self._stats.carry(self.reader)
+        lib.Ppmd7_Init(self.ppmd, self._max_order)
+        _restore_model(self.ppmd, self._model, 7, self._max_order, self._mem_size)
+        lib.ppmd_decompress_init(self.rc, self.reader, lib.src_readinto, self._userdata, self._inbuf, len(self._inbuf))
+
+    @property
+    def unused_data(self) -> bytes:
+        """Data read ahead from source but not consumed by decoder."""
+        return _unused_data(self.reader)
+
+    @property
+    def eof(self) -> bool:
+        """True if an end mark has been reached."""
+        return self._eof
+
+    def decode(self, length: int = -1) -> bytes:
+        """Decode length bytes, or decode until an end mark when length is omitted."""
+        if length < 0:
+            if not self.endmark:
+                raise ValueError("Length should be specified when end mark is not used.")
+            return _decode_all(self)
         b = ffi.new("char[]", length)
-        lib.ppmd_decompress(self.ppmd, self.rc, b, length)
+        size = self._decode(b, length)
         if self.rc.Code != 0:
             pass  # FIXME
-        return bytes(ffi.buffer(b))
+        return ffi.unpack(b, size)
+
+    def decode_into(self, buffer) -> int:
+        """Decode data directly into writable buffer, and return a number of bytes written."""
+        b = ffi.from_buffer(buffer, require_writable=True)
+        return self._decode(b, len(b))
+
+    def _decode(self, outbuf, length: int) -> int:
+        if self._eof:
+            return 0
+        start = time.perf_counter()
+        size = lib.ppmd_decompress(self.ppmd, self.rc, outbuf, length, self._status)
+        self._stats.time_total += time.perf_counter() - start
+        self._stats.bytes_out += size
+        self._stats.symbols += size
+        if self._status[0] == -1:
+            self._eof = True
+            self._stats.symbols += 1
+            _push_back(self.source, self.reader)
+        return size
+
+    def checkpoint(self, file: Any = None) -> Optional[bytes]:
+        """Save live state of decoder to a path or a binary file object, or return it as bytes when file is omitted.
+
+        Data read ahead from source is saved together, so a decoder constructed with `checkpoint=` argument
+        continues decoding from a current position of source.
+        """
+        if self.closed:
+            raise ValueError("Decoder has been closed.")
+        model = _snapshot(self.ppmd, 7, self._max_order, self._mem_size)
+        rc = (0, self.rc.Range, 0, 0, self.rc.Code)
+        return _save_checkpoint(file, model, _CHECKPOINT_DECODER, self._eof, rc, _unused_data(self.reader))
+
+    def stats(self) -> dict:
+        """Return counters of decoder, which are accumulated over streams."""
+        return self._stats.as_dict(self.reader, self.ppmd, self.closed)
 
     def close(self):
         if self.closed:
             return
-        lib.ppmd_state_close(self.ppmd, self._allocator)
+        self._stats.carry(self.reader)
+        self._finalizer()
         ffi.release(self.ppmd)
         ffi.release(self.reader)
         ffi.release(self.rc)
@@ -210,38 +750,122 @@ PpmdEncoder = Ppmd7Encoder
 
 class Ppmd8Decoder:
 
-    def __init__(self, source: BinaryIO, max_order: int, mem_size: int, restore: int):
+    def __init__(self, source: BinaryIO, max_order: int, mem_size: int, restore: int, bufsize: int = READ_BLOCKSIZE,
+                 model: Optional[PpmdModel] = None, checkpoint: Any = None, huge_pages: bool = False):
+        """Decode from source. When checkpoint is given, decoding continues from the state saved by
+        `checkpoint()` of a decoder with the same parameters, and source should be at the position
+        where the saved decoder read up to. When huge_pages is True, model memory is allocated on huge pages
+        where available."""
+        _check_bufsize(bufsize)
+        if checkpoint is not None:
+            state, finished, rc, pending = _load_checkpoint(checkpoint, _CHECKPOINT_DECODER, 8, max_order, mem_size,
+                                                            restore)
+            bufsize = max(bufsize, len(pending))
         self.closed = False
         self.source = source
         self.ppmd = ffi.new('CPpmd8 *')
         self.reader = ffi.new('RawReader *')
+        self._inbuf = ffi.new('char[]', bufsize)
+        self._status = ffi.new('int *')
+        self._eof = False
         self._userdata = ffi.new_handle(self)
-        self._allocator = ffi.new('ISzAlloc *')
+        self._stats = _CoderStats()
+        self._allocator = _new_allocator(huge_pages)
         self.max_order = max_order  # type: int
         self.mem_size = mem_size  # type: int
         self.restore = restore  # type: int
-        self._allocator.Alloc = lib.raw_alloc
-        self._allocator.Free = lib.raw_free
-        lib.ppmd8_decompress_init(self.ppmd, self.reader, lib.src_readinto, self._userdata)
+        lib.ppmd8_decompress_init(self.ppmd, self.reader, lib.src_readinto, self._userdata, self._inbuf, bufsize)
         lib.Ppmd8_Construct(self.ppmd)
-        lib.ppmd8_malloc(self.ppmd, mem_size, self._allocator)
-        lib.Ppmd8_RangeDec_Init(self.ppmd)
-        lib.Ppmd8_Init(self.ppmd, max_order, restore)
+        if not lib.ppmd8_malloc(self.ppmd, mem_size, self._allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        self._finalizer = weakref.finalize(self, lib.ppmd8_mfree, self.ppmd, self._allocator)
+        self._model = model
+        if checkpoint is None:
+            lib.Ppmd8_RangeDec_Init(self.ppmd)
+            lib.Ppmd8_Init(self.ppmd, max_order, restore)
+            _restore_model(self.ppmd, model, 8, max_order, mem_size, restore)
+        else:
+            _restore_model(self.ppmd, state, 8, max_order, mem_size, restore)
+            self.ppmd.Low, self.ppmd.Range, _, _, self.ppmd.Code = rc
+            _resume_reader(self.reader, pending)
+            self._eof = finished
 
-    def decode(self, length):
-        outbuf = bytearray()
-        for _ in range(length):
-            sym = lib.Ppmd8_DecodeSymbol(self.ppmd)
-            if sym < 0:
-                break
-            outbuf += sym.to_bytes(1, 'little')
+    def reset(self, source: Optional[BinaryIO] = None) -> None:
+        """Start decoding a new stream with an initial model, keeping model memory allocated.
+
+        Data read ahead from a current source is discarded. When source is given, the new stream is read from it.
+        """
+        if self.closed:
+            raise ValueError("Decoder has been closed.")
+        if source is not None:
+            self.source = source
+        self._eof = False
+        self._stats.carry(self.reader)
+        lib.ppmd8_decompress_init(self.ppmd, self.reader, lib.src_readinto, self._userdata, self._inbuf,
+                                  len(self._inbuf))
+        lib.Ppmd8_RangeDec_Init(self.ppmd)
+        lib.Ppmd8_Init(self.ppmd, self.max_order, self.restore)
+        _restore_model(self.ppmd, self._model, 8, self.max_order, self.mem_size, self.restore)
+
+    @property
+    def unused_data(self) -> bytes:
+        """Data read ahead from source but not consumed by decoder."""
+        return _unused_data(self.reader)
+
+    @property
+    def eof(self) -> bool:
+        """True if an end mark has been reached."""
+        return self._eof
+
+    def decode(self, length: int = -1) -> bytes:
+        """Decode length bytes, or decode until an end mark when length is omitted."""
+        if length < 0:
+            return _decode_all(self)
+        outbuf = ffi.new('char[]', length)
+        size = self._decode(outbuf, length)
         if self.ppmd.Code != 0:
             pass  # FIXME
-        return bytes(outbuf)
+        return ffi.unpack(outbuf, size)
+
+    def decode_into(self, buffer) -> int:
+        """Decode data directly into writable buffer, and return a number of bytes written."""
+        outbuf = ffi.from_buffer(buffer, require_writable=True)
+        return self._decode(outbuf, len(outbuf))
+
+    def _decode(self, outbuf, length: int) -> int:
+        if self._eof:
+            return 0
+        start = time.perf_counter()
+        size = lib.ppmd8_decompress(self.ppmd, outbuf, length, self._status)
+        self._stats.time_total += time.perf_counter() - start
+        self._stats.bytes_out += size
+        self._stats.symbols += size
+        if self._status[0] == -1:
+            self._eof = True
+            self._stats.symbols += 1
+            _push_back(self.source, self.reader)
+        return size
+
+    def checkpoint(self, file: Any = None) -> Optional[bytes]:
+        """Save live state of decoder to a path or a binary file object, or return it as bytes when file is omitted.
+
+        Data read ahead from source is saved together, so a decoder constructed with `checkpoint=` argument
+        continues decoding from a current position of source.
+        """
+        if self.closed:
+            raise ValueError("Decoder has been closed.")
+        model = _snapshot(self.ppmd, 8, self.max_order, self.mem_size, self.restore)
+        rc = (self.ppmd.Low, self.ppmd.Range, 0, 0, self.ppmd.Code)
+        return _save_checkpoint(file, model, _CHECKPOINT_DECODER, self._eof, rc, _unused_data(self.reader))
+
+    def stats(self) -> dict:
+        """Return counters of decoder, which are accumulated over streams."""
+        return self._stats.as_dict(self.reader, self.ppmd, self.closed)
 
     def close(self):
         if not self.closed:
-            lib.ppmd8_mfree(self.ppmd, self._allocator)
+            self._stats.carry(self.reader)
+            self._finalizer()
             ffi.release(self.ppmd)
             ffi.release(self.reader)
             self.closed = True
@@ -255,37 +879,99 @@ class Ppmd8Decoder:
 
 class Ppmd8Encoder:
 
-    def __init__(self, destination: BinaryIO, max_order: int, mem_size: int, restore: int):
+    def __init__(self, destination: BinaryIO, max_order: int, mem_size: int, restore: int,
+                 bufsize: int = WRITE_BLOCKSIZE, model: Optional[PpmdModel] = None, checkpoint: Any = None,
+                 huge_pages: bool = False):
+        """Encode into destination. When checkpoint is given, a stream continues from the state saved by
+        `checkpoint()` of an encoder with the same parameters, and destination should follow data written
+        until then. When huge_pages is True, model memory is allocated on huge pages where available."""
+        _check_bufsize(bufsize)
         self.closed = False
         self.flushed = False
         self.destination = destination
         self.ppmd = ffi.new('CPpmd8 *')
         self.writer = ffi.new('RawWriter *')
+        self._outbuf = ffi.new('char[]', bufsize)
         self._userdata = ffi.new_handle(self)
-        self._allocator = ffi.new('ISzAlloc *')
-        self._allocator.Alloc = lib.raw_alloc
-        self._allocator.Free = lib.raw_free
-        lib.ppmd8_compress_init(self.ppmd, self.writer, lib.dst_write, self._userdata)
+        self._stats = _CoderStats()
+        self._allocator = _new_allocator(huge_pages)
+        lib.ppmd8_compress_init(self.ppmd, self.writer, lib.dst_write, self._userdata, self._outbuf, bufsize)
         lib.Ppmd8_Construct(self.ppmd)
-        lib.ppmd8_malloc(self.ppmd, mem_size, self._allocator)
+        if not lib.ppmd8_malloc(self.ppmd, mem_size, self._allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        self._finalizer = weakref.finalize(self, lib.ppmd8_mfree, self.ppmd, self._allocator)
         # lib.Ppmd8_RangeEnc_Init(self.ppmd)  # this is defined as macro
         self.ppmd.Low = 0
         self.ppmd.Range = 0xFFFFFFFF
+        self._max_order = max_order
+        self._mem_size = mem_size
+        self._restore = restore
+        self._model = model
         lib.Ppmd8_Init(self.ppmd, max_order, restore)
+        _restore_model(self.ppmd, model, 8, max_order, mem_size, restore)
+        if checkpoint is not None:
+            state, self.flushed, rc, _ = _load_checkpoint(checkpoint, _CHECKPOINT_ENCODER, 8, max_order, mem_size,
+                                                          restore)
+            _restore_model(self.ppmd, state, 8, max_order, mem_size, restore)
+            self.ppmd.Low, self.ppmd.Range, _, _, _ = rc
+
+    def reset(self, destination: Optional[BinaryIO] = None) -> None:
+        """Start a new stream with an initial model, keeping model memory allocated.
+
+        Data which is not flushed is discarded. When destination is given, the new stream is written to it.
+        """
+        if self.closed:
+            raise ValueError("Encoder has been closed.")
+        if destination is not None:
+            self.destination = destination
+        self.flushed = False
+        self._stats.carry(self.writer)
+        lib.ppmd8_compress_init(self.ppmd, self.writer, lib.dst_write, self._userdata, self._outbuf, len(self._outbuf))
+        self.ppmd.Low = 0
+        self.ppmd.Range = 0xFFFFFFFF
+        lib.Ppmd8_Init(self.ppmd, self._max_order, self._restore)
+        _restore_model(self.ppmd, self._model, 8, self._max_order, self._mem_size, self._restore)
 
     def encode(self, inbuf) -> None:
-        for sym in inbuf:
-            lib.Ppmd8_EncodeSymbol(self.ppmd, sym)
+        buf = ffi.from_buffer(inbuf)
+        start = time.perf_counter()
+        lib.ppmd8_compress(self.ppmd, buf, len(buf))
+        self._stats.time_total += time.perf_counter() - start
+        self._stats.bytes_in += len(buf)
+        self._stats.symbols += len(buf)
 
     def flush(self):
         if not self.flushed:
+            start = time.perf_counter()
             lib.Ppmd8_EncodeSymbol(self.ppmd, -1)  # endmark
             lib.Ppmd8_RangeEnc_FlushData(self.ppmd)
+            lib.ppmd_writer_flush(self.writer)
+            self._stats.time_total += time.perf_counter() - start
+            self._stats.symbols += 1
             self.flushed = True
 
+    def checkpoint(self, file: Any = None) -> Optional[bytes]:
+        """Save live state of encoder to a path or a binary file object, or return it as bytes when file is omitted.
+
+        Buffered output is written to destination first, so the stream continues bit-exactly from a checkpoint
+        by an encoder constructed with `checkpoint=` argument, when its destination follows data written so far.
+        """
+        if self.closed:
+            raise ValueError("Encoder has been closed.")
+        lib.ppmd_writer_flush(self.writer)
+        model = _snapshot(self.ppmd, 8, self._max_order, self._mem_size, self._restore)
+        rc = (self.ppmd.Low, self.ppmd.Range, 0, 0, 0)
+        return _save_checkpoint(file, model, _CHECKPOINT_ENCODER, self.flushed, rc)
+
+    def stats(self) -> dict:
+        """Return counters of encoder, which are accumulated over streams."""
+        return self._stats.as_dict(self.writer, self.ppmd, self.closed)
+
     def close(self):
         if not self.closed:
-            lib.ppmd8_mfree(self.ppmd, self._allocator)
+            lib.ppmd_writer_flush(self.writer)
+            self._stats.carry(self.writer)
+            self._finalizer()
             self.closed = True
             ffi.release(self.ppmd)
             ffi.release(self.writer)
@@ -297,6 +983,691 @@ class Ppmd8Encoder:
         self.close()
 
 
+def _check_parameters(version: int, order: int, mem: int, restore: int) -> None:
+    if mem > sys.maxsize:
+        raise ValueError("Mem_size exceed to platform limit.")
+    if version == 7:
+        if not (_PPMD7_MIN_ORDER <= order <= _PPMD7_MAX_ORDER and _PPMD7_MIN_MEM_SIZE <= mem <= _PPMD7_MAX_MEM_SIZE):
+            raise ValueError("PPMd wrong parameters.")
+    elif version == 8:
+        if not (_PPMD8_MIN_ORDER <= order <= _PPMD8_MAX_ORDER and _PPMD8_MIN_MEM_SIZE <= mem <= _PPMD8_MAX_MEM_SIZE
+                and restore in (0, 1)):
+            raise ValueError("PPMd wrong parameters.")
+    else:
+        raise ValueError("Unsupported PPMd version.")
+
+
+def _compress_bound(size: int) -> int:
+    return size + (size >> 3) + 64
+
+
+def compress(data, order: int = 6, mem: int = 16 << 20, version: int = 8, restore: int = 0,
+             model: Optional[PpmdModel] = None) -> bytes:
+    """Compress bytes-like data at once.
+
+    Compressed data ends with an end mark, so it can be decompressed by `decompress()`
+    without knowing length of original data. `mem` is a size of model memory in bytes.
+    A trained `model` primes the encoder, and the same model is needed for decompression.
+    """
+    _check_parameters(version, order, mem, restore)
+    inbuf = ffi.from_buffer(data)
+    allocator = _new_allocator()
+    if version == 7:
+        ppmd = ffi.new('CPpmd7 *')
+        if not lib.ppmd_state_init(ppmd, order, mem, allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        free = lib.ppmd_state_close
+    else:
+        ppmd = ffi.new('CPpmd8 *')
+        lib.Ppmd8_Construct(ppmd)
+        if not lib.ppmd8_malloc(ppmd, mem, allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        free = lib.ppmd8_mfree
+    try:
+        if version == 7:
+            _restore_model(ppmd, model, version, order, mem)
+        size = _compress_bound(len(inbuf))
+        while True:
+            outbuf = ffi.new('char[]', size)
+            if version == 7:
+                result = lib.ppmd_compress_buffer(ppmd, inbuf, len(inbuf), outbuf, size)
+            else:
+                lib.Ppmd8_Init(ppmd, order, restore)
+                _restore_model(ppmd, model, version, order, mem, restore)
+                result = lib.ppmd8_compress_buffer(ppmd, inbuf, len(inbuf), outbuf, size)
+            if result <= size:
+                return ffi.unpack(outbuf, result)
+            # Data is incompressible and exceeds the estimated bound; retry with an exact size.
+            size = result
+            if version == 7:
+                lib.Ppmd7_Init(ppmd, order)
+                _restore_model(ppmd, model, version, order, mem)
+    finally:
+        free(ppmd, allocator)
+
+
+def decompress(data, order: int = 6, mem: int = 16 << 20, version: int = 8, restore: int = 0,
+               model: Optional[PpmdModel] = None) -> bytes:
+    """Decompress data produced by `compress()` at once.
+
+    Parameters and a model should be as same as ones which are used for compression.
+    """
+    _check_parameters(version, order, mem, restore)
+    inbuf = ffi.from_buffer(data)
+    allocator = _new_allocator()
+    reader = ffi.new('RawReader *')
+    status = ffi.new('int *')
+    if version == 7:
+        ppmd = ffi.new('CPpmd7 *')
+        rc = ffi.new('CPpmd7z_RangeDec *')
+        if not lib.ppmd_state_init(ppmd, order, mem, allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        free = lib.ppmd_state_close
+        initialized = lib.ppmd_decompress_init(rc, reader, ffi.NULL, ffi.NULL, inbuf, len(inbuf))
+        setup_model = functools.partial(_restore_model, ppmd, model, version, order, mem)
+
+        def _decode(buf, size):
+            return lib.ppmd_decompress(ppmd, rc, buf, size, status)
+    else:
+        ppmd = ffi.new('CPpmd8 *')
+        lib.Ppmd8_Construct(ppmd)
+        if not lib.ppmd8_malloc(ppmd, mem, allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        free = lib.ppmd8_mfree
+        lib.ppmd8_decompress_init(ppmd, reader, ffi.NULL, ffi.NULL, inbuf, len(inbuf))
+        initialized = lib.Ppmd8_RangeDec_Init(ppmd)
+        lib.Ppmd8_Init(ppmd, order, restore)
+        setup_model = functools.partial(_restore_model, ppmd, model, version, order, mem, restore)
+
+        def _decode(buf, size):
+            return lib.ppmd8_decompress(ppmd, buf, size, status)
+    try:
+        if not initialized:
+            raise ValueError("Corrupted PPMd data.")
+        setup_model()
+        out = bytearray(max(len(inbuf) * 4, READ_BLOCKSIZE))
+        pos = 0
+        while True:
+            outbuf = ffi.from_buffer(out)
+            pos += _decode(outbuf + pos, len(out) - pos)
+            ffi.release(outbuf)
+            if status[0] == -1:
+                break
+            elif status[0] < 0:
+                raise ValueError("Corrupted PPMd data.")
+            out += bytes(len(out))
+        del out[pos:]
+        return bytes(out)
+    finally:
+        free(ppmd, allocator)
+
+
+def _batch_model(ppmd, model: Optional[PpmdModel], version: int, order: int, mem: int, restore: int):
+    if model is None:
+        return ffi.NULL, ffi.NULL, ffi.NULL
+    # check parameters and platform once, and C code restores the model for each item.
+    _restore_model(ppmd, model, version, order, mem, restore)
+    return model._state, model._refs, model._arena
+
+
+def _compress_batch(buffers, order: int, mem: int, version: int, restore: int, model: Optional[PpmdModel]):
+    lengths = [memoryview(buffer).nbytes for buffer in buffers]
+    if any(length > 0x7FFFFFFF for length in lengths):
+        raise ValueError("Each buffer should be less than 2GB.")
+    n = len(buffers)
+    src = b''.join(buffers)
+    src_offsets = ffi.new('size_t[]', [0] + list(itertools.accumulate(lengths)))
+    dst_offsets = ffi.new('size_t[]', n + 1)
+    allocator = _new_allocator()
+    if version == 7:
+        ppmd = ffi.new('CPpmd7 *')
+        if not lib.ppmd_state_init(ppmd, order, mem, allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        free = lib.ppmd_state_close
+    else:
+        ppmd = ffi.new('CPpmd8 *')
+        lib.Ppmd8_Construct(ppmd)
+        if not lib.ppmd8_malloc(ppmd, mem, allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        free = lib.ppmd8_mfree
+    try:
+        state, refs, arena = _batch_model(ppmd, model, version, order, mem, restore)
+        size = _compress_bound(len(src)) + 64 * n
+        while True:
+            outbuf = ffi.new('char[]', size)
+            if version == 7:
+                total = lib.ppmd7_compress_batch(ppmd, order, state, refs, arena, src, src_offsets, n,
+                                                 outbuf, size, dst_offsets)
+            else:
+                total = lib.ppmd8_compress_batch(ppmd, order, restore, state, refs, arena, src, src_offsets, n,
+                                                 outbuf, size, dst_offsets)
+            if total <= size:
+                return ffi.unpack(outbuf, total), list(dst_offsets)
+            size = total
+    finally:
+        free(ppmd, allocator)
+
+
+def _decompress_batch(data, offsets: List[int], order: int, mem: int, version: int, restore: int,
+                      model: Optional[PpmdModel]):
+    n = len(offsets) - 1
+    src = ffi.from_buffer(data)
+    src_offsets = ffi.new('size_t[]', offsets)
+    dst_offsets = ffi.new('size_t[]', n + 1)
+    status = ffi.new('int *')
+    allocator = _new_allocator()
+    if version == 7:
+        ppmd = ffi.new('CPpmd7 *')
+        if not lib.ppmd_state_init(ppmd, order, mem, allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        free = lib.ppmd_state_close
+    else:
+        ppmd = ffi.new('CPpmd8 *')
+        lib.Ppmd8_Construct(ppmd)
+        if not lib.ppmd8_malloc(ppmd, mem, allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        free = lib.ppmd8_mfree
+    try:
+        state, refs, arena = _batch_model(ppmd, model, version, order, mem, restore)
+        out = bytearray(max((offsets[-1] - offsets[0]) * 4, READ_BLOCKSIZE))
+        start = 0
+        while True:
+            outbuf = ffi.from_buffer(out)
+            if version == 7:
+                start = lib.ppmd7_decompress_batch(ppmd, order, state, refs, arena, src, src_offsets, n, start,
+                                                   outbuf, len(out), dst_offsets, status)
+            else:
+                start = lib.ppmd8_decompress_batch(ppmd, order, restore, state, refs, arena, src, src_offsets, n,
+                                                   start, outbuf, len(out), dst_offsets, status)
+            ffi.release(outbuf)
+            if start == n:
+                break
+            if status[0] < 0:
+                raise ValueError("Corrupted PPMd data.")
+            out += bytes(len(out))
+        del out[dst_offsets[n]:]
+        return bytes(out), list(dst_offsets)
+    finally:
+        free(ppmd, allocator)
+
+
+def _merge_batches(results) -> Tuple[bytes, List[int]]:
+    offsets = [0]
+    for data, batch_offsets in results:
+        base = offsets[-1]
+        offsets.extend(base + offset for offset in batch_offsets[1:])
+    return b''.join(data for data, _ in results), offsets
+
+
+def compress_batch(buffers, order: int = 6, mem: int = 16 << 20, version: int = 8, restore: int = 0,
+                   model: Optional[PpmdModel] = None, workers: Optional[int] = None) -> Tuple[bytes, List[int]]:
+    """Compress each of bytes-like buffers independently, as same as `compress()` does, in one native call.
+
+    One model memory is reused for all buffers. Return compressed data of all buffers concatenated and
+    a list of offsets, which has len(buffers) + 1 items; data of i-th buffer is `data[offsets[i]:offsets[i + 1]]`.
+    When `workers` is more than one, buffers are split into the number of groups and compressed by threads.
+    """
+    _check_parameters(version, order, mem, restore)
+    _check_model(model, version, order, mem, restore)
+    buffers = list(buffers)
+    if workers is None or workers <= 1 or len(buffers) < 2:
+        return _compress_batch(buffers, order, mem, version, restore, model)
+    step = -(-len(buffers) // workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda i: _compress_batch(buffers[i:i + step], order, mem, version, restore, model),
+                                    range(0, len(buffers), step)))
+    return _merge_batches(results)
+
+
+def decompress_batch(data, offsets, order: int = 6, mem: int = 16 << 20, version: int = 8, restore: int = 0,
+                     model: Optional[PpmdModel] = None, workers: Optional[int] = None) -> Tuple[bytes, List[int]]:
+    """Decompress items of data produced by `compress_batch()` in one native call.
+
+    Return decompressed data of all items concatenated and a list of offsets like `compress_batch()`.
+    """
+    _check_parameters(version, order, mem, restore)
+    _check_model(model, version, order, mem, restore)
+    offsets = list(offsets)
+    if not offsets or any(not 0 <= a <= b <= len(data) or b - a > 0x7FFFFFFF for a, b in zip(offsets, offsets[1:])):
+        raise ValueError("Wrong offsets of PPMd data.")
+    n = len(offsets) - 1
+    if workers is None or workers <= 1 or n < 2:
+        return _decompress_batch(data, offsets, order, mem, version, restore, model)
+    step = -(-n // workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda i: _decompress_batch(data, offsets[i:i + step + 1], order, mem, version,
+                                                                restore, model),
+                                    range(0, n, step)))
+    return _merge_batches(results)
+
+
+class _CompressObj:
+    """Base of incremental compressors, which collect output of encoder in memory."""
+
+    def __init__(self):
+        self._sink = io.BytesIO()
+
+    def compress(self, data) -> bytes:
+        """Compress data, and return a part of compressed data, which may be empty."""
+        if self._encoder.flushed:
+            raise ValueError("Compressor has been flushed.")
+        self._encoder.encode(data)
+        return self._take()
+
+    def flush(self) -> bytes:
+        """Finish compression with an end mark, and return remaining compressed data."""
+        if self._encoder.flushed:
+            raise ValueError("Compressor has been flushed.")
+        self._encoder.flush()
+        self._encoder.close()
+        return self._take()
+
+    def _take(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+
+class Ppmd7CompressObj(_CompressObj):
+    """Incremental compressor of PPMd var.H, like `zlib.compressobj()`."""
+
+    def __init__(self, order: int = 6, mem: int = 16 << 20, model: Optional[PpmdModel] = None):
+        _check_parameters(7, order, mem, 0)
+        super().__init__()
+        self._encoder = Ppmd7Encoder(self._sink, order, mem, endmark=True, model=model)
+
+
+class Ppmd8CompressObj(_CompressObj):
+    """Incremental compressor of PPMd var.I, like `zlib.compressobj()`."""
+
+    def __init__(self, order: int = 6, mem: int = 16 << 20, restore: int = 0, model: Optional[PpmdModel] = None):
+        _check_parameters(8, order, mem, restore)
+        super().__init__()
+        self._encoder = Ppmd8Encoder(self._sink, order, mem, restore, model=model)
+
+
+class _DecompressObj:
+    """Base of incremental decompressors.
+
+    PPMd decoder cannot suspend in the middle of a symbol, so a symbol is decoded only when
+    input holds at least `margin` bytes, which is more than a symbol can consume.
+    PPMd data has no terminator which can be found without decoding, so the last bytes of
+    a stream are decoded and an end mark is detected only by `flush()`.
+    """
+
+    def __init__(self, margin: int):
+        self.reader = ffi.new('RawReader *')
+        self._status = ffi.new('int *')
+        self._margin = margin
+        self._initialized = False
+        self._input = b''
+        self._inbuf = None
+        self._eof = False
+        self._needs_input = True
+        self.unused_data = b''
+
+    @property
+    def eof(self) -> bool:
+        """True if an end mark has been reached."""
+        return self._eof
+
+    @property
+    def needs_input(self) -> bool:
+        """False if `decompress()` can return more data without new input."""
+        return self._needs_input
+
+    def decompress(self, data, max_length: int = -1) -> bytes:
+        """Decompress data, and return at most max_length bytes when it is not negative.
+
+        Last part of a stream is held back until `flush()` is called.
+        """
+        if self._eof:
+            raise EOFError("End of stream already reached.")
+        return self._process(self._input + bytes(data), max_length, self._margin)
+
+    def flush(self) -> bytes:
+        """Decompress remaining input until an end mark, assuming that no more data follows.
+
+        Raise ValueError when input ends before an end mark.
+        """
+        if self._eof:
+            return b''
+        data = self._process(self._input, -1, 0)
+        if not self._eof:
+            raise ValueError("Corrupted PPMd data.")
+        return data
+
+    def _process(self, data: bytes, max_length: int, margin: int) -> bytes:
+        self._inbuf = ffi.from_buffer(data)
+        self.reader.buf = self._inbuf
+        self.reader.size = self.reader.len = len(data)
+        self.reader.pos = 0
+        if not self._initialized:
+            if len(data) < margin:
+                self._input = data
+                self._needs_input = True
+                return b''
+            self._initialized = True
+            if not self._init_decoder():
+                raise ValueError("Corrupted PPMd data.")
+        self.reader.margin = margin
+        out = bytearray()
+        buf = ffi.new('char[]', READ_BLOCKSIZE)
+        stalled = False
+        while max_length < 0 or len(out) < max_length:
+            length = READ_BLOCKSIZE if max_length < 0 else min(READ_BLOCKSIZE, max_length - len(out))
+            size = self._decode(buf, length)
+            out += ffi.buffer(buf, size)
+            if self._status[0] == -1:
+                self._eof = True
+                break
+            elif self._status[0] < 0:
+                raise ValueError("Corrupted PPMd data.")
+            if size < length:
+                stalled = True
+                break
+        self._input = data[self.reader.pos:]
+        if self._eof:
+            self.unused_data = self._input
+            self._input = b''
+        self._needs_input = not self._eof and stalled
+        return bytes(out)
+
+
+class Ppmd7DecompressObj(_DecompressObj):
+    """Incremental decompressor of PPMd var.H data with an end mark, like `zlib.decompressobj()`."""
+
+    def __init__(self, order: int = 6, mem: int = 16 << 20, model: Optional[PpmdModel] = None):
+        _check_parameters(7, order, mem, 0)
+        # range decoder reads at most 2 bytes for each of order + 1 contexts.
+        super().__init__(2 * (order + 2))
+        self.ppmd = ffi.new('CPpmd7 *')
+        self.rc = ffi.new('CPpmd7z_RangeDec *')
+        self._allocator = _new_allocator()
+        if not lib.ppmd_state_init(self.ppmd, order, mem, self._allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        self._finalizer = weakref.finalize(self, lib.ppmd_state_close, self.ppmd, self._allocator)
+        _restore_model(self.ppmd, model, 7, order, mem)
+
+    def _init_decoder(self) -> bool:
+        return lib.ppmd_decompress_init(self.rc, self.reader, ffi.NULL, ffi.NULL, self.reader.buf, self.reader.size)
+
+    def _decode(self, buf, length: int) -> int:
+        return lib.ppmd_decompress(self.ppmd, self.rc, buf, length, self._status)
+
+
+class Ppmd8DecompressObj(_DecompressObj):
+    """Incremental decompressor of PPMd var.I data, like `zlib.decompressobj()`."""
+
+    def __init__(self, order: int = 6, mem: int = 16 << 20, restore: int = 0, model: Optional[PpmdModel] = None):
+        _check_parameters(8, order, mem, restore)
+        # carry-less range decoder may read several bytes on normalization.
+        super().__init__(8 * (order + 2))
+        self.ppmd = ffi.new('CPpmd8 *')
+        self._allocator = _new_allocator()
+        lib.Ppmd8_Construct(self.ppmd)
+        if not lib.ppmd8_malloc(self.ppmd, mem, self._allocator):
+            raise MemoryError("Failed to allocate memory for PPMd model.")
+        self._finalizer = weakref.finalize(self, lib.ppmd8_mfree, self.ppmd, self._allocator)
+        self._order = order
+        self._mem = mem
+        self._restore = restore
+        self._model = model
+        _check_model(model, 8, order, mem, restore)
+
+    def _init_decoder(self) -> bool:
+        lib.ppmd8_decompress_init(self.ppmd, self.reader, ffi.NULL, ffi.NULL, self.reader.buf, self.reader.size)
+        if not lib.Ppmd8_RangeDec_Init(self.ppmd):
+            return False
+        lib.Ppmd8_Init(self.ppmd, self._order, self._restore)
+        _restore_model(self.ppmd, self._model, 8, self._order, self._mem, self._restore)
+        return True
+
+    def _decode(self, buf, length: int) -> int:
+        return lib.ppmd8_decompress(self.ppmd, buf, length, self._status)
+
+
+def compressobj(order: int = 6, mem: int = 16 << 20, version: int = 8, restore: int = 0,
+                model: Optional[PpmdModel] = None):
+    """Return an incremental compressor object with `compress()` and `flush()` methods."""
+    _check_parameters(version, order, mem, restore)
+    if version == 7:
+        return Ppmd7CompressObj(order, mem, model=model)
+    return Ppmd8CompressObj(order, mem, restore, model=model)
+
+
+def decompressobj(order: int = 6, mem: int = 16 << 20, version: int = 8, restore: int = 0,
+                  model: Optional[PpmdModel] = None):
+    """Return an incremental decompressor object for data produced by `compressobj()` or `compress()`."""
+    _check_parameters(version, order, mem, restore)
+    if version == 7:
+        return Ppmd7DecompressObj(order, mem, model=model)
+    return Ppmd8DecompressObj(order, mem, restore, model=model)
+
+
+class _CoderPool:
+    """Base of thread-safe pools of coders, which keep up to `maxsize` idle coders for each parameters.
+
+    Model memory is committed when a coder touches it first, so its pages are placed on a NUMA node
+    of the thread which used the coder first. When `numa` is True, idle coders are kept for each NUMA node,
+    and a thread gets a coder whose memory is local to its node. It has no effect on other than Linux.
+    When `huge_pages` is True, coders allocate model memory on huge pages where available.
+    """
+
+    def __init__(self, maxsize: int = 8, numa: bool = False, huge_pages: bool = False):
+        self.maxsize = maxsize
+        self.numa = numa
+        self.huge_pages = huge_pages
+        self._lock = threading.Lock()
+        self._idle = {}  # type: dict
+
+    def acquire(self, stream: BinaryIO, order: int = 6, mem: int = 16 << 20, version: int = 8, restore: int = 0,
+                model: Optional[PpmdModel] = None):
+        """Return a coder for stream, which is reset idle one or a new one."""
+        _check_parameters(version, order, mem, restore)
+        key = (version, order, mem, restore, model, self._node())
+        with self._lock:
+            coders = self._idle.get(key)
+            coder = coders.pop() if coders else None
+        if coder is None:
+            coder = self._create(stream, order, mem, version, restore, model)
+            coder._pool_key = key
+        else:
+            coder.reset(stream)
+        return coder
+
+    def _node(self) -> int:
+        """Return NUMA node which idle coders are kept for, or -1 when numa is False or the node is unknown."""
+        return lib.numa_node() if self.numa else -1
+
+    def release(self, coder) -> None:
+        """Return a coder to the pool. It is closed when the pool is full."""
+        key = getattr(coder, '_pool_key', None)
+        if key is None:
+            raise ValueError("Coder was not acquired from a pool.")
+        if coder.closed:
+            return
+        with self._lock:
+            coders = self._idle.setdefault(key, [])
+            if len(coders) < self.maxsize:
+                coders.append(coder)
+                return
+        coder.close()
+
+    def clear(self) -> None:
+        """Close all idle coders."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for coders in idle.values():
+            for coder in coders:
+                coder.close()
+
+
+class EncoderPool(_CoderPool):
+    """Thread-safe pool of encoders keyed by version, order, mem, restore and model.
+
+    Reusing an encoder saves allocation of model memory for each stream. Ppmd7Encoder is created with an end mark.
+    """
+
+    def _create(self, destination, order, mem, version, restore, model):
+        if version == 7:
+            return Ppmd7Encoder(destination, order, mem, endmark=True, model=model, huge_pages=self.huge_pages)
+        return Ppmd8Encoder(destination, order, mem, restore, model=model, huge_pages=self.huge_pages)
+
+    @contextlib.contextmanager
+    def encoder(self, destination: BinaryIO, order: int = 6, mem: int = 16 << 20, version: int = 8,
+                restore: int = 0, model: Optional[PpmdModel] = None):
+        """Context manager which flushes an acquired encoder and releases it on exit."""
+        encoder = self.acquire(destination, order, mem, version, restore, model)
+        try:
+            yield encoder
+            encoder.flush()
+        finally:
+            self.release(encoder)
+
+
+class DecoderPool(_CoderPool):
+    """Thread-safe pool of decoders keyed by version, order, mem, restore and model.
+
+    Reusing a decoder saves allocation of model memory for each stream. Ppmd7Decoder is created with an end mark.
+    """
+
+    def _create(self, source, order, mem, version, restore, model):
+        if version == 7:
+            return Ppmd7Decoder(source, order, mem, endmark=True, model=model, huge_pages=self.huge_pages)
+        return Ppmd8Decoder(source, order, mem, restore, model=model, huge_pages=self.huge_pages)
+
+    @contextlib.contextmanager
+    def decoder(self, source: BinaryIO, order: int = 6, mem: int = 16 << 20, version: int = 8,
+                restore: int = 0, model: Optional[PpmdModel] = None):
+        """Context manager which releases an acquired decoder on exit."""
+        decoder = self.acquire(source, order, mem, version, restore, model)
+        try:
+            yield decoder
+        finally:
+            self.release(decoder)
+
+
+class AsyncPpmdWriter:
+    """Compress data and write it to asyncio.StreamWriter.
+
+    PPMd runs in `executor`, or default executor of event loop, for each chunk of `chunk_size` bytes,
+    and `write()` waits for `drain()` of the stream after each chunk.
+    `close()` writes an end mark, but it doesn't close the stream.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, order: int = 6, mem: int = 16 << 20, version: int = 8,
+                 restore: int = 0, model: Optional[PpmdModel] = None, executor: Optional[Executor] = None,
+                 chunk_size: int = WRITE_BLOCKSIZE):
+        _check_bufsize(chunk_size)
+        self._writer = writer
+        self._compressor = compressobj(order, mem, version, restore, model)
+        self._executor = executor
+        self._chunk_size = chunk_size
+        self.closed = False
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def _send(self, data: bytes) -> None:
+        if data:
+            self._writer.write(data)
+            await self._writer.drain()
+
+    async def write(self, data) -> None:
+        """Compress bytes-like data and write compressed data to the stream."""
+        if self.closed:
+            raise ValueError("I/O operation on closed writer.")
+        with memoryview(data) as view, view.cast('B') as view:
+            for start in range(0, len(view), self._chunk_size):
+                await self._send(await self._run(self._compressor.compress, view[start:start + self._chunk_size]))
+
+    async def close(self) -> None:
+        """Finish compressed data with an end mark and write remaining data."""
+        if self.closed:
+            return
+        self.closed = True
+        await self._send(await self._run(self._compressor.flush))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+class AsyncPpmdReader:
+    """Read compressed data from asyncio.StreamReader and decompress it.
+
+    Compressed data is read by `chunk_size` bytes, and PPMd runs in `executor`, or default executor of
+    event loop, to return at most requested size of data, so data is read from the stream only when
+    it is consumed. Data after an end mark which has been read from the stream is kept in `unused_data`.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, order: int = 6, mem: int = 16 << 20, version: int = 8,
+                 restore: int = 0, model: Optional[PpmdModel] = None, executor: Optional[Executor] = None,
+                 chunk_size: int = READ_BLOCKSIZE):
+        _check_bufsize(chunk_size)
+        self._reader = reader
+        self._decompressor = decompressobj(order, mem, version, restore, model)
+        self._executor = executor
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._eof = False
+
+    @property
+    def eof(self) -> bool:
+        """True if an end mark has been reached."""
+        return self._eof
+
+    @property
+    def unused_data(self) -> bytes:
+        """Data after an end mark."""
+        return self._decompressor.unused_data
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def _fill(self, size: int) -> None:
+        decompressor = self._decompressor
+        data = b''
+        if decompressor.needs_input:
+            data = await self._reader.read(self._chunk_size)
+            if not data:
+                self._buffer += await self._run(decompressor.flush)
+                self._eof = True
+                return
+        self._buffer += await self._run(decompressor.decompress, data, size)
+        self._eof = decompressor.eof
+
+    async def read(self, size: int = -1) -> bytes:
+        """Read at most size bytes, or until an end mark when size is negative."""
+        if size < 0:
+            chunks = []
+            chunk = await self.read(self._chunk_size)
+            while chunk:
+                chunks.append(chunk)
+                chunk = await self.read(self._chunk_size)
+            return b''.join(chunks)
+        while size > 0 and not self._buffer and not self._eof:
+            await self._fill(size)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        data = await self.read(self._chunk_size)
+        if not data:
+            raise StopAsyncIteration
+        return data
+
+
 class PpmdHeader:
 
     size = 16
@@ -347,34 +1718,108 @@ class PpmdHeader:
         return self.size
 
 
+def _map_file(file) -> Optional[mmap.mmap]:
+    """Map a regular file read-only for sequential access, or return None when it cannot be mapped."""
+    try:
+        fd = file.fileno()
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+            return None
+        mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, OverflowError, ValueError):
+        return None
+    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    return mapped
+
+
+class _MappedSource:
+    """Source of a decoder which lends windows of a memory-mapped file instead of copying data.
+
+    `src_readinto()` points a buffer of reader at the next window of the mapping, so range decoder
+    reads data straight from page cache. A file position is updated on `close()`.
+    """
+
+    def __init__(self, file, mapped: mmap.mmap, filesize: Optional[int] = None):
+        self.file = file
+        self.offset = file.tell()
+        self.end = len(mapped) if filesize is None else min(len(mapped), filesize)
+        self._mmap = mapped
+        self._base = ffi.from_buffer(mapped)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self.offset = offset if whence == io.SEEK_SET else self.offset + offset
+        return self.offset
+
+    def lend(self, reader) -> int:
+        size = min(self.end - self.offset, _MAP_WINDOW)
+        if size <= 0:
+            return 0
+        reader.buf = self._base + self.offset
+        self.offset += size
+        return size
+
+    def close(self) -> None:
+        ffi.release(self._base)
+        self._mmap.close()
+        self.file.seek(self.offset)
+
+
 class PpmdDecompressor:
+    """Decompress .ppmd file. A regular file is memory-mapped, and decoder reads it without copying.
+
+    PPMd var.H files written by old versions have no end mark, and a header doesn't record a length
+    of original data. Such files can be decompressed only when `length` of original data is given,
+    and ValueError is raised when data ends before an end mark without it.
+    """
 
-    def __init__(self, file, filesize):
+    def __init__(self, file, filesize=None, length: Optional[int] = None):
         hdr = PpmdHeader()
         hdr.read(file)
         restore = hdr.restore
         order = (hdr.info & 0x0f) + 1
         mem = ((hdr.info >> 4) & 0xff) + 1
+        mapped = _map_file(file) if hdr.version in (7, 8) else None
+        self._mapped = None if mapped is None else _MappedSource(file, mapped, filesize)
+        source = file if self._mapped is None else self._mapped
         if hdr.version == 8:
-            self.decoder = Ppmd8Decoder(file, order, mem << 20, restore)
+            self.decoder = Ppmd8Decoder(source, order, mem << 20, restore)
         elif hdr.version == 7:
-            self.decoder = Ppmd7Decoder(file, order, mem << 20)
+            self.decoder = Ppmd7Decoder(source, order, mem << 20, endmark=True)
         else:
             raise ValueError("Unsupported PPMd version detected.")
         self.file = file
         self.filename = hdr.filename
         self.size = filesize
+        self.length = length
         self.ftime = hdr.time
 
     def decompress(self, ofile):
-        while self.file.tell() < self.size:
-            data = self.decoder.decode(READ_BLOCKSIZE)
-            if len(data) == 0:
-                break
+        """Decompress until an end mark, or until `length` bytes of data without end mark."""
+        remaining = self.length
+        while not self.decoder.eof and remaining != 0:
+            size = READ_BLOCKSIZE if remaining is None else min(remaining, READ_BLOCKSIZE)
+            data = self.decoder.decode(size)
             ofile.write(data)
+            if remaining is not None:
+                remaining -= len(data)
+            if len(data) < size and not self.decoder.eof:
+                if remaining is None:
+                    raise ValueError("PPMd data ends before an end mark. It is corrupted, or written by an old "
+                                     "version without end mark, which needs a length of original data.")
+                raise ValueError("Corrupted PPMd data.")
 
     def close(self):
         self.decoder.close()
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
@@ -384,22 +1829,39 @@ class PpmdDecompressor:
 
 
 class PpmdCompressor:
+    """Compress data into .ppmd file with a header.
+
+    `mem` is in megabytes from 1 to 256, and `order` is from 2 to 16 which the header can record.
+    `restore` is a method of model restoration for PPMd var.I: 0 restarts a model and 1 cuts it off
+    when model memory is exhausted.
+    """
 
-    def __init__(self, ofile, fname, ftime, order, mem, version=8):
+    def __init__(self, ofile, fname, ftime, order, mem, version=8, restore=0):
+        _check_parameters(version, order, mem << 20, restore)
+        if not (order <= 16 and 1 <= mem <= 256) or (version == 7 and restore != 0):
+            raise ValueError("PPMd wrong parameters.")
+        PpmdHeader(fname=fname, ftime=ftime, version=version, order=order, mem_in_mb=mem, restore=restore).write(ofile)
         if version == 7:
-            PpmdHeader(fname=fname, ftime=ftime, version=7, order=order, mem_in_mb=mem).write(ofile)
-            self.encoder = Ppmd7Encoder(ofile, order, mem << 20)
-        elif version == 8:
-            PpmdHeader(fname=fname, ftime=ftime, version=8, order=order, mem_in_mb=mem, restore=0).write(ofile)
-            self.encoder = Ppmd8Encoder(ofile, order, mem << 20, 0)
+            self.encoder = Ppmd7Encoder(ofile, order, mem << 20, endmark=True)  # type: Any
         else:
-            raise ValueError("Unsupported PPMd version.")
+            self.encoder = Ppmd8Encoder(ofile, order, mem << 20, restore)
 
     def compress(self, src):
-        data = src.read(READ_BLOCKSIZE)
-        while len(data) > 0:
-            self.encoder.encode(data)
+        """Compress data from src. A regular file is memory-mapped, and encoded by windows of 1GB without copying."""
+        mapped = _map_file(src)
+        if mapped is not None:
+            with mapped:
+                start = src.tell()
+                with memoryview(mapped) as view:
+                    for offset in range(start, len(view), _MAP_WINDOW):
+                        with view[offset:offset + _MAP_WINDOW] as window:
+                            self.encoder.encode(window)
+                src.seek(max(start, len(mapped)))
+        else:
             data = src.read(READ_BLOCKSIZE)
+            while len(data) > 0:
+                self.encoder.encode(data)
+                data = src.read(READ_BLOCKSIZE)
         self.encoder.flush()
 
     def close(self):
@@ -416,45 +1878,670 @@ Ppmd8Decompressor = PpmdDecompressor
 Ppmd8Compressor = PpmdCompressor
 
 
+class _DecompressorRawIO(io.RawIOBase):
+    """Raw stream which returns data decoded by PpmdDecompressor."""
+
+    def __init__(self, decompressor: PpmdDecompressor):
+        self._decompressor = decompressor
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        decoder = self._decompressor.decoder
+        size = decoder.decode_into(b)
+        if decoder._status[0] == -2:
+            raise ValueError("Corrupted PPMd data.")
+        return size
+
+
+class PpmdFile(io.BufferedIOBase):
+    """File object of .ppmd format, which reads and writes uncompressed data.
+
+    `filename` can be a path or a file object. Compression parameters are used only for writing,
+    `mem` is in MB as PpmdCompressor. When reading, data is decoded ahead by `bufsize` bytes,
+    so `readline()` and iteration don't call a decoder for each line.
+    """
+
+    def __init__(self, filename, mode: str = 'r', *, order: int = 6, mem: int = 16, version: int = 8,
+                 fname: Optional[str] = None, bufsize: int = READ_BLOCKSIZE):
+        _check_bufsize(bufsize)
+        if mode in ('r', 'rb'):
+            mode = 'rb'
+        elif mode in ('w', 'wb', 'x', 'xb'):
+            mode = mode[0] + 'b'
+            if not (2 <= order <= 16 and 1 <= mem <= 256):
+                raise ValueError("PPMd wrong parameters.")
+        else:
+            raise ValueError("Invalid mode: {!r}".format(mode))
+        if isinstance(filename, (str, bytes, os.PathLike)):
+            self._fp = builtins.open(filename, mode)
+            self._closefp = True
+            name = os.path.basename(os.fsdecode(filename))
+        elif hasattr(filename, 'read') or hasattr(filename, 'write'):
+            self._fp = filename
+            self._closefp = False
+            name = getattr(filename, 'name', None)
+            name = os.path.basename(name) if isinstance(name, str) else 'a'
+        else:
+            raise TypeError("filename must be a str, bytes, file or PathLike object")
+        self._mode = mode
+        try:
+            if mode == 'rb':
+                filesize = os.fstat(self._fp.fileno()).st_size if self._closefp else None
+                self._decompressor = PpmdDecompressor(self._fp, filesize)
+                self._buffer = io.BufferedReader(_DecompressorRawIO(self._decompressor), bufsize)
+                self.filename = self._decompressor.filename
+                self.ftime = self._decompressor.ftime
+            else:
+                if fname is None:
+                    fname = name[:-5] if name.endswith('.ppmd') else name
+                self._compressor = PpmdCompressor(self._fp, fname, datetime.utcnow(), order, mem, version=version)
+        except BaseException:
+            if self._closefp:
+                self._fp.close()
+            raise
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._mode == 'rb':
+                self._decompressor.close()
+            else:
+                self._compressor.encoder.flush()
+                self._compressor.close()
+        finally:
+            try:
+                if self._closefp:
+                    self._fp.close()
+            finally:
+                super().close()
+
+    def readable(self) -> bool:
+        self._check_not_closed()
+        return self._mode == 'rb'
+
+    def writable(self) -> bool:
+        self._check_not_closed()
+        return self._mode != 'rb'
+
+    def seekable(self) -> bool:
+        self._check_not_closed()
+        return False
+
+    def fileno(self) -> int:
+        self._check_not_closed()
+        return self._fp.fileno()
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        self._check_readable()
+        return self._buffer.read(size)
+
+    def read1(self, size: int = -1) -> bytes:
+        self._check_readable()
+        return self._buffer.read1(size)
+
+    def readinto(self, b) -> int:
+        self._check_readable()
+        return self._buffer.readinto(b)
+
+    def peek(self, size: int = 0) -> bytes:
+        self._check_readable()
+        return self._buffer.peek(size)
+
+    def readline(self, size: Optional[int] = -1) -> bytes:
+        self._check_readable()
+        return self._buffer.readline(size)
+
+    def write(self, data) -> int:
+        self._check_not_closed()
+        if self._mode == 'rb':
+            raise io.UnsupportedOperation("File not open for writing")
+        with memoryview(data) as view:
+            self._compressor.encoder.encode(view)
+            return view.nbytes
+
+    def _check_not_closed(self) -> None:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+    def _check_readable(self) -> None:
+        self._check_not_closed()
+        if self._mode != 'rb':
+            raise io.UnsupportedOperation("File not open for reading")
+
+
+def open(filename, mode: str = 'rb', *, order: int = 6, mem: int = 16, version: int = 8, fname: Optional[str] = None,
+         bufsize: int = READ_BLOCKSIZE, encoding: Optional[str] = None, errors: Optional[str] = None,
+         newline: Optional[str] = None):
+    """Open a .ppmd file in binary or text mode, and return a file object.
+
+    Mode can be 'r', 'rb', 'w', 'wb', 'x' or 'xb' for binary mode, or 'rt', 'wt' or 'xt' for text mode.
+    In text mode, PpmdFile is wrapped by io.TextIOWrapper with `encoding`, `errors` and `newline`.
+    """
+    if 't' in mode:
+        if 'b' in mode:
+            raise ValueError("Invalid mode: {!r}".format(mode))
+    else:
+        if encoding is not None:
+            raise ValueError("Argument 'encoding' not supported in binary mode")
+        if errors is not None:
+            raise ValueError("Argument 'errors' not supported in binary mode")
+        if newline is not None:
+            raise ValueError("Argument 'newline' not supported in binary mode")
+    binary_file = PpmdFile(filename, mode.replace('t', ''), order=order, mem=mem, version=version, fname=fname,
+                           bufsize=bufsize)
+    if 't' in mode:
+        return io.TextIOWrapper(binary_file, encoding, errors, newline)
+    return binary_file
+
+
+def _entropy(data) -> float:
+    """Estimate order-0 entropy of data in bits per byte from 16 evenly spaced pieces of it."""
+    if len(data) > _ENTROPY_SAMPLESIZE:
+        step, piece = len(data) // 16, _ENTROPY_SAMPLESIZE // 16
+        data = b''.join(data[i:i + piece] for i in range(0, step * 16, step))
+    if len(data) == 0:
+        return 0.0
+    return -sum(count / len(data) * math.log2(count / len(data)) for count in collections.Counter(data).values())
+
+
+def _compress_block(data: bytes, order: int, mem: int, version: int, restore: int,
+                    entropy_threshold: Optional[float]) -> Optional[bytes]:
+    """Compress a block of framed format, or return None when it should be stored as is."""
+    if entropy_threshold is not None and _entropy(data) > entropy_threshold:
+        return None
+    compressed = compress(data, order, mem, version, restore)
+    return compressed if len(compressed) < len(data) else None
+
+
+def _check_frame(flags: int, compressed_size: int, size: int) -> None:
+    if flags & ~_FRAME_STORED or (flags & _FRAME_STORED and compressed_size != size):
+        raise ValueError("Corrupted PPMd data.")
+
+
+def _read_framed_header(file: BinaryIO):
+    header = file.read(_FRAMED_HEADER.size)
+    if len(header) < _FRAMED_HEADER.size or header[:4] != _PPMD_FRAMED_MAGIC:
+        raise ValueError("Invalid Header magic: {}".format(header[:4]))
+    _, fmt, version, order, restore, mem, block_size = _FRAMED_HEADER.unpack(header)
+    if fmt != 1:
+        raise ValueError("Unsupported frame format: {}".format(fmt))
+    _check_parameters(version, order, mem, restore)
+    return version, order, restore, mem, block_size
+
+
+class PpmdBlockCompressor:
+    """Compress data into frames of independently modelled blocks in parallel.
+
+    Each block of `block_size` bytes is compressed by `compress()` on `executor`, or on a thread pool
+    of `workers` threads when executor is not given. Because GIL is released while compressing,
+    threads scale across cores; ProcessPoolExecutor can be used as well.
+    Each frame records its compressed and uncompressed sizes, so frames can be decompressed in parallel.
+    When `seek_table` is True, a table of frame sizes is appended after the last frame for PpmdBlockReader.
+    `mem` is in bytes.
+
+    PPMd is slow on high-entropy data such as compressed media or encrypted data, and cannot shrink it.
+    A block whose order-0 entropy estimated from a sample exceeds `entropy_threshold` bits per byte
+    is stored as is without compression, and so is a block which compression does not shrink.
+    A stored frame is flagged in its header. `entropy_threshold=None` tries compression of all blocks.
+    Every block is modelled from an empty model, so a stored block doesn't affect the others.
+    """
+
+    def __init__(self, ofile: BinaryIO, order: int = 6, mem: int = 16 << 20, version: int = 8, restore: int = 0,
+                 block_size: int = FRAME_BLOCKSIZE, workers: Optional[int] = None, executor: Optional[Executor] = None,
+                 seek_table: bool = False, entropy_threshold: Optional[float] = 7.95):
+        _check_parameters(version, order, mem, restore)
+        if not 0 < block_size <= 0x7FFFFFFF:
+            raise ValueError("Block size should be positive and less than 2GB.")
+        self.ofile = ofile
+        self.block_size = block_size
+        self._compress = functools.partial(_compress_block, order=order, mem=mem, version=version, restore=restore,
+                                           entropy_threshold=entropy_threshold)
+        self._executor = executor if executor is not None else ThreadPoolExecutor(workers)
+        self._shutdown = executor is None
+        self._window = 2 * (workers or os.cpu_count() or 1)
+        self._seek_table = [] if seek_table else None  # type: Optional[list]
+        ofile.write(_FRAMED_HEADER.pack(_PPMD_FRAMED_MAGIC, 1, version, order, restore, mem, block_size))
+
+    def compress(self, src: BinaryIO) -> None:
+        """Compress whole data from src, and write frames with a terminator."""
+        pending = collections.deque()  # type: collections.deque
+        data = src.read(self.block_size)
+        while len(data) > 0:
+            pending.append((data, self._executor.submit(self._compress, data)))
+            if len(pending) >= self._window:
+                self._write_frame(*pending.popleft())
+            data = src.read(self.block_size)
+        while pending:
+            self._write_frame(*pending.popleft())
+        self.ofile.write(_FRAME_HEADER.pack(0, 0, 0))
+        if self._seek_table is not None:
+            for entry in self._seek_table:
+                self.ofile.write(_SEEKTABLE_ENTRY.pack(*entry))
+            self.ofile.write(_SEEKTABLE_FOOTER.pack(len(self._seek_table), _PPMD_SEEKTABLE_MAGIC))
+
+    def _write_frame(self, data: bytes, future) -> None:
+        compressed = future.result()
+        if compressed is None:
+            self.ofile.write(_FRAME_HEADER.pack(_FRAME_STORED, len(data), len(data)))
+            compressed = data
+        else:
+            self.ofile.write(_FRAME_HEADER.pack(0, len(compressed), len(data)))
+        self.ofile.write(compressed)
+        if self._seek_table is not None:
+            self._seek_table.append((len(compressed), len(data)))
+
+    def close(self):
+        if self._shutdown:
+            self._executor.shutdown()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+
+class PpmdBlockDecompressor:
+    """Decompress frames written by PpmdBlockCompressor in parallel."""
+
+    def __init__(self, file: BinaryIO, workers: Optional[int] = None, executor: Optional[Executor] = None):
+        version, order, restore, mem, block_size = _read_framed_header(file)
+        self.file = file
+        self.version = version
+        self.order = order
+        self.mem = mem
+        self.restore = restore
+        self.block_size = block_size
+        self._decompress = functools.partial(decompress, order=order, mem=mem, version=version, restore=restore)
+        self._executor = executor if executor is not None else ThreadPoolExecutor(workers)
+        self._shutdown = executor is None
+        self._window = 2 * (workers or os.cpu_count() or 1)
+
+    def decompress(self, ofile: BinaryIO) -> None:
+        """Decompress all frames, and write data to ofile."""
+        pending = collections.deque()  # type: collections.deque
+        while True:
+            flags, compressed_size, size = self._read_frame_header()
+            if compressed_size == 0 and size == 0:
+                break
+            data = self.file.read(compressed_size)
+            if len(data) < compressed_size:
+                raise ValueError("Corrupted PPMd data.")
+            if flags & _FRAME_STORED:
+                future = Future()  # type: Future
+                future.set_result(data)
+            else:
+                future = self._executor.submit(self._decompress, data)
+            pending.append((size, future))
+            if len(pending) >= self._window:
+                self._write_block(ofile, *pending.popleft())
+        while pending:
+            self._write_block(ofile, *pending.popleft())
+
+    def _read_frame_header(self):
+        header = self.file.read(_FRAME_HEADER.size)
+        if len(header) < _FRAME_HEADER.size:
+            raise ValueError("Corrupted PPMd data.")
+        flags, compressed_size, size = _FRAME_HEADER.unpack(header)
+        _check_frame(flags, compressed_size, size)
+        return flags, compressed_size, size
+
+    def _write_block(self, ofile: BinaryIO, size: int, future) -> None:
+        data = future.result()
+        if len(data) != size:
+            raise ValueError("Corrupted PPMd data.")
+        ofile.write(data)
+
+    def close(self):
+        if self._shutdown:
+            self._executor.shutdown()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+
+class PpmdBlockReader(io.BufferedIOBase):
+    """Seekable reader of block-parallel framed format.
+
+    Frame positions are taken from a seek table written by PpmdBlockCompressor with `seek_table=True`,
+    or by scanning frame headers when data has no table. `seek()` and `read()` decode only frames
+    which cover the requested range. `file` should be seekable.
+    """
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.version, self.order, self.restore, self.mem, self.block_size = _read_framed_header(file)
+        self._decompress = functools.partial(decompress, order=self.order, mem=self.mem, version=self.version,
+                                             restore=self.restore)
+        self._frames = []  # type: list  # (file offset of frame, uncompressed size)
+        self._starts = []  # type: list  # uncompressed offset of each frame
+        if not self._load_seek_table():
+            self._scan_frames()
+        self._size = self._starts[-1] + self._frames[-1][1] if self._frames else 0
+        self._pos = 0
+        self._cached = -1
+        self._block = b''
+
+    def _load_seek_table(self) -> bool:
+        end = self.file.seek(0, io.SEEK_END)
+        if end < _FRAMED_HEADER.size + _FRAME_HEADER.size + _SEEKTABLE_FOOTER.size:
+            return False
+        self.file.seek(-_SEEKTABLE_FOOTER.size, io.SEEK_END)
+        count, magic = _SEEKTABLE_FOOTER.unpack(self.file.read(_SEEKTABLE_FOOTER.size))
+        table_size = count * _SEEKTABLE_ENTRY.size
+        if magic != _PPMD_SEEKTABLE_MAGIC or end < _FRAMED_HEADER.size + table_size + _SEEKTABLE_FOOTER.size:
+            return False
+        self.file.seek(-(table_size + _SEEKTABLE_FOOTER.size), io.SEEK_END)
+        table = self.file.read(table_size)
+        frames, starts = [], []
+        offset, start = _FRAMED_HEADER.size, 0
+        for compressed_size, size in _SEEKTABLE_ENTRY.iter_unpack(table):
+            frames.append((offset, size))
+            starts.append(start)
+            offset += _FRAME_HEADER.size + compressed_size
+            start += size
+        if offset + _FRAME_HEADER.size + table_size + _SEEKTABLE_FOOTER.size != end:
+            return False  # trailer is not a seek table
+        self._frames, self._starts = frames, starts
+        return True
+
+    def _scan_frames(self) -> None:
+        offset = self.file.seek(_FRAMED_HEADER.size)
+        start = 0
+        while True:
+            header = self.file.read(_FRAME_HEADER.size)
+            if len(header) < _FRAME_HEADER.size:
+                raise ValueError("Corrupted PPMd data.")
+            flags, compressed_size, size = _FRAME_HEADER.unpack(header)
+            if compressed_size == 0 and size == 0:
+                break
+            _check_frame(flags, compressed_size, size)
+            self._frames.append((offset, size))
+            self._starts.append(start)
+            offset = self.file.seek(compressed_size, io.SEEK_CUR)
+            start += size
+
+    def _load_block(self, index: int) -> bytes:
+        if index != self._cached:
+            offset, size = self._frames[index]
+            self.file.seek(offset)
+            flags, compressed_size, _ = _FRAME_HEADER.unpack(self.file.read(_FRAME_HEADER.size))
+            _check_frame(flags, compressed_size, size)
+            data = self.file.read(compressed_size)
+            if len(data) < compressed_size:
+                raise ValueError("Corrupted PPMd data.")
+            self._block = data if flags & _FRAME_STORED else self._decompress(data)
+            if len(self._block) != size:
+                raise ValueError("Corrupted PPMd data.")
+            self._cached = index
+        return self._block
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        elif whence != io.SEEK_SET:
+            raise ValueError("Invalid whence ({}, should be 0, 1 or 2)".format(whence))
+        if offset < 0:
+            raise ValueError("Negative seek position {}".format(offset))
+        self._pos = offset
+        return self._pos
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if size is None or size < 0:
+            size = max(self._size - self._pos, 0)
+        out = bytearray()
+        while size > 0 and self._pos < self._size:
+            index = bisect.bisect_right(self._starts, self._pos) - 1
+            start = self._pos - self._starts[index]
+            chunk = self._load_block(index)[start:start + size]
+            out += chunk
+            self._pos += len(chunk)
+            size -= len(chunk)
+        return bytes(out)
+
+    def read1(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+    def readinto(self, b) -> int:
+        with memoryview(b) as view, view.cast('B') as byte_view:
+            data = self.read(len(byte_view))
+            byte_view[:len(data)] = data
+        return len(data)
+
+    @property
+    def size(self) -> int:
+        """Size of whole uncompressed data."""
+        return self._size
+
+
+def _is_framed(file: BinaryIO) -> bool:
+    if not file.seekable():
+        return file.peek(len(_PPMD_FRAMED_MAGIC))[:len(_PPMD_FRAMED_MAGIC)] == _PPMD_FRAMED_MAGIC  # type: ignore
+    magic = file.read(len(_PPMD_FRAMED_MAGIC))
+    file.seek(-len(magic), io.SEEK_CUR)
+    return magic == _PPMD_FRAMED_MAGIC
+
+
+class _PrefixedReader:
+    """Read data which was read ahead from a stream, and then the rest of the stream."""
+
+    def __init__(self, prefix: bytes, file):
+        self.prefix = prefix
+        self.file = file
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.prefix:
+            return self.file.read(size)
+        if size < 0 or size > len(self.prefix):
+            data = self.prefix + self.file.read(-1 if size < 0 else size - len(self.prefix))
+            self.prefix = b''
+            return data
+        data, self.prefix = self.prefix[:size], self.prefix[size:]
+        return data
+
+
+@contextlib.contextmanager
+def _std_stream(stream, mode: str):
+    """Open stdin or stdout in binary mode with a large buffer, or use its buffer when it has no file descriptor."""
+    stream.flush()
+    try:
+        fd = stream.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        yield stream.buffer
+        stream.buffer.flush()
+        return
+    with builtins.open(fd, mode, buffering=_STREAM_BUFSIZE, closefd=False) as file:
+        yield file
+
+
+def _compress_stream(src, ofile, fname: str, ftime: datetime, size: Optional[int], args,
+                     workers: Optional[int]) -> None:
+    """Compress src into .ppmd format, or into block-parallel frames with workers threads when workers is given."""
+    framed = workers is not None
+    version = 7 if args.seven else 8
+    order = 6 if args.order is None else args.order
+    mem = (16 if args.seven or framed else 8) if args.mem is None else args.mem
+    restore = 0 if args.restore is None else args.restore
+    if args.auto:
+        # a stream of unknown size gets whole budget
+        size = sys.maxsize if size is None else size
+        if framed:
+            size = min(size, FRAME_BLOCKSIZE)
+        sample = src.read(TUNE_SAMPLESIZE)
+        if src.seekable():
+            src.seek(-len(sample), io.SEEK_CUR)
+        else:
+            src = _PrefixedReader(sample, src)
+        budget = 256 if args.mem is None else args.mem
+        order, mem_size, tuned = tune_parameters(sample, size, version, budget << 20, order=args.order)
+        mem = mem_size >> 20
+        if args.restore is None:
+            restore = tuned
+    if framed:
+        with PpmdBlockCompressor(ofile, order, mem << 20, version=version, restore=restore, workers=workers,
+                                 seek_table=True) as compressor:
+            compressor.compress(src)
+    else:
+        with PpmdCompressor(ofile, fname, ftime, order, mem, version=version, restore=restore) as compressor:
+            compressor.compress(src)
+
+
+def _compress_file(targetfile: pathlib.Path, args, workers: Optional[int]) -> None:
+    ftime = datetime.utcfromtimestamp(targetfile.stat().st_mtime)
+    with targetfile.open('rb') as src:
+        if args.c:
+            with _std_stream(sys.stdout, 'wb') as ofile:
+                _compress_stream(src, ofile, targetfile.name, ftime, targetfile.stat().st_size, args, workers)
+        else:
+            with pathlib.Path(str(targetfile) + '.ppmd').open('wb') as ofile:
+                _compress_stream(src, ofile, targetfile.name, ftime, targetfile.stat().st_size, args, workers)
+
+
+def _extract_stream(src, ofile, size: Optional[int], workers: Optional[int], length: Optional[int] = None) -> None:
+    if _is_framed(src):
+        with PpmdBlockDecompressor(src, workers=workers) as decompressor:
+            decompressor.decompress(ofile)
+    else:
+        with PpmdDecompressor(src, size, length) as decompressor:
+            decompressor.decompress(ofile)
+
+
+def _extracted_path(targetfile: pathlib.Path, filename: str) -> pathlib.Path:
+    """Return a path to extract an archive next to it, with a file name in its header without directories."""
+    name = os.path.basename(filename.replace('\\', '/'))
+    if name in ('', '.', '..'):
+        return targetfile.with_suffix('')
+    return targetfile.parent.joinpath(name)
+
+
+def _extract_file(targetfile: pathlib.Path, args, workers: Optional[int]) -> None:
+    with targetfile.open('rb') as target:
+        if args.c:
+            with _std_stream(sys.stdout, 'wb') as ofile:
+                _extract_stream(target, ofile, targetfile.stat().st_size, workers, args.length)
+        elif _is_framed(target):
+            with PpmdBlockDecompressor(target, workers=workers) as decompressor:
+                with targetfile.with_suffix('').open('wb') as ofile:
+                    decompressor.decompress(ofile)
+        else:
+            with PpmdDecompressor(target, targetfile.stat().st_size, args.length) as decompressor:
+                extractedfile = _extracted_path(targetfile, decompressor.filename)
+                with extractedfile.open('wb') as ofile:
+                    decompressor.decompress(ofile)
+                timestamp = datetime_to_timestamp(decompressor.ftime)
+                os.utime(str(extractedfile), times=(timestamp, timestamp))
+
+
+def _expand_targets(targets: List[str], extract: bool) -> List[pathlib.Path]:
+    """Return target files, where directories are replaced with files in them recursively.
+
+    Files in directories are .ppmd files for extraction, and other files for compression.
+    """
+    files = []  # type: List[pathlib.Path]
+    for target in targets:
+        path = pathlib.Path(target)
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*') if p.is_file() and (p.suffix == '.ppmd') == extract))
+        else:
+            files.append(path)
+    return files
+
+
 def main(arg: Optional[Any] = None):
     parser = argparse.ArgumentParser(prog='ppmd', description='ppmd')
     parser.add_argument("-x", action="store_true", help="Specify decompression")
     parser.add_argument("-c", action="store_true", help="Output to stdout")
     parser.add_argument("-7", "--seven", action="store_true", help="Compress with PPMd ver.H instead of Ver.I")
-    parser.add_argument("target")
+    parser.add_argument("-T", type=int, metavar="N", dest="threads",
+                        help="Compress into block-parallel frames, or extract them with N threads. "
+                             "Several files are processed on N processes with one thread each")
+    parser.add_argument("-o", "--order", type=int, help="Model order from 2 to 16 (default: 6)")
+    parser.add_argument("-m", "--mem", type=int, metavar="MB",
+                        help="Model memory size in megabytes from 1 to 256 (default: 8, or 16 with -7 or -T)")
+    parser.add_argument("-r", "--restore", type=int, choices=[0, 1],
+                        help="Restart (0) or cut off (1) a model when memory is exhausted (default: 0)")
+    parser.add_argument("-a", "--auto", action="store_true",
+                        help="Choose order, memory and restore method from a sample of input within memory size "
+                             "given by -m (default: 256)")
+    parser.add_argument("-l", "--length", type=int, metavar="BYTES",
+                        help="Length of original data, which is needed to extract PPMd ver.H data without end mark "
+                             "written by old versions")
+    parser.add_argument("targets", nargs="+", metavar="target",
+                        help="Files or directories to process recursively, or - for stdin to stdout")
     args = parser.parse_args(arg)
-    targetfile = pathlib.Path(args.target)
+    if args.threads is not None and args.threads < 1:
+        sys.stderr.write("Number of threads should be positive.")
+        exit(1)
+    if (args.order is not None and not 2 <= args.order <= 16) or (args.mem is not None and not 1 <= args.mem <= 256):
+        sys.stderr.write("PPMd wrong parameters.")
+        exit(1)
     if args.x:
-        if targetfile.suffix != '.ppmd':
-            sys.stderr.write("Target file does not have .ppmd suffix.")
-            exit(1)
         if args.seven:
             sys.stderr.write("Cannot specify version for extraction.")
             exit(1)
-        target_size = targetfile.stat().st_size
-        if args.c:
-            with targetfile.open('rb') as target:
-                with PpmdDecompressor(target, target_size) as decompressor:
-                    sys.stdout.flush()
-                    decompressor.decompress(sys.stdout.buffer)
-                    sys.stdout.buffer.flush()
+        if args.order is not None or args.mem is not None or args.restore is not None or args.auto:
+            sys.stderr.write("Cannot specify compression parameters for extraction.")
+            exit(1)
+    elif args.length is not None:
+        sys.stderr.write("Length can be specified only for extraction.")
+        exit(1)
+    elif args.seven and args.restore is not None:
+        sys.stderr.write("Cannot specify restore method for PPMd ver.H.")
+        exit(1)
+    if '-' in args.targets:
+        if len(args.targets) > 1:
+            sys.stderr.write("Cannot specify stdin with other targets.")
+            exit(1)
+        with _std_stream(sys.stdin, 'rb') as src:
+            with _std_stream(sys.stdout, 'wb') as ofile:
+                if args.x:
+                    _extract_stream(src, ofile, None, args.threads, args.length)
+                else:
+                    _compress_stream(src, ofile, 'stdin', datetime.utcnow(), None, args, args.threads)
+        return
+    files = _expand_targets(args.targets, args.x)
+    if args.x and any(targetfile.suffix != '.ppmd' for targetfile in files):
+        sys.stderr.write("Target file does not have .ppmd suffix.")
+        exit(1)
+    if args.c and len(files) > 1:
+        sys.stderr.write("Cannot output several files to stdout.")
+        exit(1)
+    if args.length is not None and len(files) > 1:
+        sys.stderr.write("Cannot specify length with several files.")
+        exit(1)
+    if len(files) == 1:
+        if args.x:
+            _extract_file(files[0], args, args.threads)
         else:
-            parent = targetfile.parent
-            with targetfile.open('rb') as target:
-                with PpmdDecompressor(target, target_size) as decompressor:
-                    extractedfile = pathlib.Path(parent.joinpath(decompressor.filename))
-                    with extractedfile.open('wb') as ofile:
-                        decompressor.decompress(ofile)
-                        timestamp = datetime_to_timestamp(decompressor.ftime)
-                        os.utime(str(extractedfile), times=(timestamp, timestamp))
+            _compress_file(files[0], args, args.threads)
+        return
+    # each file is processed by one worker with one thread, in the same format as a single file
+    workers = None if args.threads is None else 1
+    if args.x:
+        task = functools.partial(_extract_file, args=args, workers=workers)
     else:
-        archivefile = pathlib.Path(str(targetfile) + '.ppmd')
-        with archivefile.open('wb') as target:
-            with targetfile.open('rb') as src:
-                ftime = datetime.utcfromtimestamp(targetfile.stat().st_mtime)
-                if args.seven:
-                    with PpmdCompressor(target, str(targetfile), ftime, 6, 16, version=7) as compressor:
-                        compressor.compress(src)
-                else:
-                    with PpmdCompressor(target, str(targetfile), ftime, 6, 8, version=8) as compressor:
-                        compressor.compress(src)
+        task = functools.partial(_compress_file, args=args, workers=workers)
+    if args.threads is None:
+        for targetfile in files:
+            task(targetfile)
+    else:
+        with ProcessPoolExecutor(args.threads) as executor:
+            for _ in executor.map(task, files, chunksize=16):
+                pass
@@ -1,7 +1,13 @@
 #from _ppmd import ffi as ffi, lib as lib
-from typing import Any, BinaryIO, Optional
+import asyncio
+import io
+from concurrent.futures import Executor
+from typing import IO, Any, BinaryIO, ContextManager, Dict, List, Optional, Tuple
 
 READ_BLOCKSIZE: int
+WRITE_BLOCKSIZE: int
+FRAME_BLOCKSIZE: int
+TUNE_SAMPLESIZE: int
 
 def dostime_to_dt(dosdate: Any, dostime: Any): ...
 def dt_to_dostime(dt: Any): ...
@@ -9,6 +15,21 @@ def datetime_to_timestamp(dt: Any): ...
 def dst_write(b: bytes, size: int, userdata: object) -> None: ...
 def src_readinto(b: bytes, size: int, userdata: object) -> int: ...
 
+class PpmdModel:
+    version: int = ...
+    order: int = ...
+    mem: int = ...
+    restore: int = ...
+    def __init__(self, version: int, order: int, mem: int, restore: int, state: Any, refs: Any, arena: Any) -> None: ...
+    @property
+    def size(self) -> int: ...
+    def save(self, file: Any) -> None: ...
+
+def load_model(file: Any) -> PpmdModel: ...
+def train_model(sample: Any, order: int = ..., mem: int = ..., version: int = ..., restore: int = ...) -> PpmdModel: ...
+def tune_parameters(sample: Any, size: Optional[int] = ..., version: int = ..., mem: int = ...,
+                    tolerance: float = ..., order: Optional[int] = ...) -> Tuple[int, int, int]: ...
+
 class Ppmd7Encoder:
     closed: bool = ...
     flushed: bool = ...
@@ -16,9 +37,15 @@ class Ppmd7Encoder:
     ppmd: Any = ...
     rc: Any = ...
     writer: Any = ...
-    def __init__(self, destination: BinaryIO, max_order: int, mem_size: int) -> None: ...
+    endmark: bool = ...
+    def __init__(self, destination: BinaryIO, max_order: int, mem_size: int, endmark: bool = ...,
+                 bufsize: int = ..., model: Optional[PpmdModel] = ..., checkpoint: Any = ...,
+                 huge_pages: bool = ...) -> None: ...
+    def reset(self, destination: Optional[BinaryIO] = ...) -> None: ...
     def encode(self, inbuf: Any) -> None: ...
     def flush(self) -> None: ...
+    def checkpoint(self, file: Any = ...) -> Optional[bytes]: ...
+    def stats(self) -> Dict[str, Any]: ...
     def close(self) -> None: ...
     def __enter__(self): ...
     def __exit__(self, type: Any, value: Any, traceback: Any) -> None: ...
@@ -29,8 +56,19 @@ class Ppmd7Decoder:
     reader: Any = ...
     source: Any = ...
     closed: bool = ...
-    def __init__(self, source: BinaryIO, max_order: int, mem_size: int) -> None: ...
-    def decode(self, length: Any) -> bytes: ...
+    endmark: bool = ...
+    def __init__(self, source: BinaryIO, max_order: int, mem_size: int, endmark: bool = ...,
+                 bufsize: int = ..., model: Optional[PpmdModel] = ..., checkpoint: Any = ...,
+                 huge_pages: bool = ...) -> None: ...
+    def reset(self, source: Optional[BinaryIO] = ...) -> None: ...
+    @property
+    def unused_data(self) -> bytes: ...
+    @property
+    def eof(self) -> bool: ...
+    def decode(self, length: int = ...) -> bytes: ...
+    def decode_into(self, buffer: Any) -> int: ...
+    def checkpoint(self, file: Any = ...) -> Optional[bytes]: ...
+    def stats(self) -> Dict[str, Any]: ...
     def close(self) -> None: ...
     def __enter__(self): ...
     def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None: ...
@@ -45,8 +83,18 @@ class Ppmd8Decoder:
     max_order: Any = ...
     mem_size: Any = ...
     restore: Any = ...
-    def __init__(self, source: BinaryIO, max_order: int, mem_size: int, restore: int) -> None: ...
-    def decode(self, length: Any): ...
+    def __init__(self, source: BinaryIO, max_order: int, mem_size: int, restore: int, bufsize: int = ...,
+                 model: Optional[PpmdModel] = ..., checkpoint: Any = ...,
+                 huge_pages: bool = ...) -> None: ...
+    def reset(self, source: Optional[BinaryIO] = ...) -> None: ...
+    @property
+    def unused_data(self) -> bytes: ...
+    @property
+    def eof(self) -> bool: ...
+    def decode(self, length: int = ...) -> bytes: ...
+    def decode_into(self, buffer: Any) -> int: ...
+    def checkpoint(self, file: Any = ...) -> Optional[bytes]: ...
+    def stats(self) -> Dict[str, Any]: ...
     def close(self) -> None: ...
     def __enter__(self): ...
     def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None: ...
@@ -57,13 +105,97 @@ class Ppmd8Encoder:
     destination: Any = ...
     ppmd: Any = ...
     writer: Any = ...
-    def __init__(self, destination: BinaryIO, max_order: int, mem_size: int, restore: int) -> None: ...
+    def __init__(self, destination: BinaryIO, max_order: int, mem_size: int, restore: int,
+                 bufsize: int = ..., model: Optional[PpmdModel] = ..., checkpoint: Any = ...,
+                 huge_pages: bool = ...) -> None: ...
+    def reset(self, destination: Optional[BinaryIO] = ...) -> None: ...
     def encode(self, inbuf: Any) -> None: ...
     def flush(self) -> None: ...
+    def checkpoint(self, file: Any = ...) -> Optional[bytes]: ...
+    def stats(self) -> Dict[str, Any]: ...
     def close(self) -> None: ...
     def __enter__(self): ...
     def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None: ...
 
+def compress(data: Any, order: int = ..., mem: int = ..., version: int = ..., restore: int = ...,
+             model: Optional[PpmdModel] = ...) -> bytes: ...
+def decompress(data: Any, order: int = ..., mem: int = ..., version: int = ..., restore: int = ...,
+               model: Optional[PpmdModel] = ...) -> bytes: ...
+def compress_batch(buffers: Any, order: int = ..., mem: int = ..., version: int = ..., restore: int = ...,
+                   model: Optional[PpmdModel] = ..., workers: Optional[int] = ...) -> Tuple[bytes, List[int]]: ...
+def decompress_batch(data: Any, offsets: Any, order: int = ..., mem: int = ..., version: int = ..., restore: int = ...,
+                     model: Optional[PpmdModel] = ..., workers: Optional[int] = ...) -> Tuple[bytes, List[int]]: ...
+
+class _CompressObj:
+    def compress(self, data: Any) -> bytes: ...
+    def flush(self) -> bytes: ...
+
+class Ppmd7CompressObj(_CompressObj):
+    def __init__(self, order: int = ..., mem: int = ..., model: Optional[PpmdModel] = ...) -> None: ...
+
+class Ppmd8CompressObj(_CompressObj):
+    def __init__(self, order: int = ..., mem: int = ..., restore: int = ..., model: Optional[PpmdModel] = ...) -> None: ...
+
+class _DecompressObj:
+    unused_data: bytes = ...
+    @property
+    def eof(self) -> bool: ...
+    @property
+    def needs_input(self) -> bool: ...
+    def decompress(self, data: Any, max_length: int = ...) -> bytes: ...
+    def flush(self) -> bytes: ...
+
+class Ppmd7DecompressObj(_DecompressObj):
+    def __init__(self, order: int = ..., mem: int = ..., model: Optional[PpmdModel] = ...) -> None: ...
+
+class Ppmd8DecompressObj(_DecompressObj):
+    def __init__(self, order: int = ..., mem: int = ..., restore: int = ..., model: Optional[PpmdModel] = ...) -> None: ...
+
+def compressobj(order: int = ..., mem: int = ..., version: int = ..., restore: int = ...,
+                model: Optional[PpmdModel] = ...) -> _CompressObj: ...
+def decompressobj(order: int = ..., mem: int = ..., version: int = ..., restore: int = ...,
+                  model: Optional[PpmdModel] = ...) -> _DecompressObj: ...
+
+class _CoderPool:
+    maxsize: int = ...
+    numa: bool = ...
+    huge_pages: bool = ...
+    def __init__(self, maxsize: int = ..., numa: bool = ..., huge_pages: bool = ...) -> None: ...
+    def acquire(self, stream: BinaryIO, order: int = ..., mem: int = ..., version: int = ..., restore: int = ...,
+                model: Optional[PpmdModel] = ...) -> Any: ...
+    def release(self, coder: Any) -> None: ...
+    def clear(self) -> None: ...
+
+class EncoderPool(_CoderPool):
+    def encoder(self, destination: BinaryIO, order: int = ..., mem: int = ..., version: int = ..., restore: int = ...,
+                model: Optional[PpmdModel] = ...) -> ContextManager[Any]: ...
+
+class DecoderPool(_CoderPool):
+    def decoder(self, source: BinaryIO, order: int = ..., mem: int = ..., version: int = ..., restore: int = ...,
+                model: Optional[PpmdModel] = ...) -> ContextManager[Any]: ...
+
+class AsyncPpmdWriter:
+    closed: bool = ...
+    def __init__(self, writer: asyncio.StreamWriter, order: int = ..., mem: int = ..., version: int = ...,
+                 restore: int = ..., model: Optional[PpmdModel] = ..., executor: Optional[Executor] = ...,
+                 chunk_size: int = ...) -> None: ...
+    async def write(self, data: Any) -> None: ...
+    async def close(self) -> None: ...
+    async def __aenter__(self) -> AsyncPpmdWriter: ...
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None: ...
+
+class AsyncPpmdReader:
+    def __init__(self, reader: asyncio.StreamReader, order: int = ..., mem: int = ..., version: int = ...,
+                 restore: int = ..., model: Optional[PpmdModel] = ..., executor: Optional[Executor] = ...,
+                 chunk_size: int = ...) -> None: ...
+    @property
+    def eof(self) -> bool: ...
+    @property
+    def unused_data(self) -> bytes: ...
+    async def read(self, size: int = ...) -> bytes: ...
+    def __aiter__(self) -> AsyncPpmdReader: ...
+    async def __anext__(self) -> bytes: ...
+
 class PpmdHeader:
     size: int = ...
     time: Any = ...
@@ -83,8 +215,9 @@ class PpmdDecompressor:
     file: Any = ...
     filename: Any = ...
     size: Any = ...
+    length: Optional[int] = ...
     ftime: Any = ...
-    def __init__(self, file: Any, filesize: Any) -> None: ...
+    def __init__(self, file: Any, filesize: Any = ..., length: Optional[int] = ...) -> None: ...
     def decompress(self, ofile: Any) -> None: ...
     def close(self) -> None: ...
     def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None: ...
@@ -92,7 +225,8 @@ class PpmdDecompressor:
 
 class PpmdCompressor:
     encoder: Any = ...
-    def __init__(self, ofile: Any, fname: Any, ftime: Any, order: Any, mem: Any, version: int = ...) -> None: ...
+    def __init__(self, ofile: Any, fname: Any, ftime: Any, order: Any, mem: Any, version: int = ...,
+                 restore: int = ...) -> None: ...
     def compress(self, src: Any) -> None: ...
     def close(self) -> None: ...
     def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None: ...
@@ -100,4 +234,67 @@ class PpmdCompressor:
 Ppmd8Decompressor = PpmdDecompressor
 Ppmd8Compressor = PpmdCompressor
 
+class PpmdFile(io.BufferedIOBase):
+    filename: str = ...
+    ftime: Any = ...
+    def __init__(self, filename: Any, mode: str = ..., *, order: int = ..., mem: int = ..., version: int = ...,
+                 fname: Optional[str] = ..., bufsize: int = ...) -> None: ...
+    def close(self) -> None: ...
+    def readable(self) -> bool: ...
+    def writable(self) -> bool: ...
+    def seekable(self) -> bool: ...
+    def fileno(self) -> int: ...
+    def read(self, size: Optional[int] = ...) -> bytes: ...
+    def read1(self, size: int = ...) -> bytes: ...
+    def readinto(self, b: Any) -> int: ...
+    def peek(self, size: int = ...) -> bytes: ...
+    def readline(self, size: Optional[int] = ...) -> bytes: ...
+    def write(self, data: Any) -> int: ...
+
+def open(filename: Any, mode: str = ..., *, order: int = ..., mem: int = ..., version: int = ...,
+         fname: Optional[str] = ..., bufsize: int = ..., encoding: Optional[str] = ..., errors: Optional[str] = ...,
+         newline: Optional[str] = ...) -> IO[Any]: ...
+
+class PpmdBlockCompressor:
+    ofile: BinaryIO = ...
+    block_size: int = ...
+    def __init__(self, ofile: BinaryIO, order: int = ..., mem: int = ..., version: int = ..., restore: int = ...,
+                 block_size: int = ..., workers: Optional[int] = ..., executor: Optional[Executor] = ...,
+                 seek_table: bool = ..., entropy_threshold: Optional[float] = ...) -> None: ...
+    def compress(self, src: BinaryIO) -> None: ...
+    def close(self) -> None: ...
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None: ...
+    def __enter__(self): ...
+
+class PpmdBlockDecompressor:
+    file: BinaryIO = ...
+    version: int = ...
+    order: int = ...
+    mem: int = ...
+    restore: int = ...
+    block_size: int = ...
+    def __init__(self, file: BinaryIO, workers: Optional[int] = ..., executor: Optional[Executor] = ...) -> None: ...
+    def decompress(self, ofile: BinaryIO) -> None: ...
+    def close(self) -> None: ...
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None: ...
+    def __enter__(self): ...
+
+class PpmdBlockReader(io.BufferedIOBase):
+    file: BinaryIO = ...
+    version: int = ...
+    order: int = ...
+    mem: int = ...
+    restore: int = ...
+    block_size: int = ...
+    def __init__(self, file: BinaryIO) -> None: ...
+    def readable(self) -> bool: ...
+    def seekable(self) -> bool: ...
+    def tell(self) -> int: ...
+    def seek(self, offset: int, whence: int = ...) -> int: ...
+    def read(self, size: Optional[int] = ...) -> bytes: ...
+    def read1(self, size: int = ...) -> bytes: ...
+    def readinto(self, b: Any) -> int: ...
+    @property
+    def size(self) -> int: ...
+
 def main(arg: Optional[Any]=...) -> Any: ...
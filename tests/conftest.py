@@ -0,0 +1,19 @@
+import os
+import pathlib
+
+import pytest  # type: ignore
+
+testdata_path = pathlib.Path(os.path.dirname(__file__)).joinpath('data')
+
+
+@pytest.fixture(scope='session')
+def sales_data():
+    """Contents of 10000SalesRecords.csv, a sample of real data shared by tests."""
+    with testdata_path.joinpath('10000SalesRecords.csv').open('rb') as f:
+        return f.read()
+
+
+@pytest.fixture(scope='session')
+def sales_records(sales_data):
+    """Lines of 10000SalesRecords.csv with line endings."""
+    return sales_data.splitlines(keepends=True)
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest  # type: ignore
+
+import ppmd
+
+
+class _Writer:
+    """Collect data written like asyncio.StreamWriter."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.drained = 0
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.drained += 1
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def _reader(data, chunk=1000):
+    reader = asyncio.StreamReader()
+    for i in range(0, len(data), chunk):
+        reader.feed_data(data[i:i + chunk])
+    reader.feed_eof()
+    return reader
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_async_writer(version, sales_data):
+    data = sales_data
+
+    async def write():
+        writer = _Writer()
+        async with ppmd.AsyncPpmdWriter(writer, version=version, chunk_size=100000) as compressor:
+            await compressor.write(data)
+        return writer
+
+    writer = _run(write())
+    assert writer.drained > 1
+    assert ppmd.decompress(bytes(writer.data), version=version) == data
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_async_reader(version, sales_data):
+    data = sales_data
+    compressed = ppmd.compress(data, version=version)
+
+    async def read():
+        reader = ppmd.AsyncPpmdReader(_reader(compressed + b'trailer'), version=version, chunk_size=4096)
+        head = await reader.read(100)
+        assert len(head) == 100
+        chunks = [head]
+        async for chunk in reader:
+            assert len(chunk) <= 4096
+            chunks.append(chunk)
+        assert reader.eof
+        assert reader.unused_data == b'trailer'
+        assert await reader.read() == b''
+        return b''.join(chunks)
+
+    assert _run(read()) == data
+
+
+def test_async_reader_truncated():
+    compressed = ppmd.compress(b'abcdefg' * 1000)
+
+    async def read():
+        reader = ppmd.AsyncPpmdReader(_reader(compressed[:-5]))
+        return await reader.read()
+
+    with pytest.raises(ValueError):
+        _run(read())
@@ -0,0 +1,55 @@
+import os
+
+import pytest  # type: ignore
+
+import ppmd
+
+
+@pytest.mark.parametrize("version", [7, 8])
+@pytest.mark.parametrize("workers", [None, 3])
+def test_batch_roundtrip(version, workers, sales_records):
+    records = sales_records[:500] + [b'', b'a', bytearray(b'xyz' * 1000), os.urandom(3000)]
+    data, offsets = ppmd.compress_batch(records, order=6, mem=1 << 20, version=version, workers=workers)
+    assert len(offsets) == len(records) + 1
+    assert offsets[0] == 0 and offsets[-1] == len(data)
+    for i in (0, 1, 499, 500, 502, 503):
+        # each item is as same as one-shot compression
+        assert data[offsets[i]:offsets[i + 1]] == ppmd.compress(records[i], order=6, mem=1 << 20, version=version)
+    result, result_offsets = ppmd.decompress_batch(data, offsets, order=6, mem=1 << 20, version=version,
+                                                   workers=workers)
+    assert [result[a:b] for a, b in zip(result_offsets, result_offsets[1:])] == records
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_batch_model(version, sales_records):
+    records = sales_records
+    model = ppmd.train_model(b''.join(records[:1000]), order=6, mem=1 << 20, version=version)
+    data, offsets = ppmd.compress_batch(records[1000:1100], mem=1 << 20, version=version, model=model)
+    plain, _ = ppmd.compress_batch(records[1000:1100], mem=1 << 20, version=version)
+    assert len(data) < len(plain)
+    result, result_offsets = ppmd.decompress_batch(data, offsets, mem=1 << 20, version=version, model=model)
+    assert result == b''.join(records[1000:1100])
+    assert len(result_offsets) == 101
+
+
+def test_batch_expansive():
+    # output of items is much larger than input, and output buffer grows
+    records = [b'\x00' * 1000000, b'abc', b'\x00' * 2000000]
+    data, offsets = ppmd.compress_batch(records)
+    result, result_offsets = ppmd.decompress_batch(data, offsets)
+    assert result == b''.join(records)
+    assert result_offsets == [0, 1000000, 1000003, 3000003]
+
+
+def test_batch_empty():
+    assert ppmd.compress_batch([]) == (b'', [0])
+    assert ppmd.decompress_batch(b'', [0]) == (b'', [0])
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_batch_corrupted(version):
+    data, offsets = ppmd.compress_batch([b'abcdefg' * 100, b'hijklmn' * 100], version=version)
+    with pytest.raises(ValueError):
+        ppmd.decompress_batch(data, [offsets[0], offsets[1], (offsets[1] + offsets[2]) // 2], version=version)
+    with pytest.raises(ValueError):
+        ppmd.decompress_batch(data, [0, len(data) + 1], version=version)
@@ -0,0 +1,177 @@
+#
+# Benchmarks of encoders and decoders, which run only with '-m benchmark' and pytest-benchmark.
+# Store results with '--benchmark-autosave', and compare a run with stored results by
+# '--benchmark-compare --benchmark-compare-fail=mean:10%' to catch regressions.
+#
+import functools
+import io
+import os
+import pathlib
+import random
+import subprocess
+import sys
+
+import pytest  # type: ignore
+
+import ppmd
+
+pytest.importorskip('pytest_benchmark')
+
+pytestmark = pytest.mark.benchmark
+
+testdata_path = pathlib.Path(os.path.dirname(__file__)).joinpath('data')
+
+_RSS_SCRIPT = '''
+import resource
+import sys
+
+import ppmd
+
+data = open(sys.argv[1], 'rb').read()
+order, mem, version = int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+if mem > 0:
+    ppmd.decompress(ppmd.compress(data, order, mem, version), order, mem, version)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+
+@functools.lru_cache(maxsize=None)
+def _corpus(name):
+    if name == 'csv':
+        with testdata_path.joinpath('10000SalesRecords.csv').open('rb') as f:
+            return f.read()
+    rnd = random.Random(0)
+    if name == 'text':
+        words = [''.join(rnd.choice('etaoinshrdlucmfw') for _ in range(rnd.randint(1, 10))) for _ in range(2000)]
+        return ' '.join(rnd.choice(words) for _ in range(200000)).encode()
+    if name == 'random':
+        return rnd.getrandbits(8 << 20).to_bytes(1 << 20, 'little')
+    raise ValueError(name)
+
+
+def _encode(version, data, order, mem, restore=0):
+    with io.BytesIO() as dst:
+        if version == 7:
+            encoder = ppmd.Ppmd7Encoder(dst, order, mem, endmark=True)
+        else:
+            encoder = ppmd.Ppmd8Encoder(dst, order, mem, restore)
+        with encoder:
+            encoder.encode(data)
+            encoder.flush()
+        return dst.getvalue()
+
+
+def _decode(version, data, order, mem, restore=0, huge_pages=False):
+    if version == 7:
+        decoder = ppmd.Ppmd7Decoder(io.BytesIO(data), order, mem, endmark=True, huge_pages=huge_pages)
+    else:
+        decoder = ppmd.Ppmd8Decoder(io.BytesIO(data), order, mem, restore, huge_pages=huge_pages)
+    with decoder:
+        return decoder.decode()
+
+
+def _record(benchmark, size, compressed=None):
+    benchmark.extra_info['bytes'] = size
+    if compressed is not None:
+        benchmark.extra_info['ratio'] = round(len(compressed) / size, 4) if size else 0
+    if benchmark.stats is not None:
+        benchmark.extra_info['MB/s'] = round(size / benchmark.stats.stats.mean / 1e6, 2)
+
+
+@pytest.mark.parametrize("version", [7, 8])
+@pytest.mark.parametrize("corpus", ['csv', 'text', 'random'])
+def test_compress_throughput(benchmark, corpus, version):
+    data = _corpus(corpus)
+    benchmark.group = 'compress-' + corpus
+    compressed = benchmark(_encode, version, data, 6, 16 << 20)
+    _record(benchmark, len(data), compressed)
+
+
+@pytest.mark.parametrize("version", [7, 8])
+@pytest.mark.parametrize("corpus", ['csv', 'text', 'random'])
+def test_decompress_throughput(benchmark, corpus, version):
+    data = _corpus(corpus)
+    compressed = _encode(version, data, 6, 16 << 20)
+    benchmark.group = 'decompress-' + corpus
+    assert benchmark(_decode, version, compressed, 6, 16 << 20) == data
+    _record(benchmark, len(data))
+
+
+@pytest.mark.parametrize("version, order", [(7, order) for order in (2, 3, 4, 6, 8, 16, 32, 64)]
+                         + [(8, order) for order in (2, 3, 4, 6, 8, 16)])
+def test_order_sweep(benchmark, version, order):
+    data = _corpus('csv')
+    benchmark.group = 'order-sweep-{}'.format(version)
+    compressed = benchmark.pedantic(_encode, (version, data, order, 16 << 20), rounds=3)
+    _record(benchmark, len(data), compressed)
+
+
+@pytest.mark.parametrize("version", [7, 8])
+@pytest.mark.parametrize("mem", [1 << 20, 16 << 20, 256 << 20, 1 << 30])
+def test_mem_sweep(benchmark, mem, version):
+    data = _corpus('csv')
+    benchmark.group = 'mem-sweep-{}'.format(version)
+    compressed = benchmark.pedantic(_encode, (version, data, 6, mem), rounds=3)
+    _record(benchmark, len(data), compressed)
+
+
+@pytest.mark.parametrize("restore", [0, 1])
+@pytest.mark.parametrize("mem", [1 << 20, 4 << 20])
+def test_restore_sweep(benchmark, mem, restore):
+    # small model memory makes PPMd var.I restart or cut off a model
+    data = _corpus('text')
+    benchmark.group = 'restore-sweep'
+    compressed = benchmark.pedantic(_encode, (8, data, 8, mem, restore), rounds=3)
+    _record(benchmark, len(data), compressed)
+
+
+@pytest.mark.parametrize("version", [7, 8])
+@pytest.mark.parametrize("size", [64, 1024, 4096])
+def test_latency_compress(benchmark, size, version):
+    payload = _corpus('csv')[:size]
+    benchmark.group = 'latency-compress-{}'.format(size)
+    compressed = benchmark(ppmd.compress, payload, 6, 1 << 20, version)
+    _record(benchmark, size, compressed)
+
+
+@pytest.mark.parametrize("version", [7, 8])
+@pytest.mark.parametrize("size", [64, 1024, 4096])
+def test_latency_decompress(benchmark, size, version):
+    payload = _corpus('csv')[:size]
+    compressed = ppmd.compress(payload, 6, 1 << 20, version)
+    benchmark.group = 'latency-decompress-{}'.format(size)
+    assert benchmark(ppmd.decompress, compressed, 6, 1 << 20, version) == payload
+    _record(benchmark, size)
+
+
+@pytest.mark.parametrize("huge_pages", [False, True])
+@pytest.mark.parametrize("version", [7, 8])
+def test_huge_pages_decompress(benchmark, version, huge_pages):
+    # high order model grows large, and it makes TLB misses significant
+    data = _corpus('text')
+    compressed = _encode(version, data, 16, 256 << 20)
+    benchmark.group = 'huge-pages-{}'.format(version)
+    assert benchmark.pedantic(_decode, (version, compressed, 16, 256 << 20, 0, huge_pages), rounds=3) == data
+    _record(benchmark, len(data))
+
+
+def _peak_rss(mem, version):
+    """Run compression and decompression in a new process, and return its peak RSS in KiB."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    path = str(testdata_path.joinpath('10000SalesRecords.csv'))
+    output = subprocess.check_output([sys.executable, '-c', _RSS_SCRIPT, path, '6', str(mem), str(version)], env=env)
+    rss = int(output)
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+@pytest.mark.skipif(sys.platform.startswith('win'), reason="resource module is not available")
+@pytest.mark.parametrize("version", [7, 8])
+@pytest.mark.parametrize("mem", [16 << 20, 256 << 20])
+def test_peak_rss(benchmark, mem, version):
+    benchmark.group = 'peak-rss'
+    baseline = _peak_rss(0, version)
+    peak = benchmark.pedantic(_peak_rss, (mem, version), rounds=1)
+    benchmark.extra_info['baseline_rss_kb'] = baseline
+    benchmark.extra_info['peak_rss_kb'] = peak
+    # model memory is committed only when it is used, so peak RSS doesn't grow with mem
+    assert peak - baseline < 64 << 10
@@ -0,0 +1,104 @@
+import io
+
+import pytest  # type: ignore
+
+import ppmd
+
+
+def _encoder(version, dst, mem, restore, checkpoint=None):
+    if version == 7:
+        return ppmd.Ppmd7Encoder(dst, 6, mem, endmark=True, checkpoint=checkpoint)
+    return ppmd.Ppmd8Encoder(dst, 6, mem, restore, checkpoint=checkpoint)
+
+
+def _decoder(version, src, mem, restore, checkpoint=None):
+    if version == 7:
+        return ppmd.Ppmd7Decoder(src, 6, mem, endmark=True, checkpoint=checkpoint)
+    return ppmd.Ppmd8Decoder(src, 6, mem, restore, checkpoint=checkpoint)
+
+
+# small memory makes models restart or cut off before and after a checkpoint
+@pytest.mark.parametrize("version, mem, restore", [(7, 16 << 20, 0), (7, 1 << 16, 0), (8, 16 << 20, 0),
+                                                   (8, 1 << 16, 0), (8, 1 << 16, 1)])
+def test_checkpoint_encoder(version, mem, restore, sales_data):
+    data = sales_data
+    compressed = ppmd.compress(data, order=6, mem=mem, version=version, restore=restore)
+    half = len(data) // 2
+    dst = io.BytesIO()
+    encoder = _encoder(version, dst, mem, restore)
+    encoder.encode(data[:half])
+    checkpoint = encoder.checkpoint()
+    encoder.close()
+    # destination holds all output before a checkpoint
+    written = dst.getvalue()
+    assert compressed.startswith(written)
+    with io.BytesIO(written) as dst:
+        dst.seek(0, io.SEEK_END)
+        with _encoder(version, dst, mem, restore, checkpoint) as encoder:
+            encoder.encode(data[half:])
+            encoder.flush()
+        assert dst.getvalue() == compressed
+
+
+@pytest.mark.parametrize("version, mem, restore", [(7, 16 << 20, 0), (7, 1 << 16, 0), (8, 16 << 20, 0),
+                                                   (8, 1 << 16, 1)])
+def test_checkpoint_decoder(version, mem, restore, sales_data):
+    data = sales_data
+    compressed = ppmd.compress(data, order=6, mem=mem, version=version, restore=restore)
+    src = io.BytesIO(compressed)
+    with _decoder(version, src, mem, restore) as decoder:
+        head = decoder.decode(len(data) // 3)
+        checkpoint = decoder.checkpoint()
+        position = src.tell()
+        assert decoder.decode() == data[len(head):]
+    # source continues from its position at a checkpoint, and read-ahead data is in the checkpoint
+    src = io.BytesIO(compressed)
+    src.seek(position)
+    with _decoder(version, src, mem, restore, checkpoint) as decoder:
+        assert not decoder.eof
+        assert decoder.decode() == data[len(head):]
+        assert decoder.eof
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_checkpoint_file(tmp_path, version, sales_data):
+    data = sales_data[:100000]
+    path = tmp_path.joinpath('encoder.ckpt')
+    dst = io.BytesIO()
+    with _encoder(version, dst, 1 << 20, 0) as encoder:
+        encoder.encode(data[:50000])
+        assert encoder.checkpoint(path) is None
+        prefix = dst.getvalue()
+        with io.BytesIO() as f:
+            encoder.checkpoint(f)
+            assert f.getvalue() == path.read_bytes() == encoder.checkpoint()
+        encoder.encode(data[50000:])
+        encoder.flush()
+    expected = dst.getvalue()
+    for checkpoint in (path, str(path), io.BytesIO(path.read_bytes())):
+        with io.BytesIO(prefix) as dst:
+            dst.seek(0, io.SEEK_END)
+            with _encoder(version, dst, 1 << 20, 0, checkpoint) as encoder:
+                encoder.encode(data[50000:])
+                encoder.flush()
+            assert dst.getvalue() == expected
+
+
+def test_checkpoint_wrong():
+    dst = io.BytesIO()
+    encoder = ppmd.Ppmd8Encoder(dst, 6, 1 << 20, 0)
+    encoder.encode(b'abcdefg' * 100)
+    checkpoint = encoder.checkpoint()
+    encoder.close()
+    with pytest.raises(ValueError, match='parameters'):
+        ppmd.Ppmd8Encoder(io.BytesIO(), 6, 2 << 20, 0, checkpoint=checkpoint)
+    with pytest.raises(ValueError, match='parameters'):
+        ppmd.Ppmd8Decoder(io.BytesIO(), 6, 1 << 20, 0, checkpoint=checkpoint)
+    with pytest.raises(ValueError, match='parameters'):
+        ppmd.Ppmd7Encoder(io.BytesIO(), 6, 1 << 20, checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        ppmd.Ppmd8Encoder(io.BytesIO(), 6, 1 << 20, 0, checkpoint=checkpoint[:-1])
+    with pytest.raises(ValueError):
+        ppmd.Ppmd8Encoder(io.BytesIO(), 6, 1 << 20, 0, checkpoint=b'\x00' * 100)
+    with pytest.raises(ValueError):
+        encoder.checkpoint()
@@ -1,10 +1,14 @@
+import io
 import os
+import pathlib
 import platform
 import shutil
+import sys
+from datetime import datetime
 
 import pytest  # type: ignore
 
-from ppmd import main
+from ppmd import Ppmd7Encoder, PpmdHeader, main
 
 testdata_path = os.path.join(os.path.dirname(__file__), 'data')
 source = b'This file is located in a folder.This file is located in the root.\n'
@@ -13,18 +17,37 @@ source = b'This file is located in a folder.This file is located in the root.\n'
 @pytest.mark.skipif(platform.machine() in ("aarch64", "armv7", "ppc64le", "s390x"),
                     reason="argparse help may have a bug around print function in some arches.")
 def test_cli_help(capsys):
-    expected = '''usage: ppmd [-h] [-x] [-c] [-7] target
+    expected = '''usage: ppmd [-h] [-x] [-c] [-7] [-T N] [-o ORDER] [-m MB] [-r {0,1}] [-a]
+            [-l BYTES]
+            target [target ...]
 
 ppmd
 
 positional arguments:
-  target
+  target                Files or directories to process recursively, or - for
+                        stdin to stdout
 
 optional arguments:
-  -h, --help   show this help message and exit
-  -x           Specify decompression
-  -c           Output to stdout
-  -7, --seven  Compress with PPMd ver.H instead of Ver.I
+  -h, --help            show this help message and exit
+  -x                    Specify decompression
+  -c                    Output to stdout
+  -7, --seven           Compress with PPMd ver.H instead of Ver.I
+  -T N                  Compress into block-parallel frames, or extract them
+                        with N threads. Several files are processed on N
+                        processes with one thread each
+  -o ORDER, --order ORDER
+                        Model order from 2 to 16 (default: 6)
+  -m MB, --mem MB       Model memory size in megabytes from 1 to 256 (default:
+                        8, or 16 with -7 or -T)
+  -r {0,1}, --restore {0,1}
+                        Restart (0) or cut off (1) a model when memory is
+                        exhausted (default: 0)
+  -a, --auto            Choose order, memory and restore method from a sample
+                        of input within memory size given by -m (default: 256)
+  -l BYTES, --length BYTES
+                        Length of original data, which is needed to extract
+                        PPMd ver.H data without end mark written by old
+                        versions
 '''
     with pytest.raises(SystemExit):
         main(["-h"])
@@ -64,3 +87,144 @@ def test_cli_compress7(tmp_path):
     shutil.copy(arcfile, tmp_path.joinpath('10000SalesRecords.csv'))
     target = str(tmp_path.joinpath('10000SalesRecords.csv'))
     main(["-7", target])
+
+
+def test_cli_compress7_extract(tmp_path):
+    arcfile = os.path.join(testdata_path, "10000SalesRecords.csv")
+    shutil.copy(arcfile, tmp_path.joinpath('10000SalesRecords.csv'))
+    target = tmp_path.joinpath('10000SalesRecords.csv')
+    main(["-7", str(target)])
+    target.unlink()
+    main(["-x", str(target) + '.ppmd'])
+    with open(arcfile, 'rb') as expected:
+        assert target.open('rb').read() == expected.read()
+
+
+@pytest.mark.parametrize("data", [b'a' * 10000, None])
+def test_cli_extract7_without_endmark(tmp_path, data):
+    # archive written by old versions, which has no end mark and ends with a run of most probable symbols
+    if data is None:
+        with open(os.path.join(testdata_path, "10000SalesRecords.csv"), 'rb') as f:
+            data = f.read(50000)
+    target = tmp_path.joinpath('data.ppmd')
+    with target.open('wb') as f:
+        PpmdHeader(fname='data', ftime=datetime(2021, 1, 1), version=7, order=6, mem_in_mb=16).write(f)
+        with Ppmd7Encoder(f, 6, 16 << 20) as encoder:
+            encoder.encode(data)
+            encoder.flush()
+    # its end is ambiguous without a length of original data
+    with pytest.raises(ValueError, match='end mark'):
+        main(["-x", str(target)])
+    main(["-x", "-l", str(len(data)), str(target)])
+    assert tmp_path.joinpath('data').open('rb').read() == data
+
+
+def test_cli_threads_roundtrip(tmp_path):
+    arcfile = os.path.join(testdata_path, "10000SalesRecords.csv")
+    shutil.copy(arcfile, tmp_path.joinpath('10000SalesRecords.csv'))
+    target = tmp_path.joinpath('10000SalesRecords.csv')
+    main(["-T", "2", str(target)])
+    target.unlink()
+    main(["-x", "-T", "2", str(target) + '.ppmd'])
+    with open(arcfile, 'rb') as expected:
+        assert target.open('rb').read() == expected.read()
+
+
+def _read_header(path):
+    header = PpmdHeader()
+    with path.open('rb') as f:
+        header.read(f)
+    return header.version, (header.info & 0x0f) + 1, ((header.info >> 4) & 0xff) + 1, header.restore
+
+
+@pytest.mark.parametrize("args, expected", [([], (8, 6, 8, 0)),
+                                            (["-o", "8", "-m", "2", "-r", "1"], (8, 8, 2, 1)),
+                                            (["-7", "-o", "4", "-m", "1"], (7, 4, 1, 0))])
+def test_cli_parameters(tmp_path, args, expected):
+    arcfile = os.path.join(testdata_path, "10000SalesRecords.csv")
+    shutil.copy(arcfile, tmp_path.joinpath('10000SalesRecords.csv'))
+    target = tmp_path.joinpath('10000SalesRecords.csv')
+    main(args + [str(target)])
+    assert _read_header(tmp_path.joinpath('10000SalesRecords.csv.ppmd')) == expected
+    target.unlink()
+    main(["-x", str(target) + '.ppmd'])
+    with open(arcfile, 'rb') as f:
+        assert target.open('rb').read() == f.read()
+
+
+def test_cli_auto(tmp_path):
+    arcfile = os.path.join(testdata_path, "10000SalesRecords.csv")
+    shutil.copy(arcfile, tmp_path.joinpath('10000SalesRecords.csv'))
+    target = tmp_path.joinpath('10000SalesRecords.csv')
+    main(["-a", "-m", "4", str(target)])
+    version, order, mem, restore = _read_header(tmp_path.joinpath('10000SalesRecords.csv.ppmd'))
+    assert version == 8 and 2 <= order <= 16 and 1 <= mem <= 4 and restore in (0, 1)
+    target.unlink()
+    main(["-x", str(target) + '.ppmd'])
+    with open(arcfile, 'rb') as f:
+        assert target.open('rb').read() == f.read()
+
+
+@pytest.mark.parametrize("args", [["-o", "17"], ["-m", "0"], ["-m", "257"], ["-7", "-r", "1"], ["-x", "-o", "6"],
+                                  ["-", "a"], ["-x", "-c", "a.ppmd", "b.ppmd"], ["-x", "a"]])
+def test_cli_wrong_parameters(tmp_path, args):
+    target = tmp_path.joinpath('data.ppmd')
+    target.write_bytes(b'')
+    with pytest.raises(SystemExit):
+        main(args + [str(target)])
+
+
+@pytest.mark.parametrize("threads", [None, 2])
+def test_cli_many_files(tmp_path, threads):
+    with open(os.path.join(testdata_path, "10000SalesRecords.csv"), 'rb') as f:
+        data = f.read()
+    tmp_path.joinpath('sub', 'deep').mkdir(parents=True)
+    contents = {tmp_path.joinpath('a.csv'): data, tmp_path.joinpath('sub', 'b.txt'): source,
+                tmp_path.joinpath('sub', 'deep', 'c.bin'): data[:1000]}
+    for path, content in contents.items():
+        path.write_bytes(content)
+    options = [] if threads is None else ["-T", str(threads)]
+    main(options + [str(tmp_path.joinpath('a.csv')), str(tmp_path.joinpath('sub'))])
+    for path in contents:
+        # -T writes block-parallel frames regardless of a number of files
+        magic = pathlib.Path(str(path) + '.ppmd').read_bytes()[:4]
+        assert magic == (b'\x8f\xaf\xac\x84' if threads is None else b'\x8f\xaf\xac\x85')
+        path.unlink()
+    # directories are searched for .ppmd files recursively
+    main(["-x"] + options + [str(tmp_path)])
+    for path, content in contents.items():
+        assert path.read_bytes() == content
+
+
+def test_cli_relative_path(monkeypatch, tmp_path):
+    tmp_path.joinpath('d').mkdir()
+    target = tmp_path.joinpath('d', 'a.csv')
+    target.write_bytes(source)
+    monkeypatch.chdir(tmp_path)
+    main([str(pathlib.Path('d', 'a.csv'))])
+    target.unlink()
+    main(["-x", str(pathlib.Path('d', 'a.csv.ppmd'))])
+    assert target.read_bytes() == source
+    # a header records only a file name, and directories in names of old archives are ignored
+    with target.with_name('a.csv.ppmd').open('rb') as f:
+        header = PpmdHeader()
+        header.read(f)
+    assert header.filename == 'a.csv'
+    with tmp_path.joinpath('b.ppmd').open('wb') as f:
+        PpmdHeader(fname='../x/b.csv', ftime=datetime(2021, 1, 1)).write(f)
+        f.write(target.with_name('a.csv.ppmd').read_bytes()[len(header) + len('a.csv'):])
+    main(["-x", "b.ppmd"])
+    assert tmp_path.joinpath('b.csv').read_bytes() == source
+
+
+@pytest.mark.parametrize("args", [[], ["-7"], ["-T", "2"], ["-a", "-m", "2"]])
+def test_cli_stdin_stdout(monkeypatch, capsysbinary, args):
+    with open(os.path.join(testdata_path, "10000SalesRecords.csv"), 'rb') as f:
+        data = f.read()
+    monkeypatch.setattr(sys, 'stdin', io.TextIOWrapper(io.BytesIO(data)))
+    main(args + ["-"])
+    compressed = capsysbinary.readouterr().out
+    assert 0 < len(compressed) < len(data)
+    monkeypatch.setattr(sys, 'stdin', io.TextIOWrapper(io.BytesIO(compressed)))
+    main(["-x", "-"])
+    assert capsysbinary.readouterr().out == data
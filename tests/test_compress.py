@@ -0,0 +1,124 @@
+import os
+
+import pytest  # type: ignore
+
+import ppmd
+
+source = b'This file is located in a folder.This file is located in the root.\n'
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_compress_decompress(version, sales_data):
+    data = sales_data
+    compressed = ppmd.compress(data, version=version)
+    assert len(compressed) < len(data)
+    assert ppmd.decompress(compressed, version=version) == data
+
+
+def test_compress_ppmd8_compatible():
+    # one-shot compression produces as same data as Ppmd8Encoder
+    encoded = b'\x54\x16\x43\x6d\x5c\xd8\xd7\x3a\xb3\x58\x31\xac\x1d\x09\x23\xfd\x11\xd5\x72\x62\x73' \
+              b'\x13\xb6\xce\xb2\xe7\x6a\xb9\xf6\xe8\x66\xf5\x08\xc3\x0a\x09\x36\x12\xeb\xda\xda\xba'
+    assert ppmd.compress(source, order=6, mem=8 << 20, version=8) == encoded
+
+
+@pytest.mark.parametrize("version", [7, 8])
+@pytest.mark.parametrize("data", [b'', b'a', bytearray(source), memoryview(source * 10)])
+def test_compress_small(version, data):
+    compressed = ppmd.compress(data, order=4, mem=1 << 20, version=version)
+    assert ppmd.decompress(compressed, order=4, mem=1 << 20, version=version) == data
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_compress_incompressible(version):
+    data = os.urandom(100000)
+    compressed = ppmd.compress(data, version=version)
+    assert ppmd.decompress(compressed, version=version) == data
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_decompress_truncated(version):
+    compressed = ppmd.compress(source * 10, version=version)
+    with pytest.raises(ValueError):
+        ppmd.decompress(compressed[:len(compressed) // 2], version=version)
+
+
+@pytest.mark.parametrize("version, order", [(7, 1), (7, 65), (8, 17), (9, 6)])
+def test_compress_wrong_parameters(version, order):
+    with pytest.raises(ValueError):
+        ppmd.compress(source, order=order, version=version)
+
+
+@pytest.mark.parametrize("version", [7, 8])
+@pytest.mark.parametrize("chunk", [1, 7, 4096])
+def test_compressobj_decompressobj(version, chunk):
+    data = source * 100
+    comp = ppmd.compressobj(order=6, mem=1 << 20, version=version)
+    compressed = b''
+    for i in range(0, len(data), 1000):
+        compressed += comp.compress(data[i:i + 1000])
+    compressed += comp.flush()
+    assert ppmd.decompress(compressed, order=6, mem=1 << 20, version=version) == data
+    decomp = ppmd.decompressobj(order=6, mem=1 << 20, version=version)
+    result = b''
+    for i in range(0, len(compressed), chunk):
+        result += decomp.decompress(compressed[i:i + chunk])
+    result += decomp.flush()
+    assert decomp.eof
+    assert result == data
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_decompressobj_max_length(version, sales_data):
+    data = sales_data[:100000]
+    compressed = ppmd.compress(data, version=version)
+    decomp = ppmd.decompressobj(version=version)
+    result = decomp.decompress(compressed + b'trailing', max_length=100)
+    assert len(result) == 100
+    assert not decomp.needs_input
+    while not decomp.needs_input:
+        result += decomp.decompress(b'', max_length=10000)
+    result += decomp.flush()
+    assert decomp.eof
+    assert result == data
+    assert decomp.unused_data == b'trailing'
+    with pytest.raises(EOFError):
+        decomp.decompress(b'')
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_decompressobj_truncated(version):
+    compressed = ppmd.compress(source * 10, version=version)
+    decomp = ppmd.decompressobj(version=version)
+    decomp.decompress(compressed[:len(compressed) // 2])
+    assert decomp.needs_input
+    with pytest.raises(ValueError):
+        decomp.flush()
+
+
+def test_compressobj_flushed():
+    comp = ppmd.compressobj()
+    comp.flush()
+    with pytest.raises(ValueError):
+        comp.compress(source)
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_tune_parameters(version, sales_data):
+    data = sales_data
+    sample = data[:ppmd.TUNE_SAMPLESIZE // 4]
+    order, mem, restore = ppmd.tune_parameters(sample, len(data), version=version, mem=64 << 20)
+    assert 2 <= order <= 16 and restore == 0
+    assert 1 << 20 <= mem <= 64 << 20 and mem & (mem - 1) == 0
+    # a small budget which whole data exceeds makes PPMd var.I cut off a model
+    order, mem, restore = ppmd.tune_parameters(sample, len(data) * 100, version=version, mem=1 << 20, order=6)
+    assert (order, mem, restore) == (6, 1 << 20, 1 if version == 8 else 0)
+    assert ppmd.decompress(ppmd.compress(data, order, mem, version, restore), order, mem, version, restore) == data
+
+
+def test_tune_parameters_wrong():
+    assert ppmd.tune_parameters(b'') == (6, 1 << 20, 0)
+    with pytest.raises(ValueError):
+        ppmd.tune_parameters(source, mem=1 << 19)
+    with pytest.raises(ValueError):
+        ppmd.tune_parameters(source, version=9)
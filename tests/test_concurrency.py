@@ -0,0 +1,67 @@
+import concurrent.futures
+import io
+import os
+import time
+
+import pytest  # type: ignore
+
+import ppmd
+
+NUM_STREAMS = 4
+
+
+def _cpu_count():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _roundtrip7(data):
+    with io.BytesIO() as dst:
+        with ppmd.Ppmd7Encoder(dst, 6, 16 << 20) as encoder:
+            encoder.encode(data)
+            encoder.flush()
+        compressed = dst.getvalue()
+    with io.BytesIO(compressed) as src:
+        with ppmd.Ppmd7Decoder(src, 6, 16 << 20) as decoder:
+            return decoder.decode(len(data))
+
+
+def _roundtrip8(data):
+    with io.BytesIO() as dst:
+        with ppmd.Ppmd8Encoder(dst, 6, 16 << 20, 0) as encoder:
+            encoder.encode(data)
+            encoder.flush()
+        compressed = dst.getvalue()
+    with io.BytesIO(compressed) as src:
+        with ppmd.Ppmd8Decoder(src, 6, 16 << 20, 0) as decoder:
+            return decoder.decode(len(data))
+
+
+@pytest.mark.parametrize("roundtrip", [_roundtrip7, _roundtrip8])
+def test_threaded_roundtrip(roundtrip, sales_data):
+    data = sales_data
+    streams = [data[i::NUM_STREAMS] for i in range(NUM_STREAMS)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=NUM_STREAMS) as executor:
+        results = list(executor.map(roundtrip, streams))
+    assert results == streams
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(_cpu_count() < 2, reason="Need several cores to measure parallel scaling.")
+@pytest.mark.parametrize("roundtrip", [_roundtrip7, _roundtrip8])
+def test_threaded_scaling(roundtrip, sales_data):
+    data = sales_data
+    workers = min(_cpu_count(), NUM_STREAMS)
+    roundtrip(data)  # warm up
+    start = time.perf_counter()
+    for _ in range(workers):
+        roundtrip(data)
+    serial = time.perf_counter() - start
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        start = time.perf_counter()
+        list(executor.map(roundtrip, [data] * workers))
+        parallel = time.perf_counter() - start
+    # GIL is released while native code runs, so independent streams should scale
+    # almost linearly; run on a quiet machine with '-m benchmark'.
+    assert serial / parallel > workers * 0.5
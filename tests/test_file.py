@@ -0,0 +1,106 @@
+import csv
+import io
+import os
+import pathlib
+from datetime import datetime
+
+import pytest  # type: ignore
+
+import ppmd
+
+testdata_path = pathlib.Path(os.path.dirname(__file__)).joinpath('data')
+source = b'This file is located in a folder.This file is located in the root.\n'
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_ppmdfile_roundtrip(tmp_path, version, sales_data):
+    data = sales_data
+    target = tmp_path.joinpath('10000SalesRecords.csv.ppmd')
+    with ppmd.open(target, 'wb', version=version) as f:
+        for i in range(0, len(data), 10000):
+            assert f.write(data[i:i + 10000]) == len(data[i:i + 10000])
+    with ppmd.open(target, 'rb') as f:
+        assert f.filename == '10000SalesRecords.csv'
+        assert f.read() == data
+
+
+def test_ppmdfile_read_archive():
+    with ppmd.open(testdata_path.joinpath('data.ppmd')) as f:
+        assert f.readline() == source
+        assert f.read() == b''
+
+
+def test_ppmdfile_readinto_small_bufsize(tmp_path):
+    target = tmp_path.joinpath('data.ppmd')
+    with ppmd.open(target, 'w') as f:
+        f.write(source * 100)
+    result = bytearray()
+    buf = bytearray(100)
+    with ppmd.open(target, 'r', bufsize=7) as f:
+        size = f.readinto(buf)
+        while size > 0:
+            result += buf[:size]
+            size = f.readinto(buf)
+    assert result == source * 100
+
+
+def test_ppmdfile_fileobj_iteration():
+    with io.BytesIO() as dst:
+        with ppmd.open(dst, 'wb', order=4, mem=1, fname='lines') as f:
+            f.writelines([source] * 10)
+        compressed = dst.getvalue()
+    with ppmd.open(io.BytesIO(compressed)) as f:
+        assert f.filename == 'lines'
+        assert list(f) == [source] * 10
+
+
+def test_ppmdfile_text_csv(tmp_path):
+    target = tmp_path.joinpath('sales.csv.ppmd')
+    with ppmd.open(target, 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Region', 'Country'])
+        writer.writerow(['Asia', 'Japan'])
+    with ppmd.open(target, 'rt', encoding='utf-8', newline='') as f:
+        assert list(csv.reader(f)) == [['Region', 'Country'], ['Asia', 'Japan']]
+
+
+def test_ppmdfile_mode(tmp_path):
+    with pytest.raises(ValueError):
+        ppmd.open(tmp_path.joinpath('data.ppmd'), 'a')
+    with pytest.raises(ValueError):
+        ppmd.open(tmp_path.joinpath('data.ppmd'), 'wb', encoding='utf-8')
+    with ppmd.open(tmp_path.joinpath('data.ppmd'), 'wb') as f:
+        with pytest.raises(io.UnsupportedOperation):
+            f.read()
+    f.close()
+    with pytest.raises(ValueError):
+        f.write(source)
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_compressor_mapped(tmp_path, version, sales_data):
+    data = sales_data
+    src = tmp_path.joinpath('src.csv')
+    src.write_bytes(b'skipped' + data)
+    target = tmp_path.joinpath('src.csv.ppmd')
+    with target.open('wb') as ofile:
+        with src.open('rb') as f:
+            f.seek(7)  # mapped input starts at a current position
+            with ppmd.PpmdCompressor(ofile, 'src.csv', datetime.utcnow(), 6, 8, version=version) as compressor:
+                compressor.compress(f)
+            assert f.tell() == len(data) + 7
+        ofile.write(b'trailer')
+    with target.open('rb') as f:
+        with ppmd.PpmdDecompressor(f) as decompressor:
+            assert isinstance(decompressor.decoder.source, ppmd._MappedSource)
+            result = io.BytesIO()
+            decompressor.decompress(result)
+        # file position is after the end mark
+        assert f.read() == b'trailer'
+    assert result.getvalue() == data
+    with io.BytesIO(target.read_bytes()) as f:
+        with ppmd.PpmdDecompressor(f) as decompressor:
+            assert decompressor.decoder.source is f
+            result = io.BytesIO()
+            decompressor.decompress(result)
+    assert result.getvalue() == data
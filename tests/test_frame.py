@@ -0,0 +1,131 @@
+import concurrent.futures
+import io
+import os
+
+import pytest  # type: ignore
+
+import ppmd
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_block_roundtrip(version, sales_data):
+    data = sales_data
+    with io.BytesIO() as dst:
+        with ppmd.PpmdBlockCompressor(dst, 6, 1 << 20, version=version, block_size=100000, workers=2) as compressor:
+            compressor.compress(io.BytesIO(data))
+        compressed = dst.getvalue()
+    with io.BytesIO() as dst:
+        with ppmd.PpmdBlockDecompressor(io.BytesIO(compressed), workers=2) as decompressor:
+            assert decompressor.block_size == 100000
+            decompressor.decompress(dst)
+        assert dst.getvalue() == data
+
+
+def test_block_process_pool(sales_data):
+    data = sales_data[:300000]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        with io.BytesIO() as dst:
+            with ppmd.PpmdBlockCompressor(dst, block_size=100000, executor=executor) as compressor:
+                compressor.compress(io.BytesIO(data))
+            compressed = dst.getvalue()
+        with io.BytesIO() as dst:
+            with ppmd.PpmdBlockDecompressor(io.BytesIO(compressed), executor=executor) as decompressor:
+                decompressor.decompress(dst)
+            assert dst.getvalue() == data
+
+
+def test_block_empty():
+    with io.BytesIO() as dst:
+        with ppmd.PpmdBlockCompressor(dst) as compressor:
+            compressor.compress(io.BytesIO(b''))
+        compressed = dst.getvalue()
+    with io.BytesIO() as dst:
+        with ppmd.PpmdBlockDecompressor(io.BytesIO(compressed)) as decompressor:
+            decompressor.decompress(dst)
+        assert dst.getvalue() == b''
+
+
+def test_block_truncated(sales_data):
+    with io.BytesIO() as dst:
+        with ppmd.PpmdBlockCompressor(dst, block_size=100000) as compressor:
+            compressor.compress(io.BytesIO(sales_data[:300000]))
+        compressed = dst.getvalue()
+    with pytest.raises(ValueError):
+        with ppmd.PpmdBlockDecompressor(io.BytesIO(compressed[:len(compressed) // 2])) as decompressor:
+            decompressor.decompress(io.BytesIO())
+    with pytest.raises(ValueError):
+        ppmd.PpmdBlockDecompressor(io.BytesIO(b'\x8f\xaf\xac\x84'))
+
+
+@pytest.mark.parametrize("seek_table", [True, False])
+def test_block_reader_seek(seek_table, sales_data):
+    data = sales_data
+    with io.BytesIO() as dst:
+        with ppmd.PpmdBlockCompressor(dst, block_size=100000, seek_table=seek_table) as compressor:
+            compressor.compress(io.BytesIO(data))
+        compressed = dst.getvalue()
+    # sequential decompressor ignores seek table
+    with io.BytesIO() as dst:
+        with ppmd.PpmdBlockDecompressor(io.BytesIO(compressed)) as decompressor:
+            decompressor.decompress(dst)
+        assert dst.getvalue() == data
+    with ppmd.PpmdBlockReader(io.BytesIO(compressed)) as reader:
+        assert reader.size == len(data)
+        assert reader.seek(-1000, io.SEEK_END) == len(data) - 1000
+        assert reader.read() == data[-1000:]
+        reader.seek(99990)
+        assert reader.read(20) == data[99990:100010]
+        assert reader.tell() == 100010
+        buf = bytearray(300000)
+        reader.seek(50000)
+        assert reader.readinto(buf) == 300000
+        assert buf == data[50000:350000]
+        reader.seek(len(data) + 10)
+        assert reader.read(10) == b''
+
+
+def _frames(compressed):
+    """Return (flags, compressed size, size) of frames."""
+    frames = []
+    with io.BytesIO(compressed) as f:
+        f.seek(ppmd._FRAMED_HEADER.size)
+        while True:
+            flags, compressed_size, size = ppmd._FRAME_HEADER.unpack(f.read(ppmd._FRAME_HEADER.size))
+            if compressed_size == 0 and size == 0:
+                return frames
+            frames.append((flags, compressed_size, size))
+            f.seek(compressed_size, io.SEEK_CUR)
+
+
+@pytest.mark.parametrize("entropy_threshold", [7.95, None])
+def test_block_stored(entropy_threshold, sales_data):
+    text = sales_data[:200000]
+    noise = os.urandom(200000)
+    data = text + noise + text[:100]
+    with io.BytesIO() as dst:
+        with ppmd.PpmdBlockCompressor(dst, block_size=100000, seek_table=True,
+                                      entropy_threshold=entropy_threshold) as compressor:
+            compressor.compress(io.BytesIO(data))
+        compressed = dst.getvalue()
+    # incompressible blocks are stored as is, and don't grow
+    assert [flags for flags, _, _ in _frames(compressed)] == [0, 0, 1, 1, 0]
+    assert [size for _, size, _ in _frames(compressed)][2:4] == [100000, 100000]
+    with io.BytesIO() as dst:
+        with ppmd.PpmdBlockDecompressor(io.BytesIO(compressed)) as decompressor:
+            decompressor.decompress(dst)
+        assert dst.getvalue() == data
+    with ppmd.PpmdBlockReader(io.BytesIO(compressed)) as reader:
+        reader.seek(199990)
+        assert reader.read(100020) == data[199990:300010]
+
+
+def test_block_wrong_flags():
+    with io.BytesIO() as dst:
+        with ppmd.PpmdBlockCompressor(dst) as compressor:
+            compressor.compress(io.BytesIO(os.urandom(1000)))
+        compressed = bytearray(dst.getvalue())
+    assert _frames(bytes(compressed))[0] == (1, 1000, 1000)
+    compressed[ppmd._FRAMED_HEADER.size] = 2
+    with pytest.raises(ValueError):
+        with ppmd.PpmdBlockDecompressor(io.BytesIO(bytes(compressed))) as decompressor:
+            decompressor.decompress(io.BytesIO())
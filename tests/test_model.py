@@ -0,0 +1,112 @@
+import io
+
+import pytest  # type: ignore
+
+import ppmd
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_model_primes_small_payload(version, sales_records):
+    records = sales_records
+    model = ppmd.train_model(b''.join(records[:2000]), order=6, mem=16 << 20, version=version)
+    assert model.size > 0
+    payload = b''.join(records[5000:5020])
+    plain = ppmd.compress(payload, version=version)
+    primed = ppmd.compress(payload, version=version, model=model)
+    assert len(primed) < len(plain) // 2
+    assert ppmd.decompress(primed, version=version, model=model) == payload
+    # model is not changed by its users
+    assert ppmd.compress(payload, version=version, model=model) == primed
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_model_small_memory(version, sales_records):
+    # a sample larger than model memory makes a model restart or cut off before snapshot
+    records = sales_records
+    restore = 1 if version == 8 else 0
+    model = ppmd.train_model(b''.join(records), order=6, mem=1 << 16, version=version, restore=restore)
+    payload = b''.join(records[:2000])
+    compressed = ppmd.compress(payload, mem=1 << 16, version=version, restore=restore, model=model)
+    assert ppmd.decompress(compressed, mem=1 << 16, version=version, restore=restore, model=model) == payload
+
+
+def test_model_ppmd7_stream(sales_records):
+    records = sales_records
+    model = ppmd.train_model(b''.join(records[:1000]), order=6, mem=8 << 20, version=7)
+    payload = b''.join(records[1000:1010])
+    with io.BytesIO() as dst:
+        with ppmd.Ppmd7Encoder(dst, 6, 8 << 20, endmark=True, model=model) as encoder:
+            encoder.encode(payload)
+            encoder.flush()
+        compressed = dst.getvalue()
+    with ppmd.Ppmd7Decoder(io.BytesIO(compressed), 6, 8 << 20, endmark=True, model=model) as decoder:
+        assert decoder.decode() == payload
+
+
+def test_model_ppmd8_stream(sales_records):
+    records = sales_records
+    model = ppmd.train_model(b''.join(records[:1000]), order=6, mem=8 << 20, version=8)
+    payload = b''.join(records[1000:1010])
+    with io.BytesIO() as dst:
+        with ppmd.Ppmd8Encoder(dst, 6, 8 << 20, 0, model=model) as encoder:
+            encoder.encode(payload)
+            encoder.flush()
+        compressed = dst.getvalue()
+    with ppmd.Ppmd8Decoder(io.BytesIO(compressed), 6, 8 << 20, 0, model=model) as decoder:
+        assert decoder.decode() == payload
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_model_incremental(version, sales_records):
+    records = sales_records
+    model = ppmd.train_model(b''.join(records[:1000]), version=version)
+    payload = b''.join(records[1000:1100])
+    compressor = ppmd.compressobj(version=version, model=model)
+    compressed = compressor.compress(payload) + compressor.flush()
+    assert compressed == ppmd.compress(payload, version=version, model=model)
+    decompressor = ppmd.decompressobj(version=version, model=model)
+    assert decompressor.decompress(compressed) + decompressor.flush() == payload
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_model_wrong_parameters(version):
+    model = ppmd.train_model(b'abc' * 100, order=6, mem=1 << 20, version=version)
+    with pytest.raises(ValueError):
+        ppmd.compress(b'abc', order=5, mem=1 << 20, version=version, model=model)
+    with pytest.raises(ValueError):
+        ppmd.decompressobj(order=6, mem=2 << 20, version=version, model=model)
+    with pytest.raises(ValueError):
+        ppmd.compress(b'abc', order=6, mem=1 << 20, version=15 - version, model=model)
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_model_save_load(tmp_path, version, sales_records):
+    records = sales_records
+    model = ppmd.train_model(b''.join(records[:1000]), order=6, mem=8 << 20, version=version)
+    payload = b''.join(records[1000:1020])
+    compressed = ppmd.compress(payload, mem=8 << 20, version=version, model=model)
+    model_path = tmp_path.joinpath('sales.model')
+    model.save(str(model_path))
+    loaded = ppmd.load_model(model_path)
+    assert (loaded.version, loaded.order, loaded.mem, loaded.size) == (version, 6, 8 << 20, model.size)
+    assert ppmd.compress(payload, mem=8 << 20, version=version, model=loaded) == compressed
+    assert ppmd.decompress(compressed, mem=8 << 20, version=version, model=loaded) == payload
+    # file object without fileno
+    with io.BytesIO() as f:
+        model.save(f)
+        f.seek(0)
+        loaded = ppmd.load_model(f)
+    assert ppmd.decompress(compressed, mem=8 << 20, version=version, model=loaded) == payload
+
+
+def test_model_load_corrupted():
+    model = ppmd.train_model(b'abc' * 100, order=6, mem=1 << 20, version=8)
+    with io.BytesIO() as f:
+        model.save(f)
+        data = f.getvalue()
+    with pytest.raises(ValueError):
+        ppmd.load_model(io.BytesIO(b'\x00' * len(data)))
+    with pytest.raises(ValueError):
+        ppmd.load_model(io.BytesIO(data[:-1]))
+    with pytest.raises(ValueError):
+        ppmd.load_model(io.BytesIO(data[:20]))
@@ -0,0 +1,161 @@
+import concurrent.futures
+import io
+import sys
+
+import pytest  # type: ignore
+
+import ppmd
+
+source = b'This file is located in a folder.This file is located in the root.\n'
+
+
+def _encode(version, data, **kwargs):
+    with io.BytesIO() as dst:
+        if version == 7:
+            encoder = ppmd.Ppmd7Encoder(dst, 6, 1 << 20, endmark=True, **kwargs)
+        else:
+            encoder = ppmd.Ppmd8Encoder(dst, 6, 1 << 20, 0, **kwargs)
+        with encoder:
+            encoder.encode(data)
+            encoder.flush()
+        return dst.getvalue()
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_encoder_reset(version):
+    first = io.BytesIO()
+    if version == 7:
+        encoder = ppmd.Ppmd7Encoder(first, 6, 1 << 20, endmark=True)
+    else:
+        encoder = ppmd.Ppmd8Encoder(first, 6, 1 << 20, 0)
+    with encoder:
+        encoder.encode(source * 10)
+        encoder.flush()
+        second = io.BytesIO()
+        encoder.reset(second)
+        encoder.encode(source)
+        encoder.flush()
+    assert first.getvalue() == _encode(version, source * 10)
+    assert second.getvalue() == _encode(version, source)
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_decoder_reset(version):
+    if version == 7:
+        decoder = ppmd.Ppmd7Decoder(io.BytesIO(_encode(version, source * 10)), 6, 1 << 20, endmark=True)
+    else:
+        decoder = ppmd.Ppmd8Decoder(io.BytesIO(_encode(version, source * 10)), 6, 1 << 20, 0)
+    with decoder:
+        assert decoder.decode() == source * 10
+        decoder.reset(io.BytesIO(_encode(version, source)))
+        assert not decoder.eof
+        assert decoder.decode() == source
+        assert decoder.eof
+
+
+def test_reset_closed():
+    encoder = ppmd.Ppmd8Encoder(io.BytesIO(), 6, 1 << 20, 0)
+    encoder.close()
+    with pytest.raises(ValueError):
+        encoder.reset(io.BytesIO())
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_pool_reuse(version):
+    encoders = ppmd.EncoderPool(maxsize=1)
+    decoders = ppmd.DecoderPool(maxsize=1)
+    coders = set()
+    for i in range(3):
+        data = source * i
+        with io.BytesIO() as dst:
+            with encoders.encoder(dst, order=6, mem=1 << 20, version=version) as encoder:
+                coders.add(id(encoder))
+                encoder.encode(data)
+            compressed = dst.getvalue()
+        assert compressed == _encode(version, data)
+        with decoders.decoder(io.BytesIO(compressed), order=6, mem=1 << 20, version=version) as decoder:
+            coders.add(id(decoder))
+            assert decoder.decode() == data
+    assert len(coders) == 2
+    # other parameters get other coders
+    encoder = encoders.acquire(io.BytesIO(), order=4, mem=1 << 20, version=version)
+    assert id(encoder) not in coders
+    encoder.close()
+    encoders.clear()
+    decoders.clear()
+
+
+def test_pool_threads(sales_records):
+    records = sales_records
+    payloads = [b''.join(records[i:i + 20]) for i in range(0, 2000, 20)]
+    encoders = ppmd.EncoderPool()
+    decoders = ppmd.DecoderPool()
+
+    def roundtrip(payload):
+        with io.BytesIO() as dst:
+            with encoders.encoder(dst, mem=1 << 20) as encoder:
+                encoder.encode(payload)
+            compressed = dst.getvalue()
+        with decoders.decoder(io.BytesIO(compressed), mem=1 << 20) as decoder:
+            return decoder.decode()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(roundtrip, payloads)) == payloads
+    encoders.clear()
+    decoders.clear()
+
+
+def test_pool_release_foreign():
+    encoders = ppmd.EncoderPool()
+    with ppmd.Ppmd8Encoder(io.BytesIO(), 6, 1 << 20, 0) as encoder:
+        with pytest.raises(ValueError):
+            encoders.release(encoder)
+    assert encoders._idle == {}
+
+
+@pytest.mark.parametrize("version", [7, 8])
+def test_huge_pages(version):
+    data = source * 1000
+    with io.BytesIO() as dst:
+        if version == 7:
+            encoder = ppmd.Ppmd7Encoder(dst, 6, 16 << 20, endmark=True, huge_pages=True)
+        else:
+            encoder = ppmd.Ppmd8Encoder(dst, 6, 16 << 20, 0, huge_pages=True)
+        with encoder:
+            kind = ppmd.lib.huge_kind(encoder.ppmd.Base)
+            encoder.encode(data)
+            encoder.flush()
+        compressed = dst.getvalue()
+    assert ppmd.decompress(compressed, 6, 16 << 20, version) == data
+    # huge pages are an option of each coder and pool
+    with ppmd.DecoderPool(huge_pages=True).decoder(io.BytesIO(compressed), 6, 16 << 20, version) as decoder:
+        assert decoder.decode() == data
+        assert ppmd.lib.huge_kind(decoder.ppmd.Base) == kind
+    if sys.platform.startswith('linux'):
+        assert kind != ppmd.lib.HUGE_KIND_MALLOC
+    else:
+        assert kind == ppmd.lib.HUGE_KIND_MALLOC
+
+
+def test_pool_numa(monkeypatch):
+    encoders = ppmd.EncoderPool(numa=True)
+    node = [0]
+    monkeypatch.setattr(encoders, '_node', lambda: node[0])
+    with io.BytesIO() as dst:
+        with encoders.encoder(dst, mem=1 << 20) as first:
+            first.encode(source)
+        assert ppmd.decompress(dst.getvalue(), mem=1 << 20) == source
+    assert first._pool_key[-1] == 0
+    # a thread on other node gets a new coder, and idle coders are kept for each node
+    node[0] = 1
+    with encoders.encoder(io.BytesIO(), mem=1 << 20) as second:
+        assert second is not first
+        assert second._pool_key[:-1] == first._pool_key[:-1] and second._pool_key[-1] == 1
+    with encoders.encoder(io.BytesIO(), mem=1 << 20) as third:
+        assert third is second
+    node[0] = 0
+    with encoders.encoder(io.BytesIO(), mem=1 << 20) as fourth:
+        assert fourth is first
+    encoders.clear()
+    # node is not looked up without numa
+    assert ppmd.EncoderPool()._node() == -1
@@ -1,8 +1,11 @@
+import gc
 import hashlib
 import io
 import os
 import pathlib
 
+import pytest  # type: ignore
+
 import ppmd
 
 testdata_path = pathlib.Path(os.path.dirname(__file__)).joinpath('data')
@@ -72,3 +75,124 @@ def test_ppmd_encode_decode(tmp_path):
                 out.write(res)
     thash = m2.digest()
     assert thash == shash
+
+
+class CountingWriter(io.BytesIO):
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def write(self, b):
+        self.count += 1
+        return super().write(b)
+
+
+class CountingReader(io.BytesIO):
+
+    def __init__(self, initial_bytes):
+        super().__init__(initial_bytes)
+        self.count = 0
+
+    def readinto(self, b):
+        self.count += 1
+        return super().readinto(b)
+
+
+def test_ppmd_encoder_buffered_write():
+    with CountingWriter() as dst:
+        with ppmd.Ppmd7Encoder(dst, 6, 16 << 20) as encoder:
+            encoder.encode(data)
+            assert dst.count == 0
+            encoder.flush()
+        assert dst.count == 1
+        result = dst.getvalue()
+    with testdata_path.joinpath('ppmd7.dat').open('rb') as f:
+        assert result == f.read()
+
+
+def test_ppmd_encoder_small_bufsize():
+    with CountingWriter() as dst:
+        with ppmd.Ppmd7Encoder(dst, 6, 16 << 20, bufsize=8) as encoder:
+            encoder.encode(data)
+            encoder.flush()
+        assert dst.count == 6
+        result = dst.getvalue()
+    with testdata_path.joinpath('ppmd7.dat').open('rb') as f:
+        assert result == f.read()
+
+
+def test_ppmd_decoder_unused_data():
+    with testdata_path.joinpath('ppmd7.dat').open('rb') as f:
+        src = io.BytesIO(f.read() + b'trailing data')
+    with ppmd.Ppmd7Decoder(src, 6, 16 << 20) as decoder:
+        result = decoder.decode(len(data))
+        assert decoder.unused_data == b'trailing data'
+    assert result == data
+
+
+def test_ppmd_decoder_bulk_read():
+    with testdata_path.joinpath('ppmd7.dat').open('rb') as f:
+        src = CountingReader(f.read())
+    with ppmd.Ppmd7Decoder(src, 6, 16 << 20) as decoder:
+        result = decoder.decode(len(data))
+    assert result == data
+    assert src.count == 1
+
+
+def test_ppmd_release_model_memory():
+    encoder = ppmd.Ppmd7Encoder(io.BytesIO(), 6, 256 << 20)
+    finalizer = encoder._finalizer
+    encoder.close()
+    assert not finalizer.alive
+    decoder = ppmd.Ppmd7Decoder(io.BytesIO(b'\0' * 5), 6, 256 << 20)
+    finalizer = decoder._finalizer
+    del decoder
+    gc.collect()
+    assert not finalizer.alive
+
+
+def test_ppmd_decoder_decode_into():
+    buf = bytearray(len(data) + 10)
+    with testdata_path.joinpath('ppmd7.dat').open('rb') as f:
+        with ppmd.Ppmd7Decoder(f, 6, 16 << 20) as decoder:
+            view = memoryview(buf)
+            size = decoder.decode_into(view[:33])
+            size += decoder.decode_into(view[33:len(data)])
+    assert size == len(data)
+    assert buf[:size] == data
+
+
+class PipeReader(io.RawIOBase):
+
+    def __init__(self, initial_bytes):
+        self._src = io.BytesIO(initial_bytes)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        # return small pieces as like a pipe or a socket
+        return self._src.readinto(memoryview(b)[:7])
+
+
+def test_ppmd_endmark():
+    with io.BytesIO() as dst:
+        with ppmd.Ppmd7Encoder(dst, 6, 16 << 20, endmark=True) as encoder:
+            encoder.encode(data)
+            encoder.flush()
+        result = dst.getvalue()
+    src = PipeReader(result + b'trailing data')
+    with ppmd.Ppmd7Decoder(src, 6, 16 << 20, endmark=True) as decoder:
+        assert not decoder.eof
+        assert decoder.decode() == data
+        assert decoder.eof
+        assert decoder.decode(10) == b''
+        assert decoder.unused_data + src.read() == b'trailing data'
+
+
+def test_ppmd_decode_without_length():
+    with testdata_path.joinpath('ppmd7.dat').open('rb') as f:
+        with ppmd.Ppmd7Decoder(f, 6, 16 << 20) as decoder:
+            with pytest.raises(ValueError):
+                decoder.decode()
@@ -1,5 +1,6 @@
 import hashlib
 import io
+import mmap
 import os
 import pathlib
 
@@ -22,6 +23,15 @@ def test_ppmd8_encoder():
     assert result == encoded
 
 
+def test_ppmd8_encoder_small_bufsize():
+    with io.BytesIO() as dst:
+        with ppmd.Ppmd8Encoder(dst, 6, 8 << 20, 0, bufsize=5) as encoder:
+            encoder.encode(source)
+            encoder.flush()
+        result = dst.getvalue()
+    assert result == encoded
+
+
 def test_ppmd8_decoder():
     with io.BytesIO() as src:
         src.write(encoded)
@@ -31,6 +41,37 @@ def test_ppmd8_decoder():
     assert result == source
 
 
+def test_ppmd8_decoder_eof():
+    with io.BytesIO(encoded) as src:
+        with ppmd.Ppmd8Decoder(src, 6, 8 << 20, 0) as decoder:
+            assert not decoder.eof
+            result = decoder.decode()
+            assert decoder.eof
+    assert result == source
+
+
+def test_ppmd8_decoder_decode_into(tmp_path):
+    target = tmp_path.joinpath('target.bin')
+    with target.open('wb') as f:
+        f.truncate(len(source) + 8)
+    with target.open('r+b') as f:
+        with mmap.mmap(f.fileno(), 0) as buf:
+            with io.BytesIO(encoded) as src:
+                with ppmd.Ppmd8Decoder(src, 6, 8 << 20, 0) as decoder:
+                    size = decoder.decode_into(buf)
+            assert size == len(source)
+            assert buf[:size] == source
+
+
+def test_ppmd8_decoder_push_back():
+    with io.BytesIO(encoded + b'trailing data') as src:
+        with ppmd.Ppmd8Decoder(src, 6, 8 << 20, 0) as decoder:
+            result = decoder.decode(len(source) + 1)
+            assert decoder.unused_data == b''
+        assert src.read() == b'trailing data'
+    assert result == source
+
+
 def test_ppmd8_encode_decode(tmp_path):
     length = 0
     m = hashlib.sha256()
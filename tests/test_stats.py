@@ -0,0 +1,63 @@
+import io
+
+import pytest  # type: ignore
+
+import ppmd
+
+
+def _encoder(version, dst, mem, restore):
+    if version == 7:
+        return ppmd.Ppmd7Encoder(dst, 6, mem, endmark=True)
+    return ppmd.Ppmd8Encoder(dst, 6, mem, restore)
+
+
+def _decoder(version, src, mem, restore):
+    if version == 7:
+        return ppmd.Ppmd7Decoder(src, 6, mem, endmark=True)
+    return ppmd.Ppmd8Decoder(src, 6, mem, restore)
+
+
+@pytest.mark.parametrize("version, restore", [(7, 0), (8, 0), (8, 1)])
+def test_stats(version, restore, sales_data):
+    data = sales_data
+    mem = 1 << 16
+    dst = io.BytesIO()
+    with _encoder(version, dst, mem, restore) as encoder:
+        encoder.encode(data)
+        encoder.flush()
+        stats = encoder.stats()
+    compressed = dst.getvalue()
+    assert stats['bytes_in'] == len(data)
+    assert stats['bytes_out'] == len(compressed)
+    assert stats['symbols'] == len(data) + 1
+    assert 0 < stats['memory_used'] <= stats['memory_size'] == mem
+    assert stats['time_c'] > 0
+    assert stats['time_io'] >= 0
+    if restore == 0:
+        assert stats['restarts'] > 0 and stats['cutoffs'] == 0
+    else:
+        assert stats['cutoffs'] > 0
+    # decoder follows the same model
+    with _decoder(version, io.BytesIO(compressed), mem, restore) as decoder:
+        assert decoder.decode() == data
+        decoded = decoder.stats()
+    assert decoded['bytes_in'] == len(compressed)
+    assert decoded['bytes_out'] == len(data)
+    assert decoded['symbols'] == len(data) + 1
+    assert (decoded['restarts'], decoded['cutoffs']) == (stats['restarts'], stats['cutoffs'])
+    assert decoded['memory_used'] == stats['memory_used']
+
+
+def test_stats_accumulate(sales_data):
+    encoder = ppmd.Ppmd8Encoder(io.BytesIO(), 6, 1 << 16, 0)
+    encoder.encode(sales_data)
+    encoder.flush()
+    restarts = encoder.stats()['restarts']
+    encoder.reset(io.BytesIO())
+    encoder.encode(b'abc')
+    encoder.flush()
+    encoder.close()
+    stats = encoder.stats()
+    assert stats['restarts'] == restarts
+    assert stats['bytes_in'] == len(sales_data) + 3
+    assert stats['memory_size'] == 0